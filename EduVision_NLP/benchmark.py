@@ -0,0 +1,154 @@
+"""
+Scale benchmark for the NLP side: CSV loading, aggregation and report assembly.
+
+Synthetic attention logs (utils/synthetic_logs.py) are generated for a range of class
+sizes and session lengths, and each stage is timed with a stubbed Gemini backend, so
+no API key or network is needed.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --scales 10x10 50x60 200x180 --fps 1 --output nlp_benchmark.json
+"""
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from main import EduVisionClassroomProcessor
+from prompts.report_prompt import build_classroom_prompt
+from utils.synthetic_logs import write_attention_log
+
+# (students, session minutes) from a small seminar to a large 3-hour lecture
+DEFAULT_SCALES = ["10x10", "30x45", "60x90", "100x120", "200x180"]
+
+
+class StubGeminiGenerator:
+    """Stands in for GeminiReportGenerator: returns a fixed, well-formed report instantly."""
+
+    SECTIONS = [
+        "EXECUTIVE SUMMARY", "INDIVIDUAL STUDENT ANALYSIS", "TEMPORAL ANALYSIS",
+        "CLASSROOM DYNAMICS", "ACTIONABLE RECOMMENDATIONS", "METRICS SUMMARY"
+    ]
+
+    def generate_report(self, prompt: str, temperature: float = 0.7) -> dict:
+        report = "\n\n".join(f"## {i + 1}. {name}\nBenchmark placeholder text." for i, name in enumerate(self.SECTIONS))
+        return {"success": True, "report": report}
+
+    def test_connection(self) -> bool:
+        return True
+
+
+def _timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, round(time.perf_counter() - start, 4)
+
+
+def _build_class_timeline(students_data: list) -> list:
+    """Same per-interval timeline _generate_attention_over_time_analysis feeds into the rankings."""
+    timeline = []
+    for student in students_data:
+        for i, interval in enumerate(student.get('time_intervals', [])):
+            timeline.append({
+                "student_id": student['student_id'],
+                "student_name": student['name'],
+                "interval": i + 1,
+                "time": str(interval.get('interval_start', 'Unknown')),
+                "attention_rate": float(interval.get('attention_rate', 0)),
+                "status": str(interval.get('interval_status', 'Unknown'))
+            })
+    return timeline
+
+
+def run_scale(processor: EduVisionClassroomProcessor, students: int, minutes: float, fps: float, workdir: str, seed: int) -> dict:
+    """Generate one synthetic log and time every stage on it."""
+    csv_path = os.path.join(workdir, f"log_{students}x{int(minutes)}.csv")
+    rows, generate_seconds = _timed(
+        write_attention_log, csv_path, num_students=students, session_minutes=minutes, fps=fps, seed=seed
+    )
+    loader = processor.csv_loader
+
+    timings = {}
+    df, timings["load_csv"] = _timed(loader.load_csv, csv_path)
+    _, timings["clean_data"] = _timed(loader._clean_data, df)
+    students_data, timings["get_student_data"] = _timed(loader.get_student_data, df)
+    _, timings["attention_over_time_analysis"] = _timed(processor._generate_attention_over_time_analysis, students_data)
+    timeline = _build_class_timeline(students_data)
+    _, timings["class_rankings"] = _timed(processor._generate_class_rankings, students_data, timeline)
+    class_info = {'course_name': 'Benchmark', 'date': '2025-01-01', 'session_time': 'Unknown', 'total_students': students}
+    prompt, timings["prompt_build"] = _timed(build_classroom_prompt, students_data, class_info, language="english")
+    # End to end, as the backend runs it (report files are not written)
+    _, timings["process_csv_file"] = _timed(
+        processor.process_csv_file, csv_path, save_reports=False, language="english", course_name="Benchmark"
+    )
+
+    csv_mb = round(os.path.getsize(csv_path) / 1024 / 1024, 2)
+    os.remove(csv_path)
+    return {
+        "students": students,
+        "session_minutes": minutes,
+        "fps": fps,
+        "rows": rows,
+        "csv_mb": csv_mb,
+        "generate_seconds": generate_seconds,
+        "prompt_chars": len(prompt),
+        "timings_seconds": timings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='EduVision NLP scale benchmark')
+    parser.add_argument('--scales', nargs='+', default=DEFAULT_SCALES, help='STUDENTSxMINUTES pairs, e.g. 10x10 200x180')
+    parser.add_argument('--fps', type=float, default=1.0, help='Logged frames per second in the synthetic logs')
+    parser.add_argument('--interactive-seconds', type=float, default=5.0,
+                        help='End-to-end time above which report generation is no longer considered interactive')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default='nlp_benchmark.json')
+    args = parser.parse_args()
+
+    output_path = os.path.abspath(args.output)
+    results = {"generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "fps": args.fps,
+               "interactive_seconds": args.interactive_seconds, "scales": []}
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # The processor logs to logs/eduvision.log relative to the working directory
+        cwd = os.getcwd()
+        os.chdir(workdir)
+        os.makedirs("logs", exist_ok=True)
+        try:
+            processor = EduVisionClassroomProcessor(gemini_generator=StubGeminiGenerator())
+            logging.getLogger().setLevel(logging.WARNING)
+
+            for scale in args.scales:
+                students, minutes = scale.lower().split("x")
+                result = run_scale(processor, int(students), float(minutes), args.fps, workdir, args.seed)
+                results["scales"].append(result)
+                t = result["timings_seconds"]
+                print(f"{students:>4} students x {minutes:>4} min ({result['rows']:>9} rows): "
+                      f"load {t['load_csv']:.2f}s | students {t['get_student_data']:.2f}s | "
+                      f"analysis {t['attention_over_time_analysis']:.2f}s | rankings {t['class_rankings']:.2f}s | "
+                      f"end-to-end {t['process_csv_file']:.2f}s | prompt {result['prompt_chars']} chars")
+        finally:
+            os.chdir(cwd)
+
+    slow = [s for s in results["scales"] if s["timings_seconds"]["process_csv_file"] > args.interactive_seconds]
+    results["first_non_interactive_scale"] = (
+        {"students": slow[0]["students"], "session_minutes": slow[0]["session_minutes"]} if slow else None
+    )
+    if slow:
+        print(f"Report generation exceeds {args.interactive_seconds}s from "
+              f"{slow[0]['students']} students x {slow[0]['session_minutes']} min")
+    else:
+        print(f"All scales finished within {args.interactive_seconds}s")
+
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to: {output_path}")
+
+if __name__ == "__main__":
+    main()
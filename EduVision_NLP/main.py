@@ -11,20 +11,33 @@ from models.gemini import GeminiReportGenerator
 from prompts.report_prompt import build_classroom_prompt
 from utils.formatter import ReportFormatter
 from utils.csv_loader import CSVLoader
+from utils.track_consolidation import (apply_track_merges, consolidate_rollups, link_tracks, save_track_merges,
+                                       TRACK_COLUMNS)
+
+try:
+    from backend.tracing import span
+except ImportError:  # running outside the backend: stage timing disabled
+    from contextlib import nullcontext as span
 
 class EduVisionClassroomProcessor:
     """
     Main class to process CSV data from computer vision model and generate classroom reports.
     """
 
-    def __init__(self):
-        """Initialize the classroom report processor with all necessary components."""
+    def __init__(self, gemini_generator=None):
+        """
+        Initialize the classroom report processor with all necessary components.
+
+        Args:
+            gemini_generator: Optional report generator to use instead of GeminiReportGenerator
+                (must provide generate_report(prompt, temperature) and test_connection())
+        """
         # Create output directories
         project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
         os.makedirs(os.path.join(project_root, "reports"), exist_ok=True)
         os.makedirs(os.path.join(project_root, "logs"), exist_ok=True)
         
-        self.gemini_generator = GeminiReportGenerator()
+        self.gemini_generator = gemini_generator or GeminiReportGenerator()
         self.formatter = ReportFormatter()
         self.csv_loader = CSVLoader()
         self.logger = self._setup_logger()
@@ -64,17 +77,19 @@ class EduVisionClassroomProcessor:
             }
             
             # Generate the detailed prompt
-            prompt = build_classroom_prompt(students_data, class_info, language=language)
+            with span("prompt_build"):
+                prompt = build_classroom_prompt(students_data, class_info, language=language)
             
             # Debug: Log prompt length and preview
             self.logger.info(f"Generated prompt length: {len(prompt)} characters")
             self.logger.info(f"Prompt preview: {prompt[:200]}...")
             
             # Generate AI report with detailed prompt
-            ai_result = self.gemini_generator.generate_report(
-                prompt=prompt,
-                temperature=0.7
-            )
+            with span("gemini_call"):
+                ai_result = self.gemini_generator.generate_report(
+                    prompt=prompt,
+                    temperature=0.7
+                )
             
             if not ai_result['success']:
                 self.logger.error(f"AI report generation failed: {ai_result.get('error', 'Unknown error')}")
@@ -129,27 +144,57 @@ class EduVisionClassroomProcessor:
                 'student_count': len(students_data) if students_data else 0
             }
 
-    def process_csv_file(self, csv_file_path: str, save_reports: bool = True, language: str = "en", course_name: str = None) -> dict:
+    def process_csv_file(self, csv_file_path: str, save_reports: bool = True, language: str = "en", course_name: str = None, stage_callback=None, rollups_path: str = None) -> dict:
         """
         Process CSV file and generate classroom reports in JSON format.
         
         Args:
             csv_file_path (str): Path to the CSV file
             save_reports (bool): Whether to save reports to files
+            stage_callback (callable): Optional, called with the stage name ("aggregation", "llm")
+                when that stage starts
+            rollups_path (str): Optional interval rollups written by the tracker (--events); students
+                are then built from them, and of the per-frame log only the columns needed to
+                join split tracks are read
             
         Returns:
             dict: Processing results
         """
         try:
-            # Load and validate CSV
-            df = self.csv_loader.load_csv(csv_file_path)
-            stats = self.csv_loader.get_summary_stats(df)
+            if stage_callback:
+                stage_callback("aggregation")
+
+            students_data = None
+            if rollups_path:
+                with span("csv_load"):
+                    df = self.csv_loader.load_rollups(rollups_path)
+                    tracks = self.csv_loader.load_csv(csv_file_path, columns=TRACK_COLUMNS)
+                # Same track joins as the per-frame path below
+                with span("consolidation"):
+                    joined = link_tracks(tracks)
+                    save_track_merges(csv_file_path, joined)
+                    df = consolidate_rollups(df, joined)
+                with span("aggregation"):
+                    students_data = self.csv_loader.get_student_data_from_rollups(df)
+            else:
+                # Load and validate CSV
+                with span("csv_load"):
+                    df = self.csv_loader.load_csv(csv_file_path)
+                # Join student IDs the tracker split up before they become separate students in the prompt;
+                # the joins are kept next to the log so its timeline shows the same students
+                with span("consolidation"):
+                    joined = link_tracks(df)
+                    save_track_merges(csv_file_path, joined)
+                    df = apply_track_merges(df, joined)
+            with span("aggregation"):
+                stats = self.csv_loader.get_summary_stats(df, students_data)
             
             self.logger.info(f"CSV Summary: {stats}")
             self.logger.info(f"Report Language: {language.title()}")
             
             # Get classroom batches
-            classroom_batches = self.csv_loader.get_classroom_batches(df)
+            with span("aggregation"):
+                classroom_batches = self.csv_loader.get_classroom_batches(df, students_data)
             
             if not classroom_batches:
                 return {
@@ -178,6 +223,9 @@ class EduVisionClassroomProcessor:
 
                 self.logger.info(f"Processing {course_name} with {len(students_data)} students...")
                 
+                if stage_callback:
+                    stage_callback("llm")
+
                 # Process this classroom
                 classroom_result = self.process_classroom(actual_course_name, students_data, language= language)
                 
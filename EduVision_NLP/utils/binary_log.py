@@ -0,0 +1,90 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from utils.track_consolidation import recompute_merged
+
+# Written by the tracker's attention_log.py (main.py --log_format binary|both)
+BINARY_LOG_SUFFIX = ".alog"
+SUPPORTED_VERSIONS = (1,)
+
+NUMERIC_COLUMNS = [
+    "frame_idx", "yaw_angle_deg", "attention_score", "distraction_events", "yawning_count",
+    "eye_closure_duration_sec", "nose_x", "nose_y",
+]
+
+
+def is_binary_log(file_path: str) -> bool:
+    return file_path.endswith(BINARY_LOG_SUFFIX)
+
+
+def load_binary_log(file_path: str):
+    """
+    Memory-map a binary attention log.
+
+    Returns:
+        tuple: (records, meta): a read-only structured array laid out as described by the
+        sidecar (<file_path>.json), and the sidecar dict
+    """
+    with open(f"{file_path}.json") as f:
+        meta = json.load(f)
+    if meta.get("version") not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Unsupported attention log version: {meta.get('version')}")
+    dtype = np.dtype([tuple(field) for field in meta["dtype"]])
+    # A log that is still being written can end in a partly written record
+    count = os.path.getsize(file_path) // dtype.itemsize
+    if count == 0:
+        return np.zeros(0, dtype=dtype), meta
+    return np.memmap(file_path, dtype=dtype, mode="r", shape=(count,)), meta
+
+
+def _categorical(codes: np.ndarray, values: list) -> pd.Categorical:
+    """Codes into a value table that may repeat values (e.g. students merged after the session)"""
+    value_codes, categories = pd.factorize(pd.Series(values, dtype=object))
+    return pd.Categorical.from_codes(value_codes[codes], categories=categories)
+
+
+def student_ids(meta: dict) -> list:
+    """Student ID of every student index, after the merges reid.py recorded"""
+    merged = meta.get("merged", {})
+    return [merged.get(s_id, s_id) for s_id in meta["students"]]
+
+
+def binary_log_to_frame(records: np.ndarray, meta: dict, first_seen: dict = None) -> pd.DataFrame:
+    """
+    Same columns as the tracker's CSV. Text columns are categoricals built from the integer
+    codes and numeric columns come straight from the mapped fields, so nothing is parsed;
+    session_duration_minutes is derived from each student's first timestamp (taken from
+    first_seen, student_id -> epoch seconds, when only part of the log is passed in).
+    Students merged by reid.py get their running metrics recomputed across their fragments,
+    so their records must be passed in from the start of the session.
+    """
+    ids = student_ids(meta)
+    students = _categorical(records["student"], ids)
+    names = [meta["names"].get(s_id, "Unknown") for s_id in ids]
+    offset_us = int(meta.get("utc_offset_seconds", 0) * 1_000_000)
+    timestamp = pd.to_datetime(records["timestamp_us"] + offset_us, unit="us")
+
+    df = pd.DataFrame({
+        "name": _categorical(records["student"], names),
+        "student_id": students,
+        "timestamp": timestamp,
+        "attention_status": _categorical(records["attention_status"], meta["enums"]["attention_status"]),
+        "gaze": _categorical(records["gaze"], meta["enums"]["gaze"]),
+        **{col: records[col] for col in NUMERIC_COLUMNS},
+    })
+    if first_seen is None:
+        started = df.groupby("student_id", observed=True)["timestamp"].transform("min")
+    else:
+        started = pd.to_datetime(
+            df["student_id"].map({s_id: int(t * 1_000_000) + offset_us for s_id, t in first_seen.items()}).astype("int64"),
+            unit="us")
+    df["session_duration_minutes"] = ((df["timestamp"] - started).dt.total_seconds() / 60).round(2)
+    if meta.get("merged"):
+        recompute_merged(df, _categorical(records["student"], meta["students"]), set(meta["merged"].values()))
+    # The IDs are used as plain strings downstream (grouping, name fallbacks)
+    df["student_id"] = df["student_id"].astype(str)
+    df["name"] = df["name"].astype(str)
+    return df
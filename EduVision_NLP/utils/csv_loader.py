@@ -3,6 +3,10 @@ import numpy as np
 from datetime import datetime, timedelta
 import logging
 
+from utils.binary_log import is_binary_log, load_binary_log, binary_log_to_frame
+from utils.log_index import load_log_index, read_indexed
+from utils.track_consolidation import UNRESOLVED_NAMES, apply_track_merges, load_track_merges
+
 class CSVLoader:
     """Handles loading and processing of CSV data from computer vision models."""
     
@@ -18,16 +22,53 @@ class CSVLoader:
             'focus_quality', 'session_duration_minutes'
         ]
     
-    def load_csv(self, file_path: str) -> pd.DataFrame:
-        """Load CSV file and return DataFrame."""
+    def load_csv(self, file_path: str, columns: list = None) -> pd.DataFrame:
+        """
+        Load CSV file (or the tracker's memory-mapped binary log, *.alog) and return DataFrame.
+        With columns, only those of them that the log has are loaded.
+        """
         try:
-            df = pd.read_csv(file_path)
+            if is_binary_log(file_path):
+                records, meta = load_binary_log(file_path)
+                df = binary_log_to_frame(records, meta)
+                if columns is not None:
+                    df = df[[col for col in df.columns if col in columns]]
+                self.logger.info(f"Loaded binary log with {len(df)} records from {file_path}")
+                return df
+            usecols = None if columns is None else (lambda col: col in columns)
+            df = pd.read_csv(file_path, usecols=usecols)
             self.logger.info(f"Loaded CSV with {len(df)} records from {file_path}")
             return df
         except Exception as e:
             self.logger.error(f"Error loading CSV: {str(e)}")
             raise
     
+    def load_timeline(self, file_path: str, student_id: str = None, start: float = None,
+                      end: float = None) -> pd.DataFrame:
+        """
+        Rows of one student and/or one time window (seconds from the start of the session),
+        under the student IDs of the report (track joins saved by process_csv_file applied).
+        With the tracker's sidecar index (<log>.idx.json) only the matching row ranges are read;
+        without one the whole log is loaded and filtered.
+        """
+        index = load_log_index(file_path)
+        if index is not None:
+            df = read_indexed(file_path, index, student_id, start, end)
+            self.logger.info(f"Loaded {len(df)} indexed records from {file_path}")
+            return df
+
+        self.logger.warning(f"No index for {file_path}; reading the whole log")
+        df = apply_track_merges(self.load_csv(file_path), load_track_merges(file_path))
+        df['timestamp'] = pd.to_datetime(df['timestamp'])
+        if student_id is not None:
+            df = df[df['student_id'].astype(str) == student_id]
+        elapsed = (df['timestamp'] - df['timestamp'].min()).dt.total_seconds()
+        if start is not None:
+            df = df[elapsed >= start]
+        if end is not None:
+            df = df[elapsed < end]
+        return df.reset_index(drop=True)
+
     def validate_csv_format(self, file_path: str) -> dict:
         """Validate CSV format and return validation results."""
         try:
@@ -102,12 +143,7 @@ class CSVLoader:
                         aggregated['avg_eye_closure'] = interval_data['eye_closure_duration_sec'].mean()
                     
                     # Determine overall attention for this interval
-                    if aggregated['attention_rate'] >= 70:
-                        aggregated['interval_status'] = 'Highly Attentive'
-                    elif aggregated['attention_rate'] >= 50:
-                        aggregated['interval_status'] = 'Moderately Attentive'
-                    else:
-                        aggregated['interval_status'] = 'Needs Attention'
+                    aggregated['interval_status'] = self._interval_status(aggregated['attention_rate'])
                     
                     intervals.append(aggregated)
                 
@@ -119,6 +155,60 @@ class CSVLoader:
             self.logger.error(f"Error aggregating student data: {str(e)}")
             return [], 0
     
+    @staticmethod
+    def _interval_status(attention_rate: float) -> str:
+        if attention_rate >= 70:
+            return 'Highly Attentive'
+        if attention_rate >= 50:
+            return 'Moderately Attentive'
+        return 'Needs Attention'
+
+    def load_rollups(self, file_path: str) -> pd.DataFrame:
+        """Load the per-student interval rollups the tracker writes with --events (<log>_intervals.csv)."""
+        try:
+            rollups = pd.read_csv(file_path, dtype={'student_id': str})
+            self.logger.info(f"Loaded {len(rollups)} interval rollups from {file_path}")
+            return rollups
+        except Exception as e:
+            self.logger.error(f"Error loading rollups: {str(e)}")
+            raise
+
+    def get_student_data_from_rollups(self, rollups: pd.DataFrame) -> list:
+        """
+        Same structure as get_student_data, built from interval rollups instead of per-frame
+        snapshot rows: one row per student per interval, so no per-frame aggregation is needed.
+        """
+        students_data = []
+        for student_id, student_df in rollups.groupby('student_id', sort=False):
+            intervals = []
+            for row in student_df.itertuples(index=False):
+                intervals.append({
+                    'interval_start': pd.Timestamp(row.interval_start).strftime('%H:%M:%S'),
+                    'interval_duration_minutes': row.interval_duration_minutes,
+                    'avg_attention_score': row.avg_attention_score,
+                    'attention_rate': row.attention_rate,
+                    'total_distractions': row.total_distractions,
+                    'frames_analyzed': row.frames_analyzed,
+                    'yawning_incidents': row.yawning_count,
+                    'avg_eye_closure': row.avg_eye_closure,
+                    'interval_status': self._interval_status(row.attention_rate),
+                })
+
+            students_data.append({
+                'student_id': student_id,
+                'name': self._student_name(student_df, student_id),
+                'course_name': 'Unknown Course',
+                'session_time': pd.Timestamp(student_df['interval_start'].iloc[0]),
+                'total_session_minutes': round(student_df['session_duration_minutes'].max(), 1),
+                'overall_attention_score': round(np.mean([i['attention_rate'] for i in intervals]), 1),
+                'total_distractions': int(student_df['total_distractions'].sum()),
+                'intervals_analyzed': len(intervals),
+                'time_intervals': intervals
+            })
+
+        self.logger.info(f"Successfully processed {len(students_data)} students from interval rollups")
+        return students_data
+
     def get_student_data(self, df: pd.DataFrame) -> list:
         """Process and return structured student data with time aggregation."""
         try:
@@ -146,7 +236,7 @@ class CSVLoader:
                 
                 student_data = {
                     'student_id': student_id,
-                    'name': student_df.get('name', f"Student {student_id}").iloc[0] if 'name' in student_df.columns else f"Student {student_id[:8]}",
+                    'name': self._student_name(student_df, student_id),
                     'course_name': student_df.get('course_name', 'Unknown Course').iloc[0] if 'course_name' in student_df.columns else 'Unknown Course',
                     'session_time': student_df['timestamp'].iloc[0] if 'timestamp' in student_df.columns else 'Unknown',
                     'total_session_minutes': round(total_duration, 1),
@@ -165,6 +255,16 @@ class CSVLoader:
             self.logger.error(f"Error processing student data: {str(e)}")
             raise
     
+    def _student_name(self, student_df: pd.DataFrame, student_id: str) -> str:
+        """Last recognised name of a student; names are only read once the tracker has seen a few good frames."""
+        if 'name' not in student_df.columns:
+            return f"Student {student_id[:8]}"
+        names = student_df['name'].dropna()
+        known = names[~names.isin(UNRESOLVED_NAMES)]
+        if len(known):
+            return known.iloc[-1]
+        return names.iloc[0] if len(names) else f"Student {student_id[:8]}"
+
     def _clean_data(self, df: pd.DataFrame) -> pd.DataFrame:
         """Clean and validate the data."""
         initial_count = len(df)
@@ -189,11 +289,11 @@ class CSVLoader:
         self.logger.info(f"Successfully validated {len(df_clean)} records")
         return df_clean
     
-    def get_summary_stats(self, df: pd.DataFrame) -> dict:
-        """Generate summary statistics from the DataFrame."""
+    def get_summary_stats(self, df: pd.DataFrame, students_data: list = None) -> dict:
+        """Generate summary statistics from the DataFrame (or already aggregated students_data)."""
         try:
-            df_clean = self._clean_data(df)
-            students_data = self.get_student_data(df_clean)
+            if students_data is None:
+                students_data = self.get_student_data(self._clean_data(df))
             
             if not students_data:
                 return {'error': 'No valid student data found'}
@@ -230,10 +330,11 @@ class CSVLoader:
             self.logger.error(f"Error generating summary stats: {str(e)}")
             return {'error': str(e)}
     
-    def get_classroom_batches(self, df: pd.DataFrame) -> dict:
+    def get_classroom_batches(self, df: pd.DataFrame, students_data: list = None) -> dict:
         """Group students by classroom/course and return processed data."""
         try:
-            students_data = self.get_student_data(df)
+            if students_data is None:
+                students_data = self.get_student_data(df)
             
             classroom_batches = {}
             for student in students_data:
@@ -0,0 +1,173 @@
+import io
+import json
+import os
+from bisect import bisect_left, bisect_right
+
+import numpy as np
+import pandas as pd
+
+from utils.binary_log import is_binary_log, load_binary_log, binary_log_to_frame
+from utils.track_consolidation import load_track_merges, recompute_merged
+
+# Written next to the log by the tracker's log_index.py (<log>.idx.json)
+INDEX_SUFFIX = ".idx.json"
+SUPPORTED_VERSIONS = (1,)
+
+
+def load_log_index(file_path: str):
+    """Sidecar index of a CSV or binary attention log, or None if the log has none."""
+    index_path = f"{file_path}{INDEX_SUFFIX}"
+    if not os.path.exists(index_path):
+        return None
+    with open(index_path) as f:
+        index = json.load(f)
+    if index.get("version") not in SUPPORTED_VERSIONS:
+        raise ValueError(f"Unsupported log index version: {index.get('version')}")
+    return index
+
+
+def _window_range(index: dict, start: float = None, end: float = None) -> list:
+    """[row_start, row_end, byte_start, byte_end] covering seconds [start, end) from the first bucket."""
+    buckets = index["buckets"]
+    if not buckets:
+        return []
+    times = [bucket[0] for bucket in buckets]
+    first = 0 if start is None else max(bisect_right(times, times[0] + start) - 1, 0)
+    last = len(buckets) if end is None else bisect_left(times, times[0] + end)
+    if last <= first:
+        return []
+    stop = (index["rows"], index["bytes"]) if last == len(buckets) else tuple(buckets[last][1:])
+    return [buckets[first][1], stop[0], buckets[first][2], stop[1]]
+
+
+def _intersect(ranges: list, window: list) -> list:
+    """Clip [row_start, row_end, byte_start, byte_end] ranges to a window (rows and bytes grow together)."""
+    clipped = []
+    for row_start, row_end, byte_start, byte_end in ranges:
+        if row_end <= window[0] or row_start >= window[1]:
+            continue
+        clipped.append([max(row_start, window[0]), min(row_end, window[1]),
+                        max(byte_start, window[2]), min(byte_end, window[3])])
+    return clipped
+
+
+def _union(ranges: list) -> list:
+    """Sort ranges and join the ones that overlap or touch."""
+    joined = []
+    for row_start, row_end, byte_start, byte_end in sorted(ranges):
+        if joined and row_start <= joined[-1][1]:
+            joined[-1][1] = max(joined[-1][1], row_end)
+            joined[-1][3] = max(joined[-1][3], byte_end)
+        else:
+            joined.append([row_start, row_end, byte_start, byte_end])
+    return joined
+
+
+def _lines_containing(chunk: bytes, needles: list) -> bytes:
+    """Lines of chunk that contain any of the needles, found with bytes.find instead of splitting every line."""
+    spans = set()
+    for needle in needles:
+        pos = chunk.find(needle)
+        while pos != -1:
+            line_start = chunk.rfind(b"\n", 0, pos) + 1
+            line_end = chunk.find(b"\n", pos + 1)
+            if line_end == -1:
+                line_end = len(chunk)
+            spans.add((line_start, line_end))
+            pos = chunk.find(needle, line_end)
+    return b"\n".join(chunk[line_start:line_end] for line_start, line_end in sorted(spans))
+
+
+def _read_csv_ranges(file_path: str, ranges: list, student_ids: list = None) -> pd.DataFrame:
+    """
+    Parse only the given byte ranges of a CSV log. Rows of all students are interleaved, so
+    with student_ids, lines without one of them are dropped before parsing.
+    """
+    with open(file_path, "rb") as f:
+        header_line = f.readline()
+        header = header_line.decode().rstrip("\r\n").split(",")
+        if student_ids is not None:
+            pattern = "\n{}," if header[0] == "student_id" else ",{},"
+            needles = [pattern.format(s_id).encode() for s_id in student_ids]
+        parts = []
+        for _, _, byte_start, byte_end in ranges:
+            f.seek(byte_start)
+            chunk = f.read(byte_end - byte_start)
+            if byte_start == 0:
+                chunk = chunk[len(header_line):]
+            if student_ids is not None:
+                chunk = _lines_containing(b"\n" + chunk, needles)
+            if chunk.strip():
+                parts.append(pd.read_csv(io.BytesIO(chunk), names=header, dtype={"student_id": str}))
+    return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=header)
+
+
+def read_indexed(file_path: str, index: dict, student_id: str = None, start: float = None,
+                 end: float = None) -> pd.DataFrame:
+    """
+    Rows of one student and/or one time window (seconds from the start of the session), read
+    through the index: only the row / byte ranges that can contain them are touched. Students
+    merged after the session (reid.py, and the report's track consolidation) are read under
+    their merged ID, with their running metrics recomputed across their fragments.
+    """
+    binary = is_binary_log(file_path)
+    meta = None
+    if binary:
+        records, meta = load_binary_log(file_path)
+        merged = meta.get("merged", {})
+    else:
+        merged = {}
+    joined = load_track_merges(file_path)
+    # Merged ID of every ID in the index: after reid.py merges, binary logs keep the tracker's IDs
+    aliases = {}
+    for s_id in index["students"]:
+        alias = merged.get(s_id, s_id)
+        aliases[s_id] = joined.get(alias, alias)
+    rejoined = {alias for s_id, alias in aliases.items() if s_id != alias}
+
+    window = _window_range(index, start, end)
+    fragment_ids = None
+    if student_id is None:
+        ranges = [window] if window else []
+    else:
+        fragment_ids = [s_id for s_id, alias in aliases.items() if alias == student_id]
+        ranges = sorted(r for s_id in fragment_ids for r in index["students"][s_id]["ranges"])
+        ranges = _intersect(ranges, window) if window else []
+
+    # Running metrics of merged students are recomputed, so they need every row up to the window's end
+    if ranges and rejoined and (student_id is None or student_id in rejoined):
+        history = [r for s_id, entry in index["students"].items()
+                   if aliases[s_id] in rejoined and student_id in (None, aliases[s_id])
+                   for r in entry["ranges"]]
+        ranges = _union(ranges + _intersect(history, _window_range(index, None, end)))
+
+    if binary:
+        subset = np.concatenate([records[r[0]:r[1]] for r in ranges]) if ranges else records[:0]
+        first_seen = {}
+        for s_id, entry in index["students"].items():
+            s_id = merged.get(s_id, s_id)
+            first_seen[s_id] = min(first_seen.get(s_id, entry["first_seen"]), entry["first_seen"])
+        df = binary_log_to_frame(subset, meta, first_seen)
+    else:
+        df = _read_csv_ranges(file_path, ranges, fragment_ids)
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+    if joined:
+        fragments = df["student_id"].astype(str).to_numpy()
+        df["student_id"] = [joined.get(s_id, s_id) for s_id in fragments]
+        recompute_merged(df, fragments, set(joined.values()))
+
+    # Ranges cover whole frames and buckets; trim to exactly what was asked for
+    if student_id is not None:
+        df = df[df["student_id"] == student_id]
+    if start is not None or end is not None:
+        # Same microsecond truncation as the binary log's timestamps
+        offset_us = int(index.get("utc_offset_seconds", 0) * 1_000_000)
+        session_start = pd.to_datetime(int(index["buckets"][0][0] * 1_000_000) + offset_us, unit="us")
+        elapsed = (df["timestamp"] - session_start).dt.total_seconds()
+        keep = np.ones(len(df), dtype=bool)
+        if start is not None:
+            keep &= (elapsed >= start).to_numpy()
+        if end is not None:
+            keep &= (elapsed < end).to_numpy()
+        df = df[keep]
+    return df.reset_index(drop=True)
@@ -0,0 +1,94 @@
+import numpy as np
+import pandas as pd
+
+# Same columns, in the same order, as the computer vision tracker's CSV log
+FIELDNAMES = [
+    "name", "student_id", "timestamp", "frame_idx", "attention_status", "gaze",
+    "yaw_angle_deg", "attention_score", "distraction_events", "yawning_count",
+    "eye_closure_duration_sec", "focus_quality", "session_duration_minutes", "nose_x", "nose_y"
+]
+
+
+def generate_attention_log(num_students: int = 10, session_minutes: float = 10, fps: float = 1.0,
+                           start_time: str = "2025-01-01 09:00:00", seed: int = 0) -> pd.DataFrame:
+    """
+    Generate a synthetic attention log shaped like the tracker's output.
+
+    Every student is seen on every logged frame. Attention follows a slow per-student
+    drift plus second-scale noise, so students have realistic runs of attentive and
+    distracted frames; attention_score and distraction_events are cumulative, as in
+    metrics.update_student_metrics.
+
+    Args:
+        num_students (int): Number of students in the class
+        session_minutes (float): Length of the session
+        fps (float): Logged frames per second
+        start_time (str): Timestamp of the first frame
+        seed (int): Random seed, for reproducible logs
+
+    Returns:
+        pd.DataFrame: One row per student per frame, frame-major like the tracker writes it
+    """
+    rng = np.random.default_rng(seed)
+    num_frames = max(int(session_minutes * 60 * fps), 1)
+    frames_per_second = max(int(round(fps)), 1)
+
+    # (frames, students) attention latent: slow drift + noise held for ~1 second
+    t = np.arange(num_frames)[:, None] / (fps * 60)
+    base = rng.uniform(-0.3, 1.2, num_students)
+    phase = rng.uniform(0, 2 * np.pi, num_students)
+    period = rng.uniform(5, 30, num_students)
+    drift = np.sin(2 * np.pi * t / period + phase)
+    seconds = -(-num_frames // frames_per_second)
+    noise = np.repeat(rng.normal(0, 1, (seconds, num_students)), frames_per_second, axis=0)[:num_frames]
+    attentive = base + 0.6 * drift + noise > 0
+
+    # Cumulative metrics per student
+    frame_numbers = np.arange(1, num_frames + 1)[:, None]
+    attention_score = np.round(np.cumsum(attentive, axis=0) / frame_numbers * 100, 1)
+    was_attentive = np.vstack([np.ones((1, num_students), dtype=bool), attentive[:-1]])
+    distraction_events = np.cumsum(was_attentive & ~attentive, axis=0)
+
+    yaw = np.where(attentive, rng.normal(0, 8, attentive.shape), rng.normal(0, 35, attentive.shape))
+    gaze = np.where(attentive, "Center", np.where(yaw > 0, "Left", "Right"))
+
+    # Timestamps are formatted once per frame and broadcast to every student
+    times = pd.Timestamp(start_time) + pd.to_timedelta(np.arange(num_frames) / fps, unit="s")
+    timestamps = np.asarray(times.strftime("%Y-%m-%dT%H:%M:%S.%f"))
+    session_minutes_col = np.round(np.arange(num_frames) / fps / 60, 2)
+
+    student_ids = np.array([f"{i:08x}" for i in rng.choice(16 ** 8, num_students, replace=False)])
+    names = np.array([f"Student {i + 1}" for i in range(num_students)])
+
+    # Students sit on a grid of seats and move their heads a little around them
+    cols = int(np.ceil(np.sqrt(num_students)))
+    seats = np.arange(num_students)
+    seat_x, seat_y = (seats % cols + 0.5) / cols, (seats // cols + 0.5) / cols
+    sway = rng.normal(0, 0.005, (2, num_frames, num_students))
+
+    total = num_frames * num_students
+    df = pd.DataFrame({
+        "name": np.tile(names, num_frames),
+        "student_id": np.tile(student_ids, num_frames),
+        "timestamp": np.repeat(timestamps, num_students),
+        "frame_idx": np.repeat(np.arange(num_frames), num_students),
+        "attention_status": np.where(attentive.ravel(), "Attentive", "Not attentive"),
+        "gaze": gaze.ravel(),
+        "yaw_angle_deg": np.round(yaw.ravel(), 2),
+        "attention_score": attention_score.ravel(),
+        "distraction_events": distraction_events.ravel(),
+        "yawning_count": np.zeros(total, dtype=int),
+        "eye_closure_duration_sec": np.zeros(total, dtype=int),
+        "focus_quality": "",
+        "session_duration_minutes": np.repeat(session_minutes_col, num_students),
+        "nose_x": np.round(seat_x + sway[0], 4).ravel(),
+        "nose_y": np.round(seat_y + sway[1], 4).ravel(),
+    })
+    return df[FIELDNAMES]
+
+
+def write_attention_log(path: str, **kwargs) -> int:
+    """Generate a synthetic log (see generate_attention_log) and save it as CSV. Returns the row count."""
+    df = generate_attention_log(**kwargs)
+    df.to_csv(path, index=False)
+    return len(df)
@@ -0,0 +1,282 @@
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Placeholder names the tracker writes before (or when) a name tag was read
+UNRESOLVED_NAMES = ["Unknown", "Name not found"]
+
+# Fragments whose hand-over positions are further apart than this (fraction of the frame) are different seats
+MAX_POSITION_DISTANCE = 0.05
+# Longest time (seconds) a student can be out of view and still be joined to their earlier ID
+MAX_GAP_SECONDS = 300
+# Per-student running totals that restart with every new ID
+CUMULATIVE_COUNTERS = ["yawning_count", "eye_closure_duration_sec"]
+POSITION_COLUMNS = ["nose_x", "nose_y"]
+# Columns of the per-frame log that link_tracks uses
+TRACK_COLUMNS = ["student_id", "frame_idx", "timestamp", "name", *POSITION_COLUMNS]
+
+
+def _fragment_table(df: pd.DataFrame) -> pd.DataFrame:
+    """One row per student ID: frame span, time span, hand-over positions and recognised name"""
+    grouped = df.groupby("student_id", sort=False)
+    fragments = pd.DataFrame({
+        "start": grouped["frame_idx"].min(),
+        "end": grouped["frame_idx"].max(),
+        # ISO timestamps sort as strings, so only one value per fragment is parsed
+        "start_time": pd.to_datetime(grouped["timestamp"].min()),
+        "end_time": pd.to_datetime(grouped["timestamp"].max()),
+    })
+    if all(col in df.columns for col in POSITION_COLUMNS):
+        first, last = grouped[POSITION_COLUMNS].first(), grouped[POSITION_COLUMNS].last()
+        fragments[["start_x", "start_y"]] = first.to_numpy()
+        fragments[["end_x", "end_y"]] = last.to_numpy()
+    if "name" in df.columns:
+        known = df[df["name"].notna() & ~df["name"].isin(UNRESOLVED_NAMES)]
+        fragments["name"] = known.groupby("student_id")["name"].last()
+    else:
+        fragments["name"] = np.nan
+    return fragments
+
+
+def _link_fragments(fragments: pd.DataFrame, max_distance: float, max_gap_seconds: float) -> dict:
+    """
+    Chain fragments greedily, cheapest hand-over first. A fragment can only continue one that
+    ended before it started, within max_gap_seconds, near where that one was last seen (or
+    under the same recognised name), and never across two different names.
+
+    Returns:
+        dict: student_id -> ID of the first fragment of its chain, for every fragment that was joined
+    """
+    ids = fragments.index.to_numpy()
+    n = len(ids)
+    start, end = fragments["start"].to_numpy(), fragments["end"].to_numpy()
+    origin = fragments["start_time"].min()
+    start_s = (fragments["start_time"] - origin).dt.total_seconds().to_numpy()
+    end_s = (fragments["end_time"] - origin).dt.total_seconds().to_numpy()
+
+    # Candidate (i, j) pairs, j starting within max_gap_seconds after i ended: two binary
+    # searches over the sorted end times per fragment instead of an n x n comparison
+    by_end = np.argsort(end_s, kind="stable")
+    first = np.searchsorted(end_s[by_end], start_s - max_gap_seconds, side="left")
+    counts = np.maximum(np.searchsorted(end_s[by_end], start_s, side="right") - first, 0)
+    heads = np.repeat(np.arange(n), counts)
+    tails = by_end[np.repeat(first - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())]
+    gap = start_s[heads] - end_s[tails]
+
+    names = fragments["name"].to_numpy(dtype=object)
+    named = pd.notna(names)
+    both_named = named[tails] & named[heads]
+    same_name = both_named & (names[tails] == names[heads])
+
+    # j could continue i
+    eligible = (start[heads] > end[tails]) & (~both_named | same_name)
+    cost = gap / max_gap_seconds
+    if "end_x" in fragments.columns:
+        distance = np.hypot(fragments["start_x"].to_numpy()[heads] - fragments["end_x"].to_numpy()[tails],
+                            fragments["start_y"].to_numpy()[heads] - fragments["end_y"].to_numpy()[tails])
+        eligible &= (distance <= max_distance) | same_name
+        cost = cost + np.nan_to_num(distance / max_distance, nan=1.0)
+    else:
+        eligible &= same_name
+    cost = cost - same_name
+
+    tails, heads, cost = tails[eligible], heads[eligible], cost[eligible]
+    # Cheapest first; ties in (tail, head) order
+    order = np.lexsort((heads, tails, cost))
+    successor, predecessor = {}, {}
+    chain_head = list(range(n))
+    chain_name = list(names)
+    for k in order:
+        i, j = tails[k], heads[k]
+        if i in successor or j in predecessor:
+            continue
+        head_i, head_j = chain_head[i], chain_head[j]
+        name_i, name_j = chain_name[head_i], chain_name[head_j]
+        if pd.notna(name_i) and pd.notna(name_j) and name_i != name_j:
+            continue
+        successor[i], predecessor[j] = j, i
+        chain_name[head_i] = name_i if pd.notna(name_i) else name_j
+        node = j
+        while node is not None:
+            chain_head[node] = head_i
+            node = successor.get(node)
+    return {ids[f]: ids[chain_head[f]] for f in range(n) if chain_head[f] != f}
+
+
+def _recompute_cumulative(df: pd.DataFrame, chain: np.ndarray) -> None:
+    """
+    Recompute the running metrics of merged students in place, as metrics.update_student_metrics does.
+    chain holds an integer per row: the merged student for rows of joined fragments, -1 elsewhere.
+    """
+    rows = np.flatnonzero(chain >= 0)
+    rows = rows[np.lexsort((df["frame_idx"].to_numpy()[rows], chain[rows]))]
+    part = df.iloc[rows]
+    key = pd.Series(chain[rows], index=part.index)
+
+    # Written back as float / int64 (the binary log stores them as float32 / uint16)
+    df["attention_score"] = df["attention_score"].astype(float)
+    for col in (c for c in ["distraction_events", *CUMULATIVE_COUNTERS] if c in df.columns):
+        df[col] = df[col].astype(np.result_type(df[col].dtype, np.int64))
+
+    attentive = part["attention_status"].eq("Attentive")
+    frames_seen = key.groupby(key).cumcount() + 1
+    df.loc[part.index, "attention_score"] = (attentive.groupby(key).cumsum() / frames_seen * 100).round(1)
+    was_attentive = attentive.groupby(key).shift(fill_value=True)
+    df.loc[part.index, "distraction_events"] = (was_attentive & ~attentive).groupby(key).cumsum()
+
+    if "session_duration_minutes" in part.columns:
+        times = pd.to_datetime(part["timestamp"])
+        elapsed = times - times.groupby(key).transform("min")
+        df.loc[part.index, "session_duration_minutes"] = (elapsed.dt.total_seconds() / 60).round(2)
+
+    # Counters carry on from where the previous fragment of the chain stopped
+    fragment = part["_fragment"]
+    for col in (c for c in CUMULATIVE_COUNTERS if c in part.columns):
+        final = part.groupby(fragment, sort=False)[col].last()
+        chain_of = key.groupby(fragment, sort=False).first()
+        offset = final.groupby(chain_of, sort=False).transform(lambda s: s.cumsum().shift(fill_value=0))
+        df.loc[part.index, col] = part[col] + fragment.map(offset).to_numpy()
+
+
+def recompute_merged(df: pd.DataFrame, fragments, students=None) -> None:
+    """
+    Recompute, in place, the running metrics of merged students. fragments holds each row's
+    original (tracker) ID and df["student_id"] the merged one; students are the merged IDs to
+    recompute, by default those whose rows come from more than one tracker ID.
+    """
+    fragment_codes, _ = pd.factorize(np.asarray(fragments, dtype=object))
+    student_codes, student_ids = pd.factorize(df["student_id"])
+    if students is None:
+        fragment_count = pd.Series(fragment_codes).groupby(student_codes).nunique()
+        merged = fragment_count.reindex(student_codes, fill_value=1).to_numpy() > 1
+    else:
+        merged = student_ids.isin(list(students))[student_codes] & (student_codes >= 0)
+    if not merged.any():
+        return
+    df["_fragment"] = fragment_codes
+    _recompute_cumulative(df, np.where(merged, student_codes, -1))
+    df.drop(columns="_fragment", inplace=True)
+
+
+def link_tracks(df: pd.DataFrame, max_distance: float = MAX_POSITION_DISTANCE,
+                max_gap_seconds: float = MAX_GAP_SECONDS) -> dict:
+    """
+    The merges consolidate_tracks would make, without rewriting the log. df only needs
+    student_id, frame_idx, timestamp and, when available, nose_x / nose_y and name.
+
+    Returns:
+        dict: student_id -> ID of the first fragment of its student, for every joined fragment
+    """
+    if df.empty or "frame_idx" not in df.columns:
+        return {}
+    df = df.assign(student_id=df["student_id"].astype(str))
+    return _link_fragments(_fragment_table(df), max_distance, max_gap_seconds)
+
+
+def resolve_names(df: pd.DataFrame) -> pd.Series:
+    """First recognised name of each (merged) student_id, falling back to each row's own name"""
+    known = df[df["name"].notna() & ~df["name"].isin(UNRESOLVED_NAMES)]
+    resolved = known.groupby("student_id")["name"].first()
+    return df["student_id"].map(resolved).fillna(df["name"])
+
+
+def consolidate_rollups(rollups: pd.DataFrame, joined: dict) -> pd.DataFrame:
+    """
+    Apply link_tracks' merges to the tracker's interval rollups (<log>_intervals.csv). Each
+    fragment's rollups start at its own first frame, so session_duration_minutes and the
+    running yawning_count carry on from the earlier fragments of the same student.
+
+    Returns:
+        pd.DataFrame: The rollups with merged student IDs, in time order (the input is not modified)
+    """
+    if rollups.empty or not joined:
+        return rollups
+    rollups = rollups.copy()
+    fragment = rollups["student_id"].astype(str).rename("fragment")
+    fragment_start = pd.to_datetime(rollups["interval_start"]).groupby(fragment).transform("min")
+    rollups["student_id"] = fragment.replace(joined)
+    student_start = fragment_start.groupby(rollups["student_id"]).transform("min")
+    rollups["session_duration_minutes"] = (
+        rollups["session_duration_minutes"] + (fragment_start - student_start).dt.total_seconds() / 60).round(2)
+
+    if "yawning_count" in rollups.columns:
+        finals = rollups.groupby(fragment).agg(student_id=("student_id", "first"), yawns=("yawning_count", "max"))
+        finals["start"] = fragment_start.groupby(fragment).first()
+        finals = finals.sort_values("start")
+        earlier = finals.groupby("student_id")["yawns"].transform(lambda s: s.cumsum().shift(fill_value=0))
+        rollups["yawning_count"] += fragment.map(earlier).to_numpy()
+
+    if "name" in rollups.columns:
+        rollups["name"] = resolve_names(rollups)
+    logger.info(f"Merged {len(joined)} fragment IDs in the interval rollups")
+    return rollups.sort_values("interval_start", kind="stable").reset_index(drop=True)
+
+
+def consolidate_tracks(df: pd.DataFrame, max_distance: float = MAX_POSITION_DISTANCE,
+                       max_gap_seconds: float = MAX_GAP_SECONDS) -> pd.DataFrame:
+    """
+    Merge student IDs the tracker split up (track lost, face occluded, student left and came back).
+
+    IDs whose time spans do not overlap are joined when the later one appears where the earlier
+    one was last seen (nose_x / nose_y columns) or under the same recognised name. Every merged
+    student takes the ID of their first fragment, and their cumulative attention_score,
+    distraction_events, counters and session duration are recomputed over the whole span.
+
+    Args:
+        df (pd.DataFrame): Attention log as written by the tracker
+        max_distance (float): Max hand-over distance, as a fraction of the frame
+        max_gap_seconds (float): Max time between the end of one fragment and the start of the next
+
+    Returns:
+        pd.DataFrame: The log with merged student IDs (the input is not modified)
+    """
+    return apply_track_merges(df, link_tracks(df, max_distance, max_gap_seconds))
+
+
+def apply_track_merges(df: pd.DataFrame, joined: dict) -> pd.DataFrame:
+    """
+    Relabel the fragments link_tracks joined and recompute the running metrics of their students.
+
+    Returns:
+        pd.DataFrame: The log with merged student IDs (the input is not modified)
+    """
+    if df.empty:
+        return df
+    df = df.copy()
+    df["student_id"] = df["student_id"].astype(str)
+    if not joined:
+        return df
+    # Relabel through the unique IDs instead of comparing every row against every merged ID
+    codes, fragment_ids = pd.factorize(df["student_id"])
+    targets = np.array([joined.get(s_id, s_id) for s_id in fragment_ids], dtype=object)
+    df["student_id"] = targets[codes]
+    recompute_merged(df, fragment_ids.to_numpy()[codes], set(joined.values()))
+    logger.info(f"Merged {len(joined)} fragment IDs into {len(set(joined.values()))} students")
+    return df
+
+
+def track_merges_path(log_path: str) -> str:
+    """Where process_csv_file keeps link_tracks' merges, so the timeline shows the same students"""
+    return f"{os.path.splitext(log_path)[0]}_tracks.json"
+
+
+def save_track_merges(log_path: str, joined: dict) -> None:
+    path = track_merges_path(log_path)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(joined, f)
+    os.replace(tmp_path, path)
+
+
+def load_track_merges(log_path: str) -> dict:
+    """link_tracks' merges saved for a log, {} if the report has not been built"""
+    path = track_merges_path(log_path)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
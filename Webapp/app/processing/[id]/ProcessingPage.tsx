@@ -7,7 +7,7 @@ import { Card, CardContent } from '@/components/ui/card';
 import { Progress } from '@/components/ui/progress';
 import { Button } from '@/components/ui/button';
 import { Loader2Icon, AlertCircleIcon, CheckCircleIcon, WifiOffIcon } from 'lucide-react';
-import { isReportComplete, pollUntilComplete } from '@/app/utils/reportStatus';
+import { isReportComplete, pollUntilComplete, subscribeToProgress, JobProgressEvent } from '@/app/utils/reportStatus';
 
 interface Props {
   reportId: string;
@@ -20,6 +20,8 @@ export default function ProcessingPage({ reportId }: Props) {
   const [pollAttempts, setPollAttempts] = useState(0);
   const [connectionIssue, setConnectionIssue] = useState(false);
   const [estimatedTimeRemaining, setEstimatedTimeRemaining] = useState<number | null>(null);
+  const [stage, setStage] = useState<JobProgressEvent['stage'] | null>(null);
+  const [framesText, setFramesText] = useState<string | null>(null);
   const router = useRouter();
 
   // Function to check if report exists directly
@@ -61,51 +63,54 @@ export default function ProcessingPage({ reportId }: Props) {
       return;
     }
     
-    // Skip processing if status is already completed
-    if (status === 'completed') {
-      console.log("Status already completed, skipping processing");
-      return;
-    }
-    
     console.log("Starting processing for reportId:", reportId);
     setStatus('processing');
-    
-    // Initialize the estimated time based on typical processing duration
-    setEstimatedTimeRemaining(60); // Assume 60 seconds initially
-    
-    // Use our utility to poll until the report is ready
-    const cancelPolling = pollUntilComplete(reportId, () => {
-      console.log("Report is complete (from utility)");
-      setStatus('completed');
-      setProgress(100);
-      setEstimatedTimeRemaining(0);
-    }, 60, 30000); // Polling every 30 seconds to reduce requests
-    
-    // Single interval for UI updates - much less frequent
-    const updateInterval = setInterval(() => {
-      // Check if we should continue updating UI
-      if (status === 'pending' || status === 'processing') {
-        // Update time remaining
-        if (estimatedTimeRemaining !== null && estimatedTimeRemaining > 0) {
-          setEstimatedTimeRemaining(prev => {
-            if (prev === null) return null;
-            return Math.max(0, prev - 5); // Decrease by 5 seconds at a time
-          });
+
+    let cancelPolling: (() => void) | null = null;
+
+    // Fallback when the progress stream is unavailable: poll the status endpoint
+    const startPolling = () => {
+      setEstimatedTimeRemaining(60); // Assume 60 seconds initially
+      cancelPolling = pollUntilComplete(reportId, () => {
+        console.log("Report is complete (from utility)");
+        setStatus('completed');
+        setProgress(100);
+        setEstimatedTimeRemaining(0);
+      }, 60, 30000); // Polling every 30 seconds to reduce requests
+    };
+
+    // Progress is pushed by the backend as it processes the video
+    const closeStream = subscribeToProgress(
+      reportId,
+      (event) => {
+        setConnectionIssue(false);
+        setStage(event.stage);
+        setProgress(event.percent);
+        setEstimatedTimeRemaining(event.stage_eta_seconds);
+        if (event.stage === 'cv' && event.total_frames > 0) {
+          setFramesText(`${event.frames_processed}/${event.total_frames} frames · ${event.fps.toFixed(1)} fps`);
+        } else {
+          setFramesText(null);
         }
-        
-        // Update progress at moderate speed
-        setProgress((prev) => {
-          if (prev >= 85) return 85; // Cap at 85% until complete
-          return prev + Math.random() * 2; // Faster progress
-        });
-      }
-    }, 5000); // Run every 5 seconds for UI updates
+      },
+      (finalStatus) => {
+        if (finalStatus === 'completed') {
+          setStatus('completed');
+          setProgress(100);
+          setEstimatedTimeRemaining(0);
+        } else {
+          setStatus('error');
+          setError('Video processing failed. Please try uploading again.');
+        }
+      },
+      startPolling
+    );
 
     return () => {
-      clearInterval(updateInterval);
-      cancelPolling();
+      closeStream();
+      if (cancelPolling) cancelPolling();
     };
-  }, [reportId, status, pollAttempts, estimatedTimeRemaining]);
+  }, [reportId, pollAttempts]);
 
   const getStatusText = () => {
     switch (status) {
@@ -125,7 +130,16 @@ export default function ProcessingPage({ reportId }: Props) {
   };
 
   const getStepProgress = () => {
-    const steps = [
+    // With a progress stream the steps follow the backend stage; otherwise the progress estimate
+    const stageOrder = ['queued', 'cv', 'aggregation', 'llm', 'writing', 'completed'];
+    const stageIndex = stage ? stageOrder.indexOf(stage) : -1;
+    const steps = stageIndex >= 0 ? [
+      { name: "Initializing", complete: stageIndex >= 1 },
+      { name: "Reading video frames", complete: stageIndex >= 2 },
+      { name: "Analyzing engagement metrics", complete: stageIndex >= 3 },
+      { name: "Generating report", complete: stageIndex >= 4 },
+      { name: "Finishing up", complete: stageIndex >= 5 }
+    ] : [
       { name: "Initializing", complete: progress > 10 },
       { name: "Reading video frames", complete: progress > 35 },
       { name: "Analyzing engagement metrics", complete: progress > 65 },
@@ -147,6 +161,14 @@ export default function ProcessingPage({ reportId }: Props) {
   };
 
   const getTimeRemainingText = () => {
+    if (framesText && estimatedTimeRemaining === null) {
+      return framesText;
+    }
+
+    if (stage && stage !== 'cv' && stage !== 'writing') {
+      return stage === 'llm' ? "Generating AI report..." : "Aggregating attention data...";
+    }
+
     if (!estimatedTimeRemaining || estimatedTimeRemaining <= 0) {
       return "Finishing up...";
     }
@@ -88,4 +88,66 @@ export function pollUntilComplete(
   return () => {
     isCancelled = true;
   };
-}
\ No newline at end of file
+}
+
+export interface JobProgressEvent {
+  report_id: string;
+  seq: number;
+  stage: 'queued' | 'cv' | 'aggregation' | 'llm' | 'writing' | 'completed' | 'error';
+  frames_processed: number;
+  total_frames: number;
+  fps: number;
+  stage_eta_seconds: number | null;
+  percent: number;
+  message: string;
+  timestamp: number;
+}
+
+/**
+ * Subscribes to server-sent progress events for a report
+ * @param reportId The ID of the report to follow
+ * @param onProgress Called for every progress event
+ * @param onDone Called once with the final stage ("completed" or "error")
+ * @param onUnavailable Called if the stream cannot be opened, so callers can fall back to polling
+ * @returns A function to close the stream
+ */
+export function subscribeToProgress(
+  reportId: string,
+  onProgress: (event: JobProgressEvent) => void,
+  onDone: (status: string) => void,
+  onUnavailable: () => void
+): () => void {
+  if (typeof window === 'undefined' || typeof EventSource === 'undefined') {
+    onUnavailable();
+    return () => {};
+  }
+
+  const source = new EventSource(`${config.apiUrl}/api/progress/${reportId}/stream`);
+  let receivedAny = false;
+  let finished = false;
+
+  source.addEventListener('progress', (e) => {
+    receivedAny = true;
+    onProgress(JSON.parse((e as MessageEvent).data));
+  });
+
+  source.addEventListener('done', (e) => {
+    finished = true;
+    source.close();
+    onDone(JSON.parse((e as MessageEvent).data).status);
+  });
+
+  source.onerror = () => {
+    // EventSource reconnects on its own once connected; only give up if it never worked
+    if (!receivedAny && !finished) {
+      console.log("Progress stream unavailable, falling back to polling");
+      source.close();
+      onUnavailable();
+    }
+  };
+
+  return () => {
+    finished = true;
+    source.close();
+  };
+}
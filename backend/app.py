@@ -2,17 +2,24 @@ import os
 import uuid
 import threading
 import json
-import psycopg2
-from psycopg2 import sql
+import asyncio
 import hashlib
+import time
 from dotenv import load_dotenv
-from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Query, Cookie, Response, Depends # type: ignore
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException, Query, Cookie, Header, Response, Depends # type: ignore
+from fastapi.concurrency import run_in_threadpool # type: ignore
 from fastapi.middleware.cors import CORSMiddleware # type: ignore
-from fastapi.responses import RedirectResponse # type: ignore
-from typing import Optional
+from fastapi.responses import RedirectResponse, StreamingResponse, PlainTextResponse # type: ignore
+from typing import Optional, List
 
 # Import video processor module
-from .video_processor import process_video_task, get_status, SUPPORTED_LANGUAGES
+from .video_processor import process_video_task, get_status, get_report_path, find_attention_log, read_timeline, SUPPORTED_LANGUAGES
+from .job_store import save_job, get_jobs, fail_stale_jobs
+from .progress import get_progress, FINAL_STAGES
+from .tracing import render_prometheus
+from .report_cache import get_report_entry, choose_encoding, etag_matches, cache_stats as report_cache_stats
+from .db import init_pool, close_pool, get_connection, pool_stats
+from .session_cache import get_cached_user, cache_user, invalidate_token, invalidate_user, cache_stats
 
 app = FastAPI()
 
@@ -42,36 +49,32 @@ load_dotenv()
 # Check if we're in production environment
 IS_PRODUCTION = os.getenv("ENV") == "production"
 
-# Database connection function
-import os
-import psycopg2
-from urllib.parse import urlparse
-from fastapi import HTTPException
+# Jobs left "processing" by a previous server run are failed at startup. Other workers on the
+# host share the job store, so only jobs without an update for this long are considered dead.
+STALE_JOB_SECONDS = float(os.getenv("STALE_JOB_SECONDS", "300"))
 
-def get_db_connection():
+@app.on_event("startup")
+def open_db_pool():
+    """Create the database connection pool once per worker"""
     try:
-        # Retrieve the DATABASE_URL from environment variables
-        db_url = os.environ.get("DATABASE_URL")
-        if not db_url:
-            raise HTTPException(status_code=500, detail="Database URL not set")
-        
-        # Parse the URL into components
-        result = urlparse(db_url)
-        
-        # Connect to the PostgreSQL database
-        connection = psycopg2.connect(
-            host=result.hostname,
-            database=result.path[1:],  # Remove the leading '/' in the database name
-            user=result.username,
-            password=result.password,
-            port=result.port
-        )
-        
-        connection.autocommit = True
-        return connection
+        init_pool()
     except Exception as e:
-        print(f"Error connecting to database: {e}")
-        raise HTTPException(status_code=500, detail="Database connection error")
+        # Video endpoints still work without a database; auth endpoints retry lazily
+        print(f"Error creating database pool: {e}")
+
+@app.on_event("startup")
+def fail_interrupted_jobs():
+    """Jobs run in worker threads, so a restart leaves their rows stuck in processing"""
+    try:
+        failed = fail_stale_jobs(time.time() - STALE_JOB_SECONDS)
+        if failed:
+            print(f"Marked {failed} interrupted jobs as failed")
+    except Exception as e:
+        print(f"Error cleaning up interrupted jobs: {e}")
+
+@app.on_event("shutdown")
+def close_db_pool():
+    close_pool()
 
 # Password hashing function
 def hash_password(password: str) -> str:
@@ -112,6 +115,9 @@ async def upload_video(
         with open(video_path, "wb") as buffer:
             buffer.write(await file.read())
     print(f"Video saved to {video_path}")
+
+    # Register the job before the thread starts so status polls never see "not found"
+    await run_in_threadpool(save_job, video_id, status="processing", lesson_name=lessonName, language=language)
     
     # Start processing in a separate thread
     thread = threading.Thread(
@@ -130,47 +136,169 @@ async def get_processing_status(report_id: str):
     """Check the processing status of a video"""
     print(f"Checking status for report_id: {report_id}")
     
-    status = get_status(report_id)
+    status = await run_in_threadpool(get_status, report_id)
     return {"status": status}
 
+# Upper bound on ids per batched status request
+MAX_STATUS_BATCH = 100
+
+@app.get("/api/status")
+async def get_processing_statuses(ids: List[str] = Query(...)):
+    """Check the processing status of several videos in one request"""
+    if len(ids) > MAX_STATUS_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STATUS_BATCH} ids per request")
+
+    jobs = await run_in_threadpool(get_jobs, ids)
+    statuses = {}
+    for report_id in ids:
+        job = jobs.get(report_id)
+        if job is None:
+            statuses[report_id] = {"status": "not found"}
+            continue
+        statuses[report_id] = {
+            "status": job["status"],
+            "created_at": job["created_at"],
+            "started_at": job["started_at"],
+            "finished_at": job["finished_at"],
+            "error": job["error"],
+        }
+    return {"statuses": statuses}
+
+# How often the progress stream checks for a new event, and how often it sends keep-alives
+PROGRESS_STREAM_INTERVAL = 0.5
+PROGRESS_STREAM_HEARTBEAT = 15.0
+
+@app.get("/api/progress/{report_id}")
+async def get_processing_progress(report_id: str):
+    """Latest structured progress event (stage, frames, fps, ETA) for a video"""
+    event = await run_in_threadpool(get_progress, report_id)
+    if event is None:
+        raise HTTPException(status_code=404, detail=f"No job found for ID: {report_id}")
+    return event
+
+@app.get("/api/progress/{report_id}/stream")
+async def stream_processing_progress(report_id: str):
+    """Server-Sent Events stream of progress events, closed once the job finishes"""
+    if await run_in_threadpool(get_progress, report_id) is None:
+        raise HTTPException(status_code=404, detail=f"No job found for ID: {report_id}")
+
+    async def event_stream():
+        last_sent = None
+        last_write = asyncio.get_event_loop().time()
+        while True:
+            event = await run_in_threadpool(get_progress, report_id)
+            now = asyncio.get_event_loop().time()
+            if event is not None and (event["stage"], event["seq"]) != last_sent:
+                last_sent = (event["stage"], event["seq"])
+                last_write = now
+                yield f"event: progress\ndata: {json.dumps(event)}\n\n"
+                if event["stage"] in FINAL_STAGES:
+                    yield f"event: done\ndata: {json.dumps({'status': event['stage']})}\n\n"
+                    return
+            elif now - last_write >= PROGRESS_STREAM_HEARTBEAT:
+                last_write = now
+                yield ": keep-alive\n\n"
+            await asyncio.sleep(PROGRESS_STREAM_INTERVAL)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _resolve_report_path(report_id: str) -> str:
+    """Find where a report is stored"""
+    # Use the location recorded by the job store when available
+    report_path = get_report_path(report_id)
+
+    if not report_path:
+        # Reports generated before the job store existed: probe the known directories
+        backend_reports_dir = os.path.join(BASE_DIR, "reports")
+        backend_report_path = os.path.join(backend_reports_dir, f"{report_id}.json")
+        report_path = backend_report_path if os.path.exists(backend_report_path) else os.path.join(UPLOAD_DIR, f"{report_id}.json")
+    return report_path
+
 @app.get("/api/report/{report_id}")
-async def get_report(report_id: str):
+async def get_report(
+    report_id: str,
+    if_none_match: Optional[str] = Header(None),
+    accept_encoding: Optional[str] = Header(None)
+):
     """Get the processing report for a video"""
     print(f"Getting report for report_id: {report_id}")
     
     # First, check if processing is still ongoing
-    status = get_status(report_id)
+    status = await run_in_threadpool(get_status, report_id)
     if status == "processing":
         return {"status": "processing", "message": "Report is still being generated"}
-    
-    # First try to find the report in the backend reports directory
-    backend_reports_dir = os.path.join(BASE_DIR, "reports")
-    backend_report_path = os.path.join(backend_reports_dir, f"{report_id}.json")
-    
-    # If not in backend reports dir, look in upload directory as fallback
-    report_path = backend_report_path if os.path.exists(backend_report_path) else os.path.join(UPLOAD_DIR, f"{report_id}.json")
-    
-    if os.path.exists(report_path):
-        try:
-            with open(report_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Error reading report: {str(e)}")
-    else:
+
+    report_path = await run_in_threadpool(_resolve_report_path, report_id)
+
+    # Reports are written once, so the stored bytes are served as-is (no parse/re-serialize)
+    try:
+        entry = await run_in_threadpool(get_report_entry, report_path)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading report: {str(e)}")
+    if entry is None:
         raise HTTPException(status_code=404, detail=f"Report not found for ID: {report_id}")
 
+    headers = {
+        "ETag": entry["etag"],
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "public, max-age=31536000, immutable" if status == "completed" else "no-cache",
+    }
+    if etag_matches(entry, if_none_match):
+        return Response(status_code=304, headers=headers)
+
+    encoding = choose_encoding(entry, accept_encoding)
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(content=entry["bodies"][encoding], media_type="application/json", headers=headers)
+
+# Upper bound on rows per timeline response
+MAX_TIMELINE_ROWS = 20000
+
+@app.get("/api/timeline/{report_id}")
+async def get_attention_timeline(
+    report_id: str,
+    student_id: Optional[str] = None,
+    start: Optional[float] = Query(None, ge=0),
+    end: Optional[float] = Query(None, ge=0)
+):
+    """Per-frame attention rows of one student and/or one time window (seconds from session start)"""
+    if student_id is None and start is None and end is None:
+        raise HTTPException(status_code=400, detail="Give a student_id and/or a start/end window")
+    log_path = await run_in_threadpool(find_attention_log, report_id, UPLOAD_DIR)
+    if log_path is None:
+        raise HTTPException(status_code=404, detail=f"No attention log found for ID: {report_id}")
+    try:
+        timeline = await run_in_threadpool(read_timeline, log_path, student_id, start, end, MAX_TIMELINE_ROWS)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading attention log: {str(e)}")
+    return {"report_id": report_id, "student_id": student_id, "start": start, "end": end, **timeline}
+
+@app.get("/api/report-cache")
+async def get_report_cache_stats():
+    """Return hit/miss counters and size of the in-memory report cache"""
+    return report_cache_stats()
+
 @app.get("/report/{report_id}")
 async def redirect_to_report(report_id: str):
     """Redirect to the report page"""
     print(f"Redirecting to report for report_id: {report_id}")
     
     # Check if the report exists
-    report_path = os.path.join(UPLOAD_DIR, f"{report_id}.json")
-    if os.path.exists(report_path):
+    report_path = await run_in_threadpool(_resolve_report_path, report_id)
+    if await run_in_threadpool(os.path.exists, report_path):
         return RedirectResponse(url=f"/api/report/{report_id}")
     else:
         raise HTTPException(status_code=404, detail=f"Report not found for ID: {report_id}")
 
+@app.get("/metrics")
+async def get_metrics():
+    """Pipeline stage timings in the Prometheus text format"""
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
 @app.get("/api/languages")
 async def get_supported_languages():
     """Return a list of supported languages for the application"""
@@ -178,6 +306,79 @@ async def get_supported_languages():
         "languages": [{"name": lang, "code": code} for lang, code in SUPPORTED_LANGUAGES.items()]
     }
 
+def _create_user(name: str, email: str, hashed_password: str):
+    """Insert a new user and return (user_id, auth_token), or None if the email is taken"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            # Check if user with this email already exists
+            print(f"[DEBUG] Checking if email already exists: {email}")
+            cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
+            if cursor.fetchone():
+                return None
+
+            # Create new user with auth token
+            auth_token = generate_auth_token()
+            print(f"[DEBUG] Inserting new user: {name}, {email}")
+            cursor.execute(
+                "INSERT INTO users (name, email, password, auth_token) VALUES (%s, %s, %s, %s) RETURNING id",
+                (name, email, hashed_password, auth_token)
+            )
+            user_id = cursor.fetchone()[0]
+            print(f"[DEBUG] User created with ID: {user_id}")
+            return user_id, auth_token
+
+def _authenticate_user(email: str, hashed_password: str):
+    """Check credentials and rotate the auth token; returns (user_id, auth_token) or None"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            print(f"[DEBUG] Looking up user with email: {email}")
+            cursor.execute("SELECT id, password FROM users WHERE email = %s", (email,))
+            user = cursor.fetchone()
+
+            if not user:
+                print(f"[DEBUG] User not found: {email}")
+                return None
+
+            if user[1] != hashed_password:
+                print(f"[DEBUG] Invalid password for user: {email}")
+                return None
+
+            user_id = user[0]
+            print(f"[DEBUG] Valid credentials for user ID: {user_id}")
+
+            # Generate and store new auth token
+            auth_token = generate_auth_token()
+            cursor.execute(
+                "UPDATE users SET auth_token = %s WHERE id = %s",
+                (auth_token, user_id)
+            )
+            print(f"[DEBUG] Updated auth token in database for user ID: {user_id}")
+            return user_id, auth_token
+
+def _find_user_by_token(auth_token: str):
+    """Return (id, name, email) for the given auth token, or None (uses idx_users_auth_token)"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT id, name, email FROM users WHERE auth_token = %s", (auth_token,))
+            return cursor.fetchone()
+
+def _clear_auth_token(auth_token: str):
+    """Revoke a token so it can no longer be used to authenticate"""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("UPDATE users SET auth_token = NULL WHERE auth_token = %s", (auth_token,))
+
+def _set_auth_cookie(response: Response, auth_token: str):
+    response.set_cookie(
+        key="auth_token", 
+        value=auth_token, 
+        httponly=True, 
+        secure=True,  # Always use secure cookies for Vercel deployment
+        samesite="none",  # Required for cross-origin requests
+        max_age=604800,  # 7 days
+        domain=None  # Allow the browser to set the appropriate domain
+    )
+
 @app.post("/api/signup")
 async def signup(
     name: str = Form(...),
@@ -192,61 +393,25 @@ async def signup(
     print(f"[DEBUG] Password hashed for user: {email}")
     
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Check if user with this email already exists
-        print(f"[DEBUG] Checking if email already exists: {email}")
-        cursor.execute("SELECT id FROM users WHERE email = %s", (email,))
-        if cursor.fetchone():
-            print(f"[DEBUG] Email already exists: {email}")
-            cursor.close()
-            conn.close()
-            raise HTTPException(status_code=400, detail="User with this email already exists")
-        
-        # Generate auth token
-        auth_token = generate_auth_token()
-        print(f"[DEBUG] Auth token generated for: {email}")
-        
-        # Create new user with auth token
-        print(f"[DEBUG] Inserting new user: {name}, {email}")
-        cursor.execute(
-            "INSERT INTO users (name, email, password, auth_token) VALUES (%s, %s, %s, %s) RETURNING id",
-            (name, email, hashed_password, auth_token)
-        )
-        user_id = cursor.fetchone()[0]
-        print(f"[DEBUG] User created with ID: {user_id}")
-        
-        # Generate and store auth token
-        auth_token = generate_auth_token()
-        print(f"[DEBUG] Updating auth token for user ID: {user_id}")
-        cursor.execute(
-            "UPDATE users SET auth_token = %s WHERE id = %s",
-            (auth_token, user_id)
-        )
-        
-        cursor.close()
-        conn.close()
-        
-        # Set auth cookie
-        print(f"[DEBUG] Setting auth cookie for user ID: {user_id}")
-        response.set_cookie(
-            key="auth_token", 
-            value=auth_token, 
-            httponly=True, 
-            secure=True,  # Always use secure cookies for Vercel deployment
-            samesite="none",  # Required for cross-origin requests
-            max_age=604800,  # 7 days
-            domain=None  # Allow the browser to set the appropriate domain
-        )
-        
-        print(f"[DEBUG] User registration successful: {user_id}")
-        return {"message": "User registered successfully", "userId": user_id}
-        
+        # Database work is blocking, so run it on the threadpool
+        created = await run_in_threadpool(_create_user, name, email, hashed_password)
     except Exception as e:
         print(f"[ERROR] Error during signup: {e}")
         raise HTTPException(status_code=500, detail="Registration failed")
 
+    if created is None:
+        print(f"[DEBUG] Email already exists: {email}")
+        raise HTTPException(status_code=400, detail="User with this email already exists")
+
+    user_id, auth_token = created
+
+    # Set auth cookie
+    print(f"[DEBUG] Setting auth cookie for user ID: {user_id}")
+    _set_auth_cookie(response, auth_token)
+    
+    print(f"[DEBUG] User registration successful: {user_id}")
+    return {"message": "User registered successfully", "userId": user_id}
+
 @app.post("/api/login")
 async def login(
     email: str = Form(...),
@@ -255,104 +420,87 @@ async def login(
 ):
     """Log in a user"""
     print(f"[DEBUG] Login attempt for email: {email}")
+    # Hash the provided password
+    hashed_password = hash_password(password)
+    print(f"[DEBUG] Password hashed for login attempt: {email}")
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Hash the provided password
-        hashed_password = hash_password(password)
-        print(f"[DEBUG] Password hashed for login attempt: {email}")
-        
-        # Find user
-        print(f"[DEBUG] Looking up user with email: {email}")
-        cursor.execute("SELECT id, password FROM users WHERE email = %s", (email,))
-        user = cursor.fetchone()
-        
-        if not user:
-            print(f"[DEBUG] User not found: {email}")
-            cursor.close()
-            conn.close()
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-        
-        if user[1] != hashed_password:
-            print(f"[DEBUG] Invalid password for user: {email}")
-            cursor.close()
-            conn.close()
-            raise HTTPException(status_code=401, detail="Invalid credentials")
-        
-        user_id = user[0]
-        print(f"[DEBUG] Valid credentials for user ID: {user_id}")
-        
-        # Generate and store new auth token
-        auth_token = generate_auth_token()
-        print(f"[DEBUG] Generated auth token for user ID: {user_id}")
-        cursor.execute(
-            "UPDATE users SET auth_token = %s WHERE id = %s",
-            (auth_token, user_id)
-        )
-        print(f"[DEBUG] Updated auth token in database for user ID: {user_id}")
-        
-        cursor.close()
-        conn.close()
-        
-        # Set auth cookie
-        print(f"[DEBUG] Setting auth cookie for user ID: {user_id}")
-        response.set_cookie(
-            key="auth_token", 
-            value=auth_token, 
-            httponly=True, 
-            secure=True,  # Always use secure cookies for Vercel deployment
-            samesite="none",  # Required for cross-origin requests
-            max_age=604800,  # 7 days
-            domain=None  # Allow the browser to set the appropriate domain
-        )
-        
-        print(f"[DEBUG] Login successful for user ID: {user_id}")
-        return {"message": "Login successful", "userId": user_id}
-        
+        authenticated = await run_in_threadpool(_authenticate_user, email, hashed_password)
     except Exception as e:
         print(f"[ERROR] Error during login: {e}")
         raise HTTPException(status_code=500, detail="Login failed")
 
+    if authenticated is None:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    user_id, auth_token = authenticated
+    # The previous token was rotated out, drop it from the session cache
+    invalidate_user(user_id)
+
+    # Set auth cookie
+    print(f"[DEBUG] Setting auth cookie for user ID: {user_id}")
+    _set_auth_cookie(response, auth_token)
+    
+    print(f"[DEBUG] Login successful for user ID: {user_id}")
+    return {"message": "Login successful", "userId": user_id}
+
 @app.post("/api/logout")
-async def logout(response: Response):
+async def logout(response: Response, auth_token: str = Cookie(None)):
     """Log out the current user"""
+    if auth_token:
+        invalidate_token(auth_token)
+        try:
+            await run_in_threadpool(_clear_auth_token, auth_token)
+        except Exception as e:
+            print(f"[ERROR] Error revoking auth token on logout: {e}")
     response.delete_cookie(key="auth_token")
     return {"message": "Logged out successfully"}
 
-@app.get("/api/me")
-async def get_current_user(auth_token: str = Cookie(None)):
-    """Get current user information"""
-    print(f"[DEBUG] /api/me called with auth_token: {auth_token}")
+async def _resolve_user(auth_token: Optional[str], use_cache: bool = True) -> dict:
+    """
+    User behind an auth token, or 401. use_cache=False always checks the database, so a token
+    revoked on another worker is rejected at once (the session cache is per process).
+    """
     if not auth_token:
         print("[DEBUG] No auth_token cookie found")
         raise HTTPException(status_code=401, detail="Not authenticated")
-        
+
+    if use_cache:
+        cached = get_cached_user(auth_token)
+        if cached is not None:
+            return cached
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT id, name, email FROM users WHERE auth_token = %s", (auth_token,))
-        user = cursor.fetchone()
-        
-        cursor.close()
-        conn.close()
-        
-        if not user:
-            print(f"[DEBUG] No user found with auth_token: {auth_token}")
-            raise HTTPException(status_code=401, detail="Invalid authentication")
-        
-        print(f"[DEBUG] User authenticated successfully: {user[0]}")    
-        return {
-            "id": user[0],
-            "name": user[1],
-            "email": user[2]
-        }
-        
+        user = await run_in_threadpool(_find_user_by_token, auth_token)
     except Exception as e:
         print(f"Error getting current user: {e}")
         raise HTTPException(status_code=500, detail="Authentication error")
 
+    if not user:
+        print(f"[DEBUG] No user found with auth_token: {auth_token}")
+        raise HTTPException(status_code=401, detail="Invalid authentication")
+    
+    print(f"[DEBUG] User authenticated successfully: {user[0]}")    
+    current_user = {
+        "id": user[0],
+        "name": user[1],
+        "email": user[2]
+    }
+    cache_user(auth_token, current_user)
+    return current_user
+
+@app.get("/api/me")
+async def get_current_user(auth_token: str = Cookie(None)):
+    """Get current user information"""
+    print(f"[DEBUG] /api/me called with auth_token: {auth_token}")
+    return await _resolve_user(auth_token)
+
+@app.get("/api/db/pool")
+async def get_db_pool_stats(auth_token: str = Cookie(None)):
+    """Return database connection pool size and usage counters (logged-in users only)"""
+    await _resolve_user(auth_token, use_cache=False)
+    return {**pool_stats(), "session_cache": cache_stats()}
+
 if __name__ == "__main__":
     import uvicorn
     port = int(os.environ.get("PORT", 8000))
@@ -0,0 +1,108 @@
+import os
+import threading
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+from psycopg2 import pool
+
+# Pool bounds, overridable from the environment
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+
+_pool = None
+_pool_lock = threading.Lock()
+# Caps concurrent checkouts so callers wait for a free connection instead of
+# getting a PoolError when every connection is in use
+_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+
+_stats = {
+    "checkouts": 0,
+    "in_use": 0,
+    "peak_in_use": 0,
+    "discarded": 0,
+    "errors": 0,
+}
+_stats_lock = threading.Lock()
+
+
+def _connection_kwargs() -> dict:
+    """Parse DATABASE_URL into psycopg2 connect arguments."""
+    db_url = os.environ.get("DATABASE_URL")
+    if not db_url:
+        raise RuntimeError("Database URL not set")
+
+    result = urlparse(db_url)
+    return {
+        "host": result.hostname,
+        "database": result.path[1:],  # Remove the leading '/' in the database name
+        "user": result.username,
+        "password": result.password,
+        "port": result.port,
+    }
+
+
+def init_pool():
+    """Create the shared connection pool. Safe to call more than once."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = pool.ThreadedConnectionPool(DB_POOL_MIN, DB_POOL_MAX, **_connection_kwargs())
+            print(f"Database pool created (min={DB_POOL_MIN}, max={DB_POOL_MAX})")
+    return _pool
+
+
+def close_pool():
+    """Close every pooled connection (called on app shutdown)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            print("Database pool closed")
+
+
+@contextmanager
+def get_connection():
+    """
+    Borrow an autocommit connection from the pool and return it afterwards.
+    Blocking: call from a worker thread, not directly on the event loop.
+    """
+    db_pool = _pool or init_pool()
+    _slots.acquire()
+    conn = None
+    try:
+        try:
+            conn = db_pool.getconn()
+            conn.autocommit = True
+        except Exception:
+            with _stats_lock:
+                _stats["errors"] += 1
+            raise
+
+        with _stats_lock:
+            _stats["checkouts"] += 1
+            _stats["in_use"] += 1
+            _stats["peak_in_use"] = max(_stats["peak_in_use"], _stats["in_use"])
+
+        yield conn
+    finally:
+        if conn is not None:
+            # Drop connections that were closed under us (server restart, network error)
+            broken = bool(conn.closed)
+            db_pool.putconn(conn, close=broken)
+            with _stats_lock:
+                _stats["in_use"] -= 1
+                if broken:
+                    _stats["discarded"] += 1
+        _slots.release()
+
+
+def pool_stats() -> dict:
+    """Snapshot of pool size and usage counters."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["min_size"] = DB_POOL_MIN
+    stats["max_size"] = DB_POOL_MAX
+    stats["initialized"] = _pool is not None
+    stats["available"] = DB_POOL_MAX - stats["in_use"]
+    return stats
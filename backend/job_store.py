@@ -0,0 +1,135 @@
+import os
+import time
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional
+
+# SQLite file shared by every uvicorn worker on this host
+JOB_STORE_PATH = os.getenv(
+    "JOB_STORE_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "jobs.db")
+)
+
+JOB_COLUMNS = [
+    "report_id", "status", "lesson_name", "language",
+    "created_at", "started_at", "finished_at", "updated_at",
+    "report_path", "error", "progress",
+]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    report_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    lesson_name TEXT,
+    language TEXT,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    updated_at REAL NOT NULL,
+    report_path TEXT,
+    error TEXT,
+    progress TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at);
+"""
+
+# Columns added after the first release, applied to existing job stores
+_MIGRATIONS = {
+    "progress": "ALTER TABLE jobs ADD COLUMN progress TEXT",
+}
+
+# sqlite3 connections must not be shared across threads, keep one per thread
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized_path = None
+
+
+def _connect() -> sqlite3.Connection:
+    global _initialized_path
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.path == JOB_STORE_PATH:
+        return conn
+
+    conn = sqlite3.connect(JOB_STORE_PATH, timeout=10, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    # WAL lets readers (status polls) run while a worker is writing
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    with _init_lock:
+        if _initialized_path != JOB_STORE_PATH:
+            conn.executescript(_SCHEMA)
+            existing = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+            for column, statement in _MIGRATIONS.items():
+                if column not in existing:
+                    conn.execute(statement)
+            _initialized_path = JOB_STORE_PATH
+    _local.conn = conn
+    _local.path = JOB_STORE_PATH
+    return conn
+
+
+def save_job(report_id: str, **fields) -> None:
+    """
+    Insert or update a job row. Only the given fields are changed on update.
+    Example: save_job(video_id, status="completed", finished_at=time.time())
+    """
+    unknown = set(fields) - set(JOB_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown job fields: {sorted(unknown)}")
+
+    now = time.time()
+    fields.setdefault("updated_at", now)
+    insert_fields = {"status": "processing", "created_at": now, **fields}
+
+    columns = ["report_id"] + list(insert_fields)
+    placeholders = ", ".join("?" for _ in columns)
+    updates = ", ".join(f"{name} = excluded.{name}" for name in fields)
+    _connect().execute(
+        f"INSERT INTO jobs ({', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT(report_id) DO UPDATE SET {updates}",
+        [report_id] + list(insert_fields.values())
+    )
+
+
+def get_job(report_id: str) -> Optional[Dict[str, Any]]:
+    row = _connect().execute("SELECT * FROM jobs WHERE report_id = ?", (report_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def get_jobs(report_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    """Fetch many jobs in one query, keyed by report_id (missing ids are omitted)"""
+    if not report_ids:
+        return {}
+    placeholders = ", ".join("?" for _ in report_ids)
+    rows = _connect().execute(
+        f"SELECT * FROM jobs WHERE report_id IN ({placeholders})", list(report_ids)
+    ).fetchall()
+    return {row["report_id"]: dict(row) for row in rows}
+
+
+def list_jobs(status: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+    """Most recent jobs first, optionally filtered by status"""
+    if status:
+        rows = _connect().execute(
+            "SELECT * FROM jobs WHERE status = ? ORDER BY created_at DESC LIMIT ?", (status, limit)
+        ).fetchall()
+    else:
+        rows = _connect().execute(
+            "SELECT * FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+        ).fetchall()
+    return [dict(row) for row in rows]
+
+
+def fail_stale_jobs(updated_before: float, error: str = "Processing was interrupted by a server restart") -> int:
+    """
+    Mark jobs still "processing" that have not been updated since updated_before as failed
+    (their worker thread died with the server). Returns the number of jobs marked.
+    """
+    now = time.time()
+    cursor = _connect().execute(
+        "UPDATE jobs SET status = 'error', error = ?, finished_at = ?, updated_at = ? "
+        "WHERE status = 'processing' AND updated_at < ?",
+        (error, now, now, updated_before)
+    )
+    return cursor.rowcount
@@ -0,0 +1,108 @@
+import json
+import time
+import threading
+from typing import Dict, Any, Optional
+
+from .job_store import save_job, get_job
+
+# Pipeline stages in order, with the share of overall progress each one covers
+STAGE_WEIGHTS = {
+    "queued": (0.0, 0.0),
+    "cv": (0.0, 80.0),
+    "aggregation": (80.0, 85.0),
+    "llm": (85.0, 97.0),
+    "writing": (97.0, 100.0),
+    "completed": (100.0, 100.0),
+    "error": (100.0, 100.0),
+}
+FINAL_STAGES = ("completed", "error")
+
+# Minimum seconds between job store writes for the same job; stage changes
+# are always written so other workers see them promptly
+PERSIST_INTERVAL = 1.0
+
+# Latest event per job for streams served by this process
+_latest: Dict[str, Dict[str, Any]] = {}
+_last_persisted: Dict[str, float] = {}
+_lock = threading.Lock()
+
+
+def publish_progress(report_id: str, stage: str, frames_processed: int = 0, total_frames: int = 0,
+                     fps: float = 0.0, message: str = "") -> Dict[str, Any]:
+    """
+    Record a progress event for a job.
+    frames_processed/total_frames/fps only apply to the CV stage; the ETA is derived from them.
+    """
+    if stage not in STAGE_WEIGHTS:
+        raise ValueError(f"Unknown stage: {stage}")
+
+    stage_start, stage_end = STAGE_WEIGHTS[stage]
+    stage_fraction = min(frames_processed / total_frames, 1.0) if total_frames > 0 else 0.0
+    eta_seconds = None
+    if stage == "cv" and fps > 0 and total_frames > 0:
+        eta_seconds = round(max(total_frames - frames_processed, 0) / fps, 1)
+
+    now = time.time()
+    with _lock:
+        previous = _latest.get(report_id)
+        event = {
+            "report_id": report_id,
+            "seq": previous["seq"] + 1 if previous else 1,
+            "stage": stage,
+            "frames_processed": frames_processed,
+            "total_frames": total_frames,
+            "fps": round(fps, 2),
+            "stage_eta_seconds": eta_seconds,
+            "percent": round(stage_start + (stage_end - stage_start) * stage_fraction, 1),
+            "message": message,
+            "timestamp": now,
+        }
+        _latest[report_id] = event
+
+        stage_changed = previous is None or previous["stage"] != stage
+        should_persist = stage_changed or now - _last_persisted.get(report_id, 0) >= PERSIST_INTERVAL
+        if should_persist:
+            _last_persisted[report_id] = now
+        if stage in FINAL_STAGES:
+            _last_persisted.pop(report_id, None)
+
+    if should_persist:
+        try:
+            save_job(report_id, progress=json.dumps(event))
+        except Exception as e:
+            print(f"Failed to persist progress for {report_id}: {e}")
+    return event
+
+
+def get_progress(report_id: str) -> Optional[Dict[str, Any]]:
+    """Latest progress event, from this process if it runs the job, otherwise from the job store"""
+    with _lock:
+        event = _latest.get(report_id)
+    if event is not None:
+        return event
+
+    job = get_job(report_id)
+    if job is None:
+        return None
+    if job.get("progress"):
+        return json.loads(job["progress"])
+    # Jobs that finished before progress tracking existed
+    stage = job["status"] if job["status"] in FINAL_STAGES else "queued"
+    return {
+        "report_id": report_id,
+        "seq": 0,
+        "stage": stage,
+        "frames_processed": 0,
+        "total_frames": 0,
+        "fps": 0.0,
+        "stage_eta_seconds": None,
+        "percent": STAGE_WEIGHTS[stage][1],
+        "message": "",
+        "timestamp": job["updated_at"],
+    }
+
+
+def forget_progress(report_id: str) -> None:
+    """Drop the in-process copy once a job is finished and persisted"""
+    with _lock:
+        _latest.pop(report_id, None)
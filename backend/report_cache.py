@@ -0,0 +1,112 @@
+import os
+import gzip
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+try:
+    import brotli  # Optional: only used when installed
+except ImportError:
+    brotli = None
+
+# Bounds for the in-memory cache of hot reports
+REPORT_CACHE_MAX_ENTRIES = int(os.getenv("REPORT_CACHE_MAX_ENTRIES", "128"))
+REPORT_CACHE_MAX_BYTES = int(os.getenv("REPORT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Responses smaller than this are sent uncompressed
+MIN_COMPRESS_BYTES = 1024
+
+# report path -> entry, least recently used first
+_entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_total_bytes = 0
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def _entry_size(entry: Dict[str, Any]) -> int:
+    return sum(len(body) for body in entry["bodies"].values())
+
+
+def _load(report_path: str, stat: os.stat_result) -> Dict[str, Any]:
+    """Read a report from disk and precompute its ETag and compressed bodies"""
+    with open(report_path, 'rb') as f:
+        raw = f.read()
+
+    bodies = {"identity": raw}
+    if len(raw) >= MIN_COMPRESS_BYTES:
+        bodies["gzip"] = gzip.compress(raw, compresslevel=6)
+        if brotli is not None:
+            bodies["br"] = brotli.compress(raw, quality=5)
+
+    return {
+        "etag": f'"{hashlib.sha1(raw).hexdigest()}"',
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "bodies": bodies,
+    }
+
+
+def get_report_entry(report_path: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the cached entry for a report file, reloading it if the file changed.
+    Returns None if the file does not exist.
+    """
+    global _total_bytes
+    try:
+        stat = os.stat(report_path)
+    except FileNotFoundError:
+        return None
+
+    with _lock:
+        entry = _entries.get(report_path)
+        if entry is not None and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+            _entries.move_to_end(report_path)
+            _stats["hits"] += 1
+            return entry
+        _stats["misses"] += 1
+
+    entry = _load(report_path, stat)
+
+    with _lock:
+        previous = _entries.pop(report_path, None)
+        if previous is not None:
+            _total_bytes -= _entry_size(previous)
+        _entries[report_path] = entry
+        _total_bytes += _entry_size(entry)
+        while _entries and (len(_entries) > REPORT_CACHE_MAX_ENTRIES or _total_bytes > REPORT_CACHE_MAX_BYTES):
+            _, evicted = _entries.popitem(last=False)
+            _total_bytes -= _entry_size(evicted)
+            _stats["evictions"] += 1
+    return entry
+
+
+def choose_encoding(entry: Dict[str, Any], accept_encoding: Optional[str]) -> str:
+    """Pick the best available encoding the client accepts (br > gzip > identity)"""
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if name and params.replace(" ", "") not in ("q=0", "q=0.0"):
+            accepted.add(name.lower())
+
+    for encoding in ("br", "gzip"):
+        if encoding in entry["bodies"] and (encoding in accepted or "*" in accepted):
+            return encoding
+    return "identity"
+
+
+def etag_matches(entry: Dict[str, Any], if_none_match: Optional[str]) -> bool:
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(",")]
+    # Weak comparison: a compressed representation shares the ETag of the raw report
+    return "*" in tags or entry["etag"] in tags or f"W/{entry['etag']}" in tags
+
+
+def cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["entries"] = len(_entries)
+        stats["bytes"] = _total_bytes
+    stats["brotli_available"] = brotli is not None
+    return stats
@@ -0,0 +1,71 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+
+# How long a token -> user lookup is trusted before going back to the database.
+# Kept short because other uvicorn workers only see rotations after expiry (see invalidate_token).
+SESSION_CACHE_TTL = float(os.getenv("SESSION_CACHE_TTL", "10"))
+SESSION_CACHE_MAX_ENTRIES = int(os.getenv("SESSION_CACHE_MAX_ENTRIES", "10000"))
+
+# token -> (expires_at, user dict), oldest first
+_entries: "OrderedDict[str, tuple]" = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+
+def get_cached_user(auth_token: str):
+    """Return the cached user dict for a token, or None on miss/expiry"""
+    now = time.monotonic()
+    with _lock:
+        entry = _entries.get(auth_token)
+        if entry is None:
+            _stats["misses"] += 1
+            return None
+        expires_at, user = entry
+        if expires_at <= now:
+            del _entries[auth_token]
+            _stats["misses"] += 1
+            return None
+        _entries.move_to_end(auth_token)
+        _stats["hits"] += 1
+        return user
+
+
+def cache_user(auth_token: str, user: dict):
+    """Remember the user behind a token for SESSION_CACHE_TTL seconds"""
+    if SESSION_CACHE_TTL <= 0:
+        return
+    with _lock:
+        _entries[auth_token] = (time.monotonic() + SESSION_CACHE_TTL, user)
+        _entries.move_to_end(auth_token)
+        while len(_entries) > SESSION_CACHE_MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+
+def invalidate_token(auth_token: str):
+    """
+    Forget a single token (logout).
+    The cache is per process: with several uvicorn workers, the others keep accepting a revoked
+    token for up to SESSION_CACHE_TTL seconds. Sensitive routes look the token up in the
+    database instead (app.py _resolve_user(..., use_cache=False)).
+    """
+    with _lock:
+        _entries.pop(auth_token, None)
+
+
+def invalidate_user(user_id: int):
+    """Forget every token cached for a user (token rotation on login)"""
+    with _lock:
+        stale = [token for token, (_, user) in _entries.items() if user["id"] == user_id]
+        for token in stale:
+            del _entries[token]
+
+
+def cache_stats() -> dict:
+    with _lock:
+        stats = dict(_stats)
+        stats["size"] = len(_entries)
+    stats["ttl_seconds"] = SESSION_CACHE_TTL
+    return stats
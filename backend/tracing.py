@@ -0,0 +1,132 @@
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional
+
+# Histogram buckets (seconds) for stage durations; per-frame stages sit at the
+# low end, the Gemini call and whole CV pass at the high end
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+class JobTrace:
+    """Aggregated span timings for one job: stage -> count / total / max seconds"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {"count": 0, "total_seconds": 0.0, "max_seconds": 0.0}
+            entry["count"] += 1
+            entry["total_seconds"] += seconds
+            if seconds > entry["max_seconds"]:
+                entry["max_seconds"] = seconds
+
+    def summary(self) -> Dict[str, Any]:
+        """JSON-friendly snapshot, suitable for report metadata"""
+        with self._lock:
+            stages = {
+                stage: {
+                    "count": int(entry["count"]),
+                    "total_seconds": round(entry["total_seconds"], 4),
+                    "avg_ms": round(entry["total_seconds"] / entry["count"] * 1000, 3),
+                    "max_ms": round(entry["max_seconds"] * 1000, 3),
+                }
+                for stage, entry in self._stages.items()
+            }
+        return {
+            "job_id": self.job_id,
+            "wall_seconds": round(time.perf_counter() - self._start, 3),
+            "stages": stages,
+        }
+
+
+# Process-wide histograms exported on /metrics
+_histograms: Dict[str, Dict[str, Any]] = {}
+_job_counts: Dict[str, int] = {}
+_metrics_lock = threading.Lock()
+
+# The trace spans attach to; set per worker thread by start_trace
+_local = threading.local()
+
+
+def current_trace() -> Optional[JobTrace]:
+    return getattr(_local, "trace", None)
+
+
+@contextmanager
+def start_trace(job_id: str):
+    """Collect every span recorded on this thread into a JobTrace until the block exits"""
+    previous = current_trace()
+    trace = JobTrace(job_id)
+    _local.trace = trace
+    try:
+        yield trace
+    finally:
+        _local.trace = previous
+
+
+def record_span(stage: str, seconds: float) -> None:
+    """Record a finished span in the current job trace and the process histograms"""
+    trace = current_trace()
+    if trace is not None:
+        trace.record(stage, seconds)
+
+    with _metrics_lock:
+        histogram = _histograms.get(stage)
+        if histogram is None:
+            histogram = _histograms[stage] = {"buckets": [0] * len(BUCKETS), "count": 0, "sum": 0.0}
+        histogram["count"] += 1
+        histogram["sum"] += seconds
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram["buckets"][i] += 1
+                break
+
+
+@contextmanager
+def span(stage: str):
+    """Time the enclosed block as one occurrence of `stage`"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_span(stage, time.perf_counter() - start)
+
+
+def record_job_finished(status: str) -> None:
+    with _metrics_lock:
+        _job_counts[status] = _job_counts.get(status, 0) + 1
+
+
+def render_prometheus() -> str:
+    """Render the collected metrics in the Prometheus text exposition format"""
+    lines = [
+        "# HELP eduvision_stage_duration_seconds Time spent per pipeline stage occurrence.",
+        "# TYPE eduvision_stage_duration_seconds histogram",
+    ]
+    with _metrics_lock:
+        histograms = {stage: {**h, "buckets": list(h["buckets"])} for stage, h in _histograms.items()}
+        job_counts = dict(_job_counts)
+
+    for stage in sorted(histograms):
+        histogram = histograms[stage]
+        cumulative = 0
+        for bound, count in zip(BUCKETS, histogram["buckets"]):
+            cumulative += count
+            lines.append(f'eduvision_stage_duration_seconds_bucket{{stage="{stage}",le="{bound}"}} {cumulative}')
+        lines.append(f'eduvision_stage_duration_seconds_bucket{{stage="{stage}",le="+Inf"}} {histogram["count"]}')
+        lines.append(f'eduvision_stage_duration_seconds_sum{{stage="{stage}"}} {histogram["sum"]:.6f}')
+        lines.append(f'eduvision_stage_duration_seconds_count{{stage="{stage}"}} {histogram["count"]}')
+
+    lines.append("# HELP eduvision_jobs_total Finished video processing jobs by final status.")
+    lines.append("# TYPE eduvision_jobs_total counter")
+    for status in sorted(job_counts):
+        lines.append(f'eduvision_jobs_total{{status="{status}"}} {job_counts[status]}')
+    return "\n".join(lines) + "\n"
@@ -1,11 +1,16 @@
 import os
 import sys
 import json
+import time
 import datetime
 import threading
 
 # Import needed for type annotations
-from typing import Dict, Any
+from typing import Dict, Any, Optional
+
+from .job_store import save_job, get_job
+from .progress import publish_progress, forget_progress
+from .tracing import start_trace, current_trace, span, record_job_finished
 
 # Define supported languages
 SUPPORTED_LANGUAGES = {
@@ -54,17 +59,56 @@ nlp_module_path = os.path.abspath(nlp_module_path)
 loader = importlib.machinery.SourceFileLoader("nlp_main", nlp_module_path)
 nlp_main = loader.load_module()
 EduVisionClassroomProcessor = nlp_main.EduVisionClassroomProcessor
+CSVLoader = nlp_main.CSVLoader
+
+from reid import merge_fragments, student_summaries_path
+from metrics import event_log_paths
+from attention_log import binary_log_path
+
+# Face mesh input width for uploaded videos (0 = full resolution) and optional x,y,w,h seating-area ROI
+CV_INFERENCE_WIDTH = os.getenv("CV_INFERENCE_WIDTH", str(attention_tracker.DEFAULT_INFERENCE_WIDTH))
+CV_ROI = os.getenv("CV_ROI", "")
+# Skip face mesh on static frames below this mean grayscale change (0 = off)
+CV_MOTION_THRESHOLD = os.getenv("CV_MOTION_THRESHOLD", "0")
+# Detect-then-track: run face mesh every N frames and track faces in between (0 = off)
+CV_DETECT_EVERY = os.getenv("CV_DETECT_EVERY", "0")
+# Face-geometry re-identification: merge fragmented student IDs online and before the NLP stage
+CV_REID = os.getenv("CV_REID", "0") == "1"
+# Write attention events and interval rollups, and build the report from the rollups instead of the per-frame log
+CV_EVENTS = os.getenv("CV_EVENTS", "0") == "1"
+# Per-frame log format: csv, binary (fixed-width records, memory-mapped by the NLP loader) or both
+CV_LOG_FORMAT = os.getenv("CV_LOG_FORMAT", "csv")
+
+# Single on-disk location for generated reports
+REPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
 
-# Dictionary to store processing status
-processing_status: Dict[str, str] = {}
+def write_report(video_id: str, data: Dict[str, Any]) -> str:
+    """
+    Write a report as compact JSON to REPORTS_DIR and return its path.
+    The file is swapped in atomically so readers never see a partial report.
+    """
+    os.makedirs(REPORTS_DIR, exist_ok=True)
+    report_path = os.path.join(REPORTS_DIR, f"{video_id}.json")
+    tmp_path = f"{report_path}.tmp"
+    with span("json_write"):
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, report_path)
+    return report_path
 
 def process_video_task(video_id: str, video_path: str, upload_dir: str, course_name: str = "test_lesson", language: str = "turkish") -> None:
-    """Process video in a separate thread"""
+    """Process video in a separate thread, timing every pipeline stage"""
+    with start_trace(video_id):
+        _run_video_task(video_id, video_path, upload_dir, course_name, language)
+    record_job_finished(get_status(video_id))
+
+def _run_video_task(video_id: str, video_path: str, upload_dir: str, course_name: str, language: str) -> None:
     try:
-        processing_status[video_id] = "processing"
+        save_job(video_id, status="processing", lesson_name=course_name, language=language, started_at=time.time())
+        publish_progress(video_id, "cv", message="Starting computer vision")
         # Always use .csv extension
         csv_path = os.path.join(upload_dir, f"{video_id}.csv")
-        report_path = os.path.join(upload_dir, f"{video_id}.json")
+        report_path = os.path.join(REPORTS_DIR, f"{video_id}.json")
         
         print(f"🎬 Processing video {video_id}")
         print(f"📚 Course: '{course_name}'")
@@ -80,12 +124,27 @@ def process_video_task(video_id: str, video_path: str, upload_dir: str, course_n
         sys.argv = [
             'attention_tracker.py',
             '--video_path', video_path,
-            '--output_csv', csv_path
+            '--output_csv', csv_path,
+            '--job_id', video_id,
+            '--inference_width', CV_INFERENCE_WIDTH,
+            '--motion_threshold', CV_MOTION_THRESHOLD,
+            '--detect_every', CV_DETECT_EVERY,
+            '--log_format', CV_LOG_FORMAT
         ]
+        if CV_ROI:
+            sys.argv += ['--roi', CV_ROI]
+        if CV_REID:
+            sys.argv += ['--reid']
+        if CV_EVENTS:
+            sys.argv += ['--events']
         
         try:
             # Call the main function from the attention_tracker module
-            attention_tracker_main()
+            attention_tracker_main(
+                progress_callback=lambda done, total, fps: publish_progress(
+                    video_id, "cv", frames_processed=done, total_frames=total, fps=fps
+                )
+            )
             print("Computer vision processing finished.")
         finally:
             # Restore original sys.argv
@@ -95,16 +154,25 @@ def process_video_task(video_id: str, video_path: str, upload_dir: str, course_n
         print("Running NLP processing...")
         
         try:
-            # Verify CSV exists before processing
-            if not os.path.exists(csv_path):
-                print(f"Error: CSV file not found at {csv_path}")
+            # Verify the log exists before processing; the binary log is preferred when written
+            log_path = binary_log_path(csv_path) if CV_LOG_FORMAT != "csv" else csv_path
+            if not os.path.exists(log_path):
+                print(f"Error: CSV file not found at {log_path}")
+                save_job(video_id, status="error", finished_at=time.time(), error="CSV file not found")
+                publish_progress(video_id, "error", message="CSV file not found")
                 return
+
+            # Join student IDs the tracker split up, so each student is reported once
+            summaries_path = student_summaries_path(csv_path)
+            if os.path.exists(summaries_path):
+                with span("reid_merge"):
+                    merge_fragments(csv_path, summaries_path)
             
             # Use EduVisionClassroomProcessor directly
             processor = EduVisionClassroomProcessor()
             
             # Use absolute paths to avoid path resolution issues
-            abs_csv_path = os.path.abspath(csv_path)
+            abs_csv_path = os.path.abspath(log_path)
             abs_report_path = os.path.abspath(report_path)
             
             print(f"Processing CSV: {abs_csv_path}")
@@ -113,7 +181,12 @@ def process_video_task(video_id: str, video_path: str, upload_dir: str, course_n
             print(f"Language: {language}")
             
             # Process the CSV directly using the processor with course name and language
-            results = processor.process_csv_file(abs_csv_path, course_name=course_name, language=language.lower())         
+            _, intervals_path = event_log_paths(abs_csv_path)
+            results = processor.process_csv_file(
+                abs_csv_path, course_name=course_name, language=language.lower(),
+                stage_callback=lambda stage: publish_progress(video_id, stage),
+                rollups_path=intervals_path if CV_EVENTS and os.path.exists(intervals_path) else None
+            )
 
             # If we have classroom reports, use the first one to generate our JSON output
             if results['successful_reports'] > 0 and results['classroom_reports']:
@@ -135,7 +208,9 @@ def process_video_task(video_id: str, video_path: str, upload_dir: str, course_n
                         "generated_at": datetime.datetime.now().isoformat(),
                         "processing_time": report['processing_time'],
                         "video_id": video_id,
-                        "language": language
+                        "language": language,
+                        # Per-stage timings up to this point (the report write itself is on /metrics)
+                        "stage_timings": current_trace().summary() if current_trace() else {}
                     },
                     "student_summary": {
                         "total_students": report['student_count'],
@@ -155,22 +230,10 @@ def process_video_task(video_id: str, video_path: str, upload_dir: str, course_n
                     }
                 }
                 
-                # Make sure there's a reports directory in the backend
-                backend_reports_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
-                os.makedirs(backend_reports_dir, exist_ok=True)
-                
-                # Save a copy of the report in the backend reports directory
-                backend_report_path = os.path.join(backend_reports_dir, f"{video_id}.json")
-                
-                # Write the JSON report to both locations
-                with open(abs_report_path, 'w', encoding='utf-8') as f:
-                    json.dump(json_report, f, indent=2, ensure_ascii=False)
-                
-                with open(backend_report_path, 'w', encoding='utf-8') as f:
-                    json.dump(json_report, f, indent=2, ensure_ascii=False)
-                
+                publish_progress(video_id, "writing")
+
+                write_report(video_id, json_report)
                 print(f"JSON report saved to: {abs_report_path}")
-                print(f"JSON report also saved to backend reports: {backend_report_path}")
             else:
                 # Handle case where no reports were generated
                 error_data = {
@@ -179,42 +242,37 @@ def process_video_task(video_id: str, video_path: str, upload_dir: str, course_n
                     "message": f"No classroom reports were generated from the CSV data",
                     "video_id": video_id
                 }
-                
-                with open(abs_report_path, 'w') as f:
-                    json.dump(error_data, f, indent=2)
-                
-                # Create backend reports directory and save error report there as well
-                backend_reports_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
-                os.makedirs(backend_reports_dir, exist_ok=True)
-                backend_report_path = os.path.join(backend_reports_dir, f"{video_id}.json")
-                
-                with open(backend_report_path, 'w') as f:
-                    json.dump(error_data, f, indent=2)
+                write_report(video_id, error_data)
                 
             print("NLP processing finished.")
             
         except Exception as e:
             print(f"Error running NLP script: {e}")
             # Create a minimal JSON report with error info
-            with open(report_path, 'w') as f:
-                json.dump({
-                    "error": str(e),
-                    "status": "failed",
-                    "message": "Failed to process video",
-                    "video_id": video_id
-                }, f)
+            write_report(video_id, {
+                "error": str(e),
+                "status": "failed",
+                "message": "Failed to process video",
+                "video_id": video_id
+            })
             
-        # Update status after processing is done
+        # Update status after processing is done, recording where the report lives
         if os.path.exists(report_path):
-            processing_status[video_id] = "completed"
+            save_job(video_id, status="completed", finished_at=time.time(), report_path=os.path.abspath(report_path))
+            publish_progress(video_id, "completed")
             print(f"Processing completed for video_id: {video_id}, course: {course_name}, language: {language}")
         else:
-            processing_status[video_id] = "error"
+            save_job(video_id, status="error", finished_at=time.time(), error="Report file was not generated")
+            publish_progress(video_id, "error", message="Report file was not generated")
             print(f"Failed to generate report for video_id: {video_id}")
         
     except Exception as e:
         print(f"Error during processing video {video_id}: {e}")
-        processing_status[video_id] = "error"
+        try:
+            save_job(video_id, status="error", finished_at=time.time(), error=str(e))
+            publish_progress(video_id, "error", message=str(e))
+        except Exception as store_error:
+            print(f"Failed to record job error: {store_error}")
         # Try to create an error report
         try:
             error_data = {
@@ -223,20 +281,52 @@ def process_video_task(video_id: str, video_path: str, upload_dir: str, course_n
                 "message": "Failed to process video",
                 "video_id": video_id
             }
-            
-            # Save in upload directory
-            with open(os.path.join(upload_dir, f"{video_id}.json"), 'w') as f:
-                json.dump(error_data, f, indent=2)
-                
-            # Also save in backend reports directory
-            backend_reports_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reports")
-            os.makedirs(backend_reports_dir, exist_ok=True)
-            with open(os.path.join(backend_reports_dir, f"{video_id}.json"), 'w') as f:
-                json.dump(error_data, f, indent=2)
+            write_report(video_id, error_data)
                 
         except Exception as save_error:
             print(f"Failed to save error report: {save_error}")
+    finally:
+        # Final state is persisted in the job store; streams fall back to it
+        forget_progress(video_id)
 
 def get_status(report_id: str) -> str:
     """Get the processing status of a video"""
-    return processing_status.get(report_id, "not found")
\ No newline at end of file
+    job = get_job(report_id)
+    return job["status"] if job else "not found"
+
+def find_attention_log(report_id: str, upload_dir: str) -> Optional[str]:
+    """The per-frame log of a processed video: the binary log when one was written, else the CSV"""
+    csv_path = os.path.join(upload_dir, f"{report_id}.csv")
+    binary_path = binary_log_path(csv_path)
+    if os.path.exists(f"{binary_path}.json"):
+        return binary_path
+    return csv_path if os.path.exists(csv_path) else None
+
+# Columns returned by the timeline endpoint
+TIMELINE_COLUMNS = [
+    "timestamp", "frame_idx", "student_id", "name", "attention_status", "gaze", "yaw_angle_deg",
+    "attention_score", "distraction_events", "yawning_count", "eye_closure_duration_sec",
+]
+
+def read_timeline(log_path: str, student_id: Optional[str] = None, start: Optional[float] = None,
+                  end: Optional[float] = None, max_rows: Optional[int] = None) -> Dict[str, Any]:
+    """
+    One student's rows and/or one time window (seconds from session start) of a video's log,
+    read through the log's sidecar index. Returns the rows (at most max_rows) and the total count.
+    """
+    with span("timeline_read"):
+        df = CSVLoader().load_timeline(log_path, student_id=student_id, start=start, end=end)
+    total = len(df)
+    if max_rows is not None:
+        df = df.head(max_rows)
+    df = df[[col for col in TIMELINE_COLUMNS if col in df.columns]]
+    return {
+        "rows": total,
+        "truncated": total > len(df),
+        "timeline": json.loads(df.to_json(orient="records", date_format="iso")),
+    }
+
+def get_report_path(report_id: str) -> Optional[str]:
+    """Get the stored report location for a finished job, if known"""
+    job = get_job(report_id)
+    return job.get("report_path") if job else None
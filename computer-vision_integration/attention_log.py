@@ -0,0 +1,154 @@
+# attention_log.py
+"""
+Compact binary attention log, written alongside (or instead of) the CSV.
+
+Every CSV row repeats the student's name, ID string, ISO timestamp and status texts. Here
+each row is a fixed-width record: an integer student index into a side dictionary,
+uint8 codes for attention status and gaze, float32 angles and scores and an int64 epoch
+timestamp (microseconds). Records are appended as they are produced; the JSON sidecar
+(<path>.json, kept up to date as the log grows) holds the record layout, the student
+dictionary, the enum tables and, once closed, the final names, so readers (EduVision_NLP's utils/binary_log.py)
+memory-map the file without importing this module.
+"""
+import datetime
+import json
+import os
+
+import numpy as np
+
+from nlp_rules import UNRESOLVED_NAMES
+
+FORMAT_VERSION = 1
+BINARY_LOG_SUFFIX = ".alog"
+
+RECORD_DTYPE = np.dtype([
+    ("timestamp_us", "<i8"),
+    ("frame_idx", "<u4"),
+    ("student", "<u4"),            # index into the sidecar's "students"
+    ("attention_status", "u1"),    # index into enums["attention_status"]
+    ("gaze", "u1"),                # index into enums["gaze"]
+    ("yaw_angle_deg", "<f4"),
+    ("attention_score", "<f4"),
+    ("distraction_events", "<u2"),
+    ("yawning_count", "<u2"),
+    ("eye_closure_duration_sec", "<f4"),
+    ("nose_x", "<f4"),
+    ("nose_y", "<f4"),
+])
+
+# Known values first, so codes are stable across logs; unseen values are appended
+ATTENTION_STATUSES = ["Attentive", "Not attentive"]
+GAZES = ["Center", "Left", "Right", "unknown"]
+
+
+def binary_log_path(csv_path):
+    return f"{os.path.splitext(csv_path)[0]}{BINARY_LOG_SUFFIX}"
+
+
+class AttentionLogWriter:
+    """
+    Appends process_frame's rows to <path> (binary). <path>.json (metadata) is written at open
+    and rewritten whenever a frame brings a new student or enum value, before its records, so a
+    log that is still being written (or was cut off) can be read; names are added on close.
+    """
+
+    def __init__(self, path, utc_offset_seconds=None):
+        self.path = path
+        # Local time offset when the session started, so readers reproduce the CSV's local ISO timestamps
+        if utc_offset_seconds is None:
+            utc_offset_seconds = datetime.datetime.now().astimezone().utcoffset().total_seconds()
+        self.utc_offset_seconds = utc_offset_seconds
+        self.students = []        # student index -> student_id
+        self._student_index = {}
+        self.enums = {"attention_status": list(ATTENTION_STATUSES), "gaze": list(GAZES)}
+        self._codes = {field: {value: code for code, value in enumerate(values)} for field, values in self.enums.items()}
+        self.records_written = 0
+        self._meta_stale = False
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "wb")
+        self._write_meta()
+
+    def _student(self, student_id):
+        index = self._student_index.get(student_id)
+        if index is None:
+            index = self._student_index[student_id] = len(self.students)
+            self.students.append(student_id)
+            self._meta_stale = True
+        return index
+
+    def _code(self, field, value):
+        codes = self._codes[field]
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(self.enums[field])
+            self.enums[field].append(value)
+            self._meta_stale = True
+        return code
+
+    def _write_meta(self, names=None):
+        names = names or {}
+        tmp_path = f"{self.path}.json.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "version": FORMAT_VERSION,
+                "dtype": [list(field) for field in RECORD_DTYPE.descr],
+                "students": self.students,
+                "names": {s_id: names[s_id] for s_id in self.students if s_id in names},
+                "enums": self.enums,
+                "utc_offset_seconds": self.utc_offset_seconds,
+                "records": self.records_written,
+            }, f)
+        os.replace(tmp_path, f"{self.path}.json")
+        self._meta_stale = False
+
+    def append(self, rows, now):
+        """Record one frame's rows (dicts with the CSV columns) taken at epoch time now"""
+        if not rows:
+            return
+        records = np.zeros(len(rows), dtype=RECORD_DTYPE)
+        records["timestamp_us"] = int(now * 1_000_000)
+        records["frame_idx"] = rows[0]["frame_idx"]
+        records["student"] = [self._student(row["student_id"]) for row in rows]
+        records["attention_status"] = [self._code("attention_status", row["attention_status"]) for row in rows]
+        records["gaze"] = [self._code("gaze", row["gaze"]) for row in rows]
+        for field in ("yaw_angle_deg", "attention_score", "distraction_events", "yawning_count",
+                      "eye_closure_duration_sec", "nose_x", "nose_y"):
+            records[field] = [row[field] for row in rows]
+        if self._meta_stale:
+            self._write_meta()
+        self._file.write(records.tobytes())
+        self.records_written += len(records)
+
+    def tell(self):
+        """Bytes written so far"""
+        return self._file.tell()
+
+    def close(self, names=None):
+        """Finish the log; names (student_id -> name) are stored once instead of on every row"""
+        if self._file.closed:
+            return
+        self._file.close()
+        self._write_meta(names)
+
+
+def relabel_students(path, merged):
+    """
+    Record in the sidecar that every ID in merged (student_id -> student_id) reads as its target.
+    The student dictionary keeps the tracker's IDs (so the log index stays valid) and the
+    records are not touched; readers apply meta["merged"].
+    """
+    meta_path = f"{path}.json"
+    with open(meta_path) as f:
+        meta = json.load(f)
+    previous = meta.get("merged", {})
+    combined = {**previous, **merged}
+    # Follow chains, so every ID points straight at its final target
+    meta["merged"] = {s_id: combined.get(target, target) for s_id, target in combined.items()}
+    for s_id, target in merged.items():
+        name = meta["names"].pop(s_id, None)
+        if name is not None and meta["names"].get(target, UNRESOLVED_NAMES[0]) in UNRESOLVED_NAMES:
+            meta["names"][target] = name
+    tmp_path = f"{meta_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, meta_path)
@@ -0,0 +1,408 @@
+# benchmark.py
+"""
+Reproducible throughput benchmark for the attention tracker.
+
+Frames are replayed through process_frame with a face mesh stand-in that returns
+synthetic (or recorded) landmarks, so no GPU, camera or real footage is needed.
+Synthetic faces are projected from the same 3D model used by estimate_head_pose,
+so head pose and gaze produce realistic values.
+
+Usage:
+    python benchmark.py --faces 1 5 15 30 --frames 300 --output bench.json
+    python benchmark.py --baseline bench.json          # fail on regressions
+    python benchmark.py --fixture landmarks.npz        # replay recorded landmarks
+    python benchmark.py --fixture lesson.lm            # replay a main.py --dump_landmarks recording
+    python benchmark.py --fatigue-budget 0.05          # fail if yawn/eye-closure detection costs >5% per face
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from types import SimpleNamespace
+
+import numpy as np
+
+import frame_processor
+import id_manager
+import metrics
+from face_utils import FaceGeometry, landmarks_to_dict, get_gaze_direction, estimate_head_pose, get_attention_label, draw_annotations, LEFT_EYE, LEFT_IRIS
+from id_manager import assign_student_id
+from metrics import update_student_metrics, compute_metrics
+from fatigue import FatigueDetector
+from landmark_log import load_landmarks
+from replay import frame_slices
+
+# 3D model points (same as estimate_head_pose) keyed by MediaPipe landmark index,
+# plus inner eye corners and irises so gaze can be evaluated, and eyelids and inner lips for
+# yawning / eye closure
+MODEL_POINTS = {
+    1: (0.0, 0.0, 0.0),          # Nose tip
+    152: (0.0, -63.6, -12.5),    # Chin
+    263: (-43.3, 32.7, -26.0),   # Left eye right corner
+    33: (43.3, 32.7, -26.0),     # Right eye left corner
+    287: (-28.9, -28.9, -24.1),  # Left mouth corner
+    57: (28.9, -28.9, -24.1),    # Right mouth corner
+    # The head pose model is mirrored relative to the image, so the second eye corners are placed
+    # outside the first ones to keep MediaPipe's image order (33 left of 133, 362 left of 263)
+    133: (71.6, 32.7, -26.0),
+    362: (-71.6, 32.7, -26.0),
+    # Upper / lower eyelids at a third and two thirds of each eye (open: EAR ~0.3)
+    160: (52.7, 37.2, -27.0), 144: (52.7, 28.2, -27.0),
+    158: (62.1, 37.2, -27.0), 153: (62.1, 28.2, -27.0),
+    385: (-62.1, 37.2, -27.0), 380: (-62.1, 28.2, -27.0),
+    387: (-52.7, 37.2, -27.0), 373: (-52.7, 28.2, -27.0),
+    # Inner lips (closed mouth: MAR ~0.07)
+    13: (0.0, -26.9, -22.0), 14: (0.0, -30.9, -22.0),
+}
+EYELIDS = [(160, 144), (158, 153), (385, 380), (387, 373)]
+# Each synthetic face closes its eyes and yawns once per cycle (in frames)
+FATIGUE_CYCLE = 240
+EYES_CLOSED_FRAMES = 30
+YAWN_FRAMES = 45
+NUM_LANDMARKS = 468
+NUM_LANDMARKS_REFINED = 478
+
+
+def _project(points, yaw_deg, center_xy, depth, frame_w, frame_h):
+    """Rotate model points by yaw, place them at depth and project with the tracker's camera model"""
+    yaw = np.radians(yaw_deg)
+    rot = np.array([
+        [np.cos(yaw), 0, np.sin(yaw)],
+        [0, 1, 0],
+        [-np.sin(yaw), 0, np.cos(yaw)],
+    ])
+    focal = frame_w
+    cx, cy = frame_w / 2, frame_h / 2
+    # Translation that puts the nose tip at center_xy in the image
+    tx = (center_xy[0] - cx) * depth / focal
+    ty = (center_xy[1] - cy) * depth / focal
+    cam = points @ rot.T + np.array([tx, ty, depth])
+    u = focal * cam[:, 0] / cam[:, 2] + cx
+    v = focal * cam[:, 1] / cam[:, 2] + cy
+    return np.stack([u / frame_w, v / frame_h], axis=1)
+
+
+def make_synthetic_landmarks(num_faces, num_frames, frame_w, frame_h, refine=False, seed=0):
+    """
+    Build a (frames, faces, landmarks, 3) array of normalized landmarks.
+    Faces sit on a grid, drift slightly between frames and turn their heads over time; once
+    every FATIGUE_CYCLE frames each face closes its eyes and, later, yawns.
+    """
+    rng = np.random.default_rng(seed)
+    n_landmarks = NUM_LANDMARKS_REFINED if refine else NUM_LANDMARKS
+    cols = int(np.ceil(np.sqrt(num_faces * frame_w / frame_h)))
+    rows = int(np.ceil(num_faces / cols))
+    cell_w, cell_h = frame_w / cols, frame_h / rows
+    # Face size shrinks as the grid gets denser, like students further back
+    depth = 600.0 * max(1.0, cols / 2)
+
+    indices = list(MODEL_POINTS)
+    model = np.array([MODEL_POINTS[i] for i in indices])
+    # Every other landmark is a fixed random point on the face, within the model's extent
+    filler = np.column_stack([
+        rng.uniform(-50, 50, n_landmarks),
+        rng.uniform(-70, 45, n_landmarks),
+        rng.uniform(-30, 0, n_landmarks),
+    ])
+    filler[indices] = model
+
+    out = np.zeros((num_frames, num_faces, n_landmarks, 3), dtype=np.float32)
+    phases = rng.uniform(0, 2 * np.pi, num_faces)
+    offsets = rng.integers(0, FATIGUE_CYCLE, num_faces)
+    closed_eyes = filler.copy()
+    for upper, lower in EYELIDS:
+        closed_eyes[[upper, lower], 1] = (filler[upper, 1] + filler[lower, 1]) / 2
+    yawning = filler.copy()
+    yawning[14, 1] -= 30.0  # MAR ~0.6
+    for f in range(num_frames):
+        for k in range(num_faces):
+            row, col = divmod(k, cols)
+            center = ((col + 0.5) * cell_w + rng.normal(0, 1.0), (row + 0.5) * cell_h + rng.normal(0, 1.0))
+            yaw = 35 * np.sin(phases[k] + f / 60)
+            cycle = (f + offsets[k]) % FATIGUE_CYCLE
+            face = closed_eyes if cycle < EYES_CLOSED_FRAMES else yawning if 0 <= cycle - FATIGUE_CYCLE // 2 < YAWN_FRAMES else filler
+            out[f, k, :, :2] = _project(face, yaw, center, depth, frame_w, frame_h)
+            if refine:
+                # Irises between the eye corners; the gaze ratio swings with the head
+                ratio = 0.5 + 0.25 * np.sin(phases[k] + f / 25)
+                out[f, k, 468, :2] = out[f, k, 33, :2] + ratio * (out[f, k, 133, :2] - out[f, k, 33, :2])
+                out[f, k, 473, :2] = out[f, k, 362, :2] + ratio * (out[f, k, 263, :2] - out[f, k, 362, :2])
+    return out
+
+
+def recording_to_landmarks(records, meta, max_frames=None):
+    """
+    (frames, faces, landmarks, 2) array from a main.py --dump_landmarks recording. Only the
+    landmarks the tracker reads are recorded; the others are set to the recorded bbox corners,
+    so face boxes computed over the whole mesh come out as recorded.
+    """
+    slices = list(frame_slices(records))[:max_frames]
+    records = records[:slices[-1][1] if slices else 0]
+    indices = meta["indices"]
+    # Iris landmarks (468+) are NaN in recordings made without refine_landmarks
+    iris = [j for j, i in enumerate(indices) if i >= NUM_LANDMARKS]
+    refined = bool(iris) and len(records) > 0 and not np.isnan(records["landmarks"][:, iris]).all()
+    num_landmarks = NUM_LANDMARKS_REFINED if refined else NUM_LANDMARKS
+    kept = [j for j, i in enumerate(indices) if i < num_landmarks]
+    max_faces = max((stop - start for start, stop in slices), default=0)
+
+    out = np.full((len(slices), max_faces, num_landmarks, 2), np.nan, dtype=np.float32)
+    for f, (start, stop) in enumerate(slices):
+        faces, frame = records[start:stop], out[f, :stop - start]
+        frame[:, 0::2] = faces["bbox"][:, None, :2]
+        frame[:, 1::2] = faces["bbox"][:, None, 2:]
+        frame[:, [indices[j] for j in kept]] = faces["landmarks"][:, kept]
+    return out
+
+
+def load_fixture(path, max_frames=None):
+    """
+    Load recorded landmarks: .npy array or .npz with a 'landmarks' array of shape (frames, faces, landmarks, 2|3),
+    or a main.py --dump_landmarks recording (.lm). Returns (landmarks, frame size or None).
+    """
+    if path.endswith(".lm"):
+        records, meta = load_landmarks(path)
+        return recording_to_landmarks(records, meta, max_frames), (meta["frame_width"], meta["frame_height"])
+    data = np.load(path)
+    landmarks = data["landmarks"] if hasattr(data, "files") else data
+    if landmarks.ndim != 4:
+        raise ValueError(f"Expected (frames, faces, landmarks, coords) array, got shape {landmarks.shape}")
+    return landmarks[:max_frames], None
+
+
+def _to_mediapipe_faces(frame_landmarks):
+    """Wrap one frame of landmarks in objects shaped like MediaPipe's results"""
+    faces = []
+    for face in frame_landmarks:
+        if np.isnan(face).any():
+            continue  # padding for frames with fewer faces
+        z = face[:, 2] if face.shape[1] > 2 else np.zeros(len(face))
+        faces.append(SimpleNamespace(landmark=[
+            SimpleNamespace(x=float(x), y=float(y), z=float(zz)) for (x, y), zz in zip(face[:, :2], z)
+        ]))
+    return faces
+
+
+class ReplayFaceMesh:
+    """Stand-in for mp FaceMesh: returns pre-built landmarks, one frame per process() call"""
+
+    def __init__(self, landmarks):
+        self.frames = [_to_mediapipe_faces(frame) for frame in landmarks]
+        self.index = 0
+
+    def process(self, rgb):
+        faces = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        return SimpleNamespace(multi_face_landmarks=faces or None)
+
+
+def _skip_ocr(frame, geometry, student_id, photo_dir="photo_id"):
+    """Replaces handle_new_student unless --with-ocr is given; OCR is a one-off per student, not per frame"""
+    return None, 0.0
+
+
+def _reset_tracker_state():
+    id_manager.student_ids.clear()
+    metrics.student_data.clear()
+
+
+def run_scenario(landmarks, frame_w, frame_h, warmup=10, inference_width=None, fatigue=True):
+    """Replay landmarks through process_frame; returns timing and memory figures"""
+    num_frames, num_faces = landmarks.shape[:2]
+    frame = np.random.default_rng(1).integers(0, 255, (frame_h, frame_w, 3), dtype=np.uint8)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            face_mesh = ReplayFaceMesh(landmarks)
+
+            def run(count, csv_name):
+                _reset_tracker_state()
+                face_mesh.index = 0
+                id_name_mapping, frame_idx = {}, 0
+                detector = FatigueDetector() if fatigue else None
+                times = []
+                for _ in range(count):
+                    # Fresh copy each frame in case annotations draw onto it; not part of the timing
+                    current = frame.copy()
+                    start = time.perf_counter()
+                    _, frame_idx, id_name_mapping = frame_processor.process_frame(
+                        current, face_mesh, "photo_id", id_name_mapping, csv_name, frame_idx,
+                        inference_width=inference_width, fatigue=detector
+                    )
+                    times.append(time.perf_counter() - start)
+                return np.array(times)
+
+            run(min(warmup, num_frames), "warmup.csv")
+            times = run(num_frames, "bench.csv")
+
+            # Separate pass for memory: tracemalloc slows allocation-heavy code down
+            tracemalloc.start()
+            run(min(num_frames, 50), "memory.csv")
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        finally:
+            os.chdir(cwd)
+
+    total = times.sum()
+    return {
+        "faces": int(num_faces),
+        "frames": int(num_frames),
+        "fps": round(num_frames / total, 2) if total > 0 else None,
+        "frame_ms_mean": round(times.mean() * 1000, 3),
+        "frame_ms_p95": round(float(np.percentile(times, 95)) * 1000, 3),
+        "per_face_ms": round(times.mean() * 1000 / max(num_faces, 1), 3),
+        "peak_python_mem_mb": round(peak / 1024 / 1024, 2),
+    }
+
+
+def benchmark_components(landmarks, frame_w, frame_h, repeat=200):
+    """Mean per-call latency (ms) of the per-face functions on the first frame's faces"""
+    faces = _to_mediapipe_faces(landmarks[0])
+    if not faces:
+        return {}
+    frame = np.zeros((frame_h, frame_w, 3), dtype=np.uint8)
+    _reset_tracker_state()
+    ids = {}
+    dicts = [landmarks_to_dict(face, frame_w, frame_h) for face in faces]
+
+    def timed(fn):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for i, face in enumerate(faces):
+                fn(i, face)
+        return round((time.perf_counter() - start) * 1000 / (repeat * len(faces)), 4)
+
+    def gaze(i, face):
+        lm = dicts[i]
+        if all(k in lm for k in LEFT_IRIS + LEFT_EYE):
+            get_gaze_direction([lm[k] for k in LEFT_IRIS], [lm[k] for k in LEFT_EYE])
+
+    rot_vecs = [estimate_head_pose(lm, frame_w, frame_h) for lm in dicts]
+    detector = FatigueDetector()
+    observations = [
+        {"student_id": str(i), "landmarks": FaceGeometry.from_landmarks(face, frame_w, frame_h)}
+        for i, face in enumerate(faces)
+    ]
+    start = time.perf_counter()
+    for _ in range(repeat):
+        # One batched call per frame, reported per face like the others
+        detector.update(observations, time.time())
+    fatigue_ms = round((time.perf_counter() - start) * 1000 / (repeat * len(faces)), 4)
+    results = {
+        "landmarks_to_dict": timed(lambda i, face: landmarks_to_dict(face, frame_w, frame_h)),
+        "face_geometry": timed(lambda i, face: FaceGeometry.from_landmarks(face, frame_w, frame_h)),
+        "get_gaze_direction": timed(gaze),
+        "estimate_head_pose": timed(lambda i, face: estimate_head_pose(dicts[i], frame_w, frame_h)),
+        "get_attention_label": timed(lambda i, face: get_attention_label("Center", rot_vecs[i])),
+        "assign_student_id": timed(lambda i, face: assign_student_id(face, ids, frame_w, frame_h)),
+        "fatigue_update": fatigue_ms,
+        "update_student_metrics": timed(lambda i, face: compute_metrics(update_student_metrics(str(i), "Attentive", time.time()))),
+        "draw_annotations": timed(lambda i, face: draw_annotations(frame, dicts[i], f"{i:08d}", "Center", "Attentive")),
+    }
+    _reset_tracker_state()
+    return results
+
+
+def compare_with_baseline(results, baseline, tolerance):
+    """Return a list of human-readable regressions (fps drop beyond tolerance)"""
+    regressions = []
+    previous = {s["faces"]: s for s in baseline.get("scenarios", [])}
+    for scenario in results["scenarios"]:
+        old = previous.get(scenario["faces"])
+        if not old or not old.get("fps") or not scenario.get("fps"):
+            continue
+        if scenario["fps"] < old["fps"] * (1 - tolerance):
+            regressions.append(
+                f"{scenario['faces']} faces: {scenario['fps']} fps vs baseline {old['fps']} fps "
+                f"(-{(1 - scenario['fps'] / old['fps']) * 100:.1f}%)"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Attention tracker throughput benchmark')
+    parser.add_argument('--faces', type=int, nargs='+', default=[1, 5, 15, 30])
+    parser.add_argument('--frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=1280)
+    parser.add_argument('--height', type=int, default=720)
+    parser.add_argument('--inference-width', type=int, default=None,
+                        help='Downscale frames to this width before face mesh, as main.py --inference_width')
+    parser.add_argument('--refine', action='store_true', help='Include iris landmarks (refine_landmarks=True)')
+    parser.add_argument('--fixture', type=str, default=None, help='Replay recorded landmarks (.npy/.npz, or a main.py --dump_landmarks .lm recording) instead of synthetic faces')
+    parser.add_argument('--with-ocr', action='store_true', help='Run real EasyOCR for new students')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', type=str, default='cv_benchmark.json')
+    parser.add_argument('--baseline', type=str, default=None, help='Compare against a previous output and exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed fps drop vs baseline (fraction)')
+    parser.add_argument('--no-fatigue', action='store_true', help='Run without yawn / eye-closure detection, as main.py --no_fatigue')
+    parser.add_argument('--fatigue-budget', type=float, default=None,
+                        help='Exit 1 if yawn / eye-closure detection costs more than this fraction of the per-face time')
+    args = parser.parse_args()
+
+    if not args.with_ocr:
+        frame_processor.handle_new_student = _skip_ocr
+
+    if args.fixture:
+        recorded, frame_size = load_fixture(args.fixture, args.frames)
+        if frame_size is not None:
+            args.width, args.height = frame_size
+        scenarios = [recorded]
+    else:
+        scenarios = [
+            make_synthetic_landmarks(n, args.frames, args.width, args.height, refine=args.refine, seed=args.seed)
+            for n in args.faces
+        ]
+
+    results = {
+        "generated_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"python": sys.version.split()[0], "platform": platform.platform(), "processor": platform.processor()},
+        "config": {"frames": args.frames, "width": args.width, "height": args.height,
+                   "inference_width": args.inference_width, "refine": args.refine, "fixture": args.fixture, "with_ocr": args.with_ocr,
+                   "fatigue": not args.no_fatigue},
+        "scenarios": [],
+    }
+    for landmarks in scenarios:
+        scenario = run_scenario(landmarks, args.width, args.height, inference_width=args.inference_width,
+                                fatigue=not args.no_fatigue)
+        scenario["components_ms"] = benchmark_components(landmarks, args.width, args.height)
+        # Component time against the whole per-face time: stable where an on/off fps difference is noise
+        fatigue_ms = scenario["components_ms"].get("fatigue_update")
+        if fatigue_ms is not None and scenario["per_face_ms"] > 0:
+            scenario["fatigue_overhead"] = round(fatigue_ms / scenario["per_face_ms"], 4)
+        results["scenarios"].append(scenario)
+        print(f"{scenario['faces']:>3} faces: {scenario['fps']:>8} fps | "
+              f"{scenario['per_face_ms']:>7} ms/face | p95 {scenario['frame_ms_p95']} ms | "
+              f"peak {scenario['peak_python_mem_mb']} MB | fatigue {scenario.get('fatigue_overhead', 0) * 100:.1f}%")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results saved to: {args.output}")
+
+    if args.fatigue_budget is not None:
+        over = [s for s in results["scenarios"] if s.get("fatigue_overhead", 0) > args.fatigue_budget]
+        if over:
+            for scenario in over:
+                print(f"Fatigue detection over budget: {scenario['faces']} faces, "
+                      f"{scenario['fatigue_overhead'] * 100:.1f}% > {args.fatigue_budget * 100:.1f}% of per-face time")
+            sys.exit(1)
+        print(f"Fatigue detection within budget ({args.fatigue_budget * 100:.1f}% of per-face time).")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+        regressions = compare_with_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("Regressions against baseline:")
+            for line in regressions:
+                print(f"  - {line}")
+            sys.exit(1)
+        print("No regressions against baseline.")
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,8 @@
 import pandas as pd
 import os
 
+from nlp_rules import UNRESOLVED_NAMES
+
 FIELDNAMES = [
     "name",
     "student_id",
@@ -15,20 +17,38 @@ FIELDNAMES = [
     "yawning_count",
     "eye_closure_duration_sec",
     "focus_quality",
-    "session_duration_minutes"
+    "session_duration_minutes",
+    "nose_x",
+    "nose_y"
 ]
 
 def setup_csv_output(csv_file_path=None):
     if csv_file_path is None:
         csv_file_path = "student_attention_log.csv"
     try:
-        df = pd.read_csv(csv_file_path)
-        frame_idx = len(df)
+        df = pd.read_csv(csv_file_path, usecols=["frame_idx"])
+        # Appending to an earlier run: frame numbers carry on after its last frame
+        frame_idx = int(df["frame_idx"].max()) + 1 if len(df) else 0
     except FileNotFoundError:
-        df = pd.DataFrame(columns=FIELDNAMES)
         frame_idx = 0
     return csv_file_path, FIELDNAMES, frame_idx
 
-def append_rows(csv_file_path, rows_df, frame_idx):
-    # rows_df is a pandas DataFrame
-    rows_df.to_csv(csv_file_path, index=False, mode='a', header=not bool(frame_idx))
+def append_rows(csv_file_path, rows_df):
+    # rows_df is a pandas DataFrame; frames without faces write nothing, so the header goes with the first rows
+    header = not os.path.exists(csv_file_path) or os.path.getsize(csv_file_path) == 0
+    rows_df.to_csv(csv_file_path, index=False, mode='a', header=header)
+
+def fill_names(csv_file_path, names):
+    """
+    Write names read after a student's rows were logged (NameCapture.finish) into those rows.
+    Other values are kept as written. Returns the number of rows changed.
+    """
+    df = pd.read_csv(csv_file_path, dtype=str, keep_default_na=False)
+    unnamed = df["student_id"].isin(list(names)) & df["name"].isin(UNRESOLVED_NAMES)
+    if not unnamed.any():
+        return 0
+    df.loc[unnamed, "name"] = df.loc[unnamed, "student_id"].map(names)
+    tmp_path = f"{csv_file_path}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, csv_file_path)
+    return int(unnamed.sum())
@@ -0,0 +1,148 @@
+# face_tracker.py
+"""
+Detect-then-track mode.
+
+Face mesh runs every detect_every frames (or as soon as a track is lost); in between, the
+few landmarks the tracker needs (head pose points, eye corners, irises) are carried with
+pyramidal Lucas-Kanade optical flow. Student IDs come from track continuity: a detection
+takes over the ID of the track whose predicted nose tip is closest, relative to face size,
+instead of the frame-to-frame nose distance heuristic in id_manager.
+"""
+import cv2
+import numpy as np
+
+from face_utils import FaceGeometry
+from id_manager import new_student_id
+from landmark_log import USED_LANDMARKS
+
+NOSE_TIP = 1
+LK_PARAMS = dict(winSize=(21, 21), maxLevel=3,
+                 criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+
+
+class FaceTracker:
+    def __init__(self, detect_every=10, max_missed=2, match_ratio=0.5, min_tracked_ratio=0.7, max_flow_error=20.0):
+        self.detect_every = detect_every
+        self.max_missed = max_missed            # detections a track may miss before its ID is retired
+        self.match_ratio = match_ratio          # max nose distance for a match, as a fraction of face width
+        self.min_tracked_ratio = min_tracked_ratio
+        self.max_flow_error = max_flow_error
+        self.tracks = {}                        # student_id -> {"indices", "points", "face_width", "missed", "visible"}
+        self.prev_gray = None
+        self.since_detection = 0
+        self.detections = 0
+        self.tracked_frames = 0
+        self.lost_tracks = 0
+        self.ids_created = 0
+
+    def update(self, frame, detect):
+        """
+        Advance all tracks to this frame. detect() must return face mesh landmarks
+        (normalized, full frame) and is only called when a detection is due.
+        Returns [(student_id, FaceGeometry of the tracked keypoints, face_landmarks on detection
+        frames else None, is_new)].
+        """
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        visible = [t for t in self.tracks.values() if t["visible"]]
+        due = not visible or self.prev_gray is None or self.since_detection >= self.detect_every
+        if not due and self._flow(gray):
+            self.prev_gray = gray
+            self.since_detection += 1
+            self.tracked_frames += 1
+            return [(s_id, self._geometry(t), None, False) for s_id, t in self.tracks.items() if t["visible"]]
+
+        h, w = gray.shape
+        detected, new_ids = self._match(detect(), w, h)
+        self.prev_gray = gray
+        self.since_detection = 1
+        self.detections += 1
+        return [(s_id, self._geometry(t), detected.get(s_id), s_id in new_ids)
+                for s_id, t in self.tracks.items() if t["visible"]]
+
+    def _flow(self, gray):
+        """Move every visible track with optical flow; False as soon as one is lost"""
+        visible = [t for t in self.tracks.values() if t["visible"]]
+        p0 = np.concatenate([t["points"] for t in visible]).reshape(-1, 1, 2)
+        p1, status, error = cv2.calcOpticalFlowPyrLK(self.prev_gray, gray, p0, None, **LK_PARAMS)
+        good = (status.ravel() == 1) & (error.ravel() < self.max_flow_error)
+        p1 = p1.reshape(-1, 2)
+
+        start = 0
+        for track in visible:
+            n = len(track["points"])
+            ok = good[start:start + n]
+            if ok.mean() < self.min_tracked_ratio:
+                self.lost_tracks += 1
+                return False
+            # Points the flow lost follow the face's median motion
+            moved = p1[start:start + n]
+            shift = np.median(moved[ok] - track["points"][ok], axis=0)
+            track["points"] = np.where(ok[:, None], moved, track["points"] + shift).astype(np.float32)
+            start += n
+        return True
+
+    def _match(self, faces, frame_w, frame_h):
+        """
+        Hand detections to the nearest tracks; unmatched detections become new students.
+        Returns ({student_id: face_landmarks}, new student IDs)
+        """
+        detections = []
+        for face in faces:
+            indices = [i for i in USED_LANDMARKS if i < len(face.landmark)]
+            points = np.array([(face.landmark[i].x * frame_w, face.landmark[i].y * frame_h) for i in indices],
+                              dtype=np.float32)
+            xs = [lm.x for lm in face.landmark]
+            detections.append((face, indices, points, (max(xs) - min(xs)) * frame_w))
+
+        candidates = []
+        for d, (_, indices, points, face_width) in enumerate(detections):
+            nose = points[indices.index(NOSE_TIP)]
+            for s_id, track in self.tracks.items():
+                distance = np.linalg.norm(track["points"][track["indices"].index(NOSE_TIP)] - nose)
+                if distance < self.match_ratio * max(face_width, track["face_width"]):
+                    candidates.append((distance, d, s_id))
+
+        matched_detections, matched_tracks = set(), set()
+        detected = {}
+        for _, d, s_id in sorted(candidates):
+            if d in matched_detections or s_id in matched_tracks:
+                continue
+            matched_detections.add(d)
+            matched_tracks.add(s_id)
+            face, indices, points, face_width = detections[d]
+            detected[s_id] = face
+            self.tracks[s_id].update(indices=indices, points=points, face_width=face_width, missed=0, visible=True)
+
+        for s_id in list(self.tracks):
+            if s_id not in matched_tracks:
+                track = self.tracks[s_id]
+                track["visible"] = False
+                track["missed"] += 1
+                if track["missed"] > self.max_missed:
+                    del self.tracks[s_id]
+
+        new_ids = set()
+        for d, (face, indices, points, face_width) in enumerate(detections):
+            if d in matched_detections:
+                continue
+            s_id = new_student_id()
+            self.ids_created += 1
+            self.tracks[s_id] = {"indices": indices, "points": points, "face_width": face_width, "missed": 0, "visible": True}
+            detected[s_id] = face
+            new_ids.add(s_id)
+        return detected, new_ids
+
+    @staticmethod
+    def _geometry(track):
+        return FaceGeometry(track["points"].astype(int), track["indices"])
+
+    def stats(self):
+        frames = self.detections + self.tracked_frames
+        return {
+            "frames": frames,
+            "detections": self.detections,
+            "tracked_frames": self.tracked_frames,
+            "detection_ratio": round(self.detections / frames, 3) if frames else 0.0,
+            "lost_tracks": self.lost_tracks,
+            "ids_created": self.ids_created,
+        }
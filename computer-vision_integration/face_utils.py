@@ -12,6 +12,11 @@ RIGHT_EYE = [362, 263]
 LEFT_IRIS = [468]
 RIGHT_IRIS = [473]
 
+# Decision thresholds (tunable per camera, see sweep.py)
+GAZE_RIGHT_RATIO = 0.35   # iris position in the eye below this -> looking right
+GAZE_LEFT_RATIO = 0.65    # above this -> looking left
+YAW_THRESHOLD_DEG = 25    # head turned further than this -> not attentive
+
 def create_face_mesh(max_num_faces=15, refine_landmarks=False, 
                      min_detection_confidence=0.3, min_tracking_confidence=0.3):
     return mp_face_mesh.FaceMesh(
@@ -22,6 +27,89 @@ def create_face_mesh(max_num_faces=15, refine_landmarks=False,
         min_tracking_confidence=min_tracking_confidence
     )
 
+def prepare_inference_input(frame, inference_width=None, roi=None):
+    """
+    Build the RGB image face_mesh.process runs on: optionally cropped to roi (x, y, w, h in
+    frame pixels) and downscaled so it is at most inference_width pixels wide.
+    MediaPipe landmarks are normalized, so downscaling needs no re-projection; a roi does
+    (see remap_landmarks_from_roi).
+    """
+    if roi is not None:
+        x, y, w, h = roi
+        frame = frame[y:y + h, x:x + w]
+    return cv2.cvtColor(downscale_to_width(frame, inference_width), cv2.COLOR_BGR2RGB)
+
+def downscale_to_width(image, width):
+    """Resize image to the given width (keeping aspect ratio) if it is wider; no-op for falsy width"""
+    h, w = image.shape[:2]
+    if not width or w <= width:
+        return image
+    size = (width, max(1, round(h * width / w)))
+    # INTER_LINEAR: INTER_AREA is several times slower at non-integer ratios
+    return cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+
+def remap_landmarks_from_roi(multi_face_landmarks, roi, frame_w, frame_h):
+    """Convert landmarks normalized to the roi into full-frame normalized coordinates, in place"""
+    if not multi_face_landmarks or roi is None:
+        return multi_face_landmarks
+    x, y, w, h = roi
+    for face_landmarks in multi_face_landmarks:
+        for lm in face_landmarks.landmark:
+            lm.x = (x + lm.x * w) / frame_w
+            lm.y = (y + lm.y * h) / frame_h
+            lm.z = lm.z * w / frame_w  # z shares the x scale
+    return multi_face_landmarks
+
+def parse_roi(value, frame_w, frame_h):
+    """'x,y,w,h' in pixels -> tuple clipped to the frame (None if empty)"""
+    if not value:
+        return None
+    x, y, w, h = (int(v) for v in value.split(","))
+    x, y = max(0, min(x, frame_w - 1)), max(0, min(y, frame_h - 1))
+    return x, y, max(1, min(w, frame_w - x)), max(1, min(h, frame_h - y))
+
+class FaceGeometry:
+    """
+    Pixel landmarks of one face as an (n, 2) int array plus its bounding box, built once per
+    face per frame and shared by head pose, gaze, crops, OCR and annotations.
+    Indexing returns (x, y) like landmarks_to_dict; indices maps landmark ids to rows for
+    faces that only carry a subset of the mesh (e.g. tracked keypoints).
+    """
+    __slots__ = ("points", "box", "_rows")
+
+    def __init__(self, points, indices=None):
+        self.points = points
+        self._rows = None if indices is None else {i: row for row, i in enumerate(indices)}
+        (min_x, min_y), (max_x, max_y) = points.min(axis=0), points.max(axis=0)
+        self.box = (int(min_x), int(min_y), int(max_x), int(max_y))
+
+    @classmethod
+    def from_landmarks(cls, face_landmarks, frame_w, frame_h):
+        coords = np.array([(lm.x, lm.y) for lm in face_landmarks.landmark])
+        # astype truncates toward zero, like int() in landmarks_to_dict
+        return cls((coords * (frame_w, frame_h)).astype(int))
+
+    def __getitem__(self, i):
+        x, y = self.points[i if self._rows is None else self._rows[i]]
+        return int(x), int(y)
+
+    def __contains__(self, i):
+        return 0 <= i < len(self.points) if self._rows is None else i in self._rows
+
+    def take(self, indices):
+        """(len(indices), 2) array of the given landmarks; KeyError/IndexError if one is missing"""
+        return self.points[list(indices) if self._rows is None else [self._rows[i] for i in indices]]
+
+    def padded_box(self, frame_w, frame_h, pad_left_ratio, pad_right_ratio, pad_top_ratio, pad_bottom_ratio):
+        """Bounding box grown by the given fractions of its size, clipped to the frame: (x1, y1, x2, y2)"""
+        min_x, min_y, max_x, max_y = self.box
+        box_w, box_h = max_x - min_x, max_y - min_y
+        x1 = max(min_x - int(box_w * pad_left_ratio), 0)
+        y1 = max(min_y - int(box_h * pad_top_ratio), 0)
+        x2 = min(max_x + int(box_w * pad_right_ratio), frame_w - 1)
+        y2 = min(max_y + int(box_h * pad_bottom_ratio), frame_h - 1)
+        return x1, y1, x2, y2
+
 def landmarks_to_dict(face_landmarks, frame_w, frame_h):
     landmarks = {}
     for i, lm in enumerate(face_landmarks.landmark):
@@ -29,7 +117,7 @@ def landmarks_to_dict(face_landmarks, frame_w, frame_h):
         landmarks[i] = (x, y)
     return landmarks
 
-def get_gaze_direction(iris, eye_corners):
+def get_gaze_direction(iris, eye_corners, right_ratio=GAZE_RIGHT_RATIO, left_ratio=GAZE_LEFT_RATIO):
     # same logic as original
     eye_left = np.array(eye_corners[0])
     eye_right = np.array(eye_corners[1])
@@ -37,9 +125,9 @@ def get_gaze_direction(iris, eye_corners):
     eye_width = np.linalg.norm(eye_right - eye_left)
     if eye_width == 0: return "unknown"
     ratio = (iris[0] - eye_left[0]) / eye_width
-    if ratio < 0.35:
+    if ratio < right_ratio:
         return "Right"
-    elif ratio > 0.65:
+    elif ratio > left_ratio:
         return "Left"
     else:
         return "Center"
@@ -73,9 +161,9 @@ def estimate_head_pose(landmarks, frame_w, frame_h):
     success, rotation_vector, translation_vector = cv2.solvePnP(model_points, image_points, camera_matrix, dist_coeffs)
     return rotation_vector
 
-def get_attention_label(gaze, rotation_vector):
+def get_attention_label(gaze, rotation_vector, yaw_threshold=YAW_THRESHOLD_DEG):
     yaw = rotation_vector[1][0] * (180.0 / np.pi)
-    if abs(yaw) > 25 or gaze in ["Left", "Right"]:
+    if abs(yaw) > yaw_threshold or gaze in ["Left", "Right"]:
         return "Not attentive", yaw
     else:
         return "Attentive", yaw
@@ -0,0 +1,135 @@
+# fatigue.py
+"""
+Yawning and eye-closure detection from the face mesh landmarks.
+
+For all faces of a frame at once, the eye aspect ratio (EAR: eyelid opening over eye width,
+two lid pairs per eye, both eyes averaged) and mouth aspect ratio (MAR: inner-lip opening
+over mouth width) are computed with one set of array operations. Per student, hysteresis
+(separate close/open and start/end thresholds plus minimum durations) turns the ratios into
+events: blinks and speech do not count, a yawn is counted once it has lasted MIN_YAWN_SEC,
+and eye closures longer than MIN_CLOSURE_SEC add to eye_closure_duration_sec.
+"""
+import numpy as np
+
+# Eye corners and (upper, lower) eyelid pairs, MediaPipe face mesh indices
+LEFT_EYE_CORNERS = (33, 133)
+LEFT_EYELIDS = [(160, 144), (158, 153)]
+RIGHT_EYE_CORNERS = (362, 263)
+RIGHT_EYELIDS = [(385, 380), (387, 373)]
+# Inner lips (upper, lower) and mouth corners
+MOUTH_LIPS = (13, 14)
+MOUTH_CORNERS = (57, 287)
+
+FATIGUE_LANDMARKS = sorted({
+    *LEFT_EYE_CORNERS, *RIGHT_EYE_CORNERS, *MOUTH_LIPS, *MOUTH_CORNERS,
+    *(i for pair in LEFT_EYELIDS + RIGHT_EYELIDS for i in pair),
+})
+
+EYE_CLOSED_EAR = 0.15     # eyes count as closed below this...
+EYE_OPEN_EAR = 0.20       # ...and open again above this
+YAWN_START_MAR = 0.50     # mouth opens for a yawn above this...
+YAWN_END_MAR = 0.35       # ...and closes again below this
+MIN_CLOSURE_SEC = 0.4     # shorter closures are blinks
+MIN_YAWN_SEC = 1.0        # shorter openings are speech
+MAX_GAP_SEC = 1.0         # a student unseen this long starts over with eyes open, mouth closed
+
+_ROW = {i: row for row, i in enumerate(FATIGUE_LANDMARKS)}
+# (eye, pair) index arrays into the gathered points
+_LID_TOP = np.array([[_ROW[t] for t, _ in lids] for lids in (LEFT_EYELIDS, RIGHT_EYELIDS)])
+_LID_BOTTOM = np.array([[_ROW[b] for _, b in lids] for lids in (LEFT_EYELIDS, RIGHT_EYELIDS)])
+_EYE_A = np.array([_ROW[LEFT_EYE_CORNERS[0]], _ROW[RIGHT_EYE_CORNERS[0]]])
+_EYE_B = np.array([_ROW[LEFT_EYE_CORNERS[1]], _ROW[RIGHT_EYE_CORNERS[1]]])
+
+
+def aspect_ratios(points):
+    """
+    points: (faces, len(FATIGUE_LANDMARKS), 2) pixel coordinates.
+    Returns (ear, mar), one value per face; degenerate faces give NaN.
+    """
+    points = np.asarray(points, dtype=np.float32)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        openings = np.linalg.norm(points[:, _LID_TOP] - points[:, _LID_BOTTOM], axis=-1)  # (faces, eye, pair)
+        widths = np.linalg.norm(points[:, _EYE_A] - points[:, _EYE_B], axis=-1)          # (faces, eye)
+        ear = (openings.mean(axis=2) / widths).mean(axis=1)
+        lips = np.linalg.norm(points[:, _ROW[MOUTH_LIPS[0]]] - points[:, _ROW[MOUTH_LIPS[1]]], axis=-1)
+        mouth = np.linalg.norm(points[:, _ROW[MOUTH_CORNERS[0]]] - points[:, _ROW[MOUTH_CORNERS[1]]], axis=-1)
+        mar = lips / mouth
+    return ear, mar
+
+
+class FatigueState:
+    """Per-student hysteresis state and totals"""
+    __slots__ = ("eyes_closed", "closed_since", "mouth_open", "open_since", "yawn_counted",
+                 "last_seen", "yawning_count", "closure_sec")
+
+    def __init__(self, now):
+        self.eyes_closed = self.mouth_open = self.yawn_counted = False
+        self.closed_since = self.open_since = self.last_seen = now
+        self.yawning_count = 0
+        self.closure_sec = 0.0
+
+    def closure_total(self, now):
+        """Completed closures plus the current one once it is longer than a blink"""
+        if self.eyes_closed and now - self.closed_since >= MIN_CLOSURE_SEC:
+            return self.closure_sec + now - self.closed_since
+        return self.closure_sec
+
+
+class FatigueDetector:
+    def __init__(self):
+        self.students = {}
+        self.faces_measured = 0
+
+    def step(self, student_id, ear, mar, now):
+        """Advance one student's hysteresis by one measurement; returns their FatigueState"""
+        state = self.students.get(student_id)
+        if state is None:
+            state = self.students[student_id] = FatigueState(now)
+        elif now - state.last_seen > MAX_GAP_SEC:
+            state.closure_sec = state.closure_total(state.last_seen)
+            state.eyes_closed = state.mouth_open = False
+        state.last_seen = now
+        self.faces_measured += 1
+
+        if not state.eyes_closed and ear < EYE_CLOSED_EAR:
+            state.eyes_closed, state.closed_since = True, now
+        elif state.eyes_closed and ear > EYE_OPEN_EAR:
+            state.closure_sec = state.closure_total(now)
+            state.eyes_closed = False
+
+        if not state.mouth_open and mar > YAWN_START_MAR:
+            state.mouth_open, state.open_since, state.yawn_counted = True, now, False
+        elif state.mouth_open:
+            if mar < YAWN_END_MAR:
+                state.mouth_open = False
+            elif not state.yawn_counted and now - state.open_since >= MIN_YAWN_SEC:
+                state.yawning_count += 1
+                state.yawn_counted = True
+        return state
+
+    def update(self, observations, now):
+        """
+        Measure every observation of this frame (canonical student IDs) in one batch and store
+        the student's running totals on it as "yawning_count" and "eye_closure_sec".
+        """
+        measured, points = [], []
+        for obs in observations:
+            try:
+                points.append(obs["landmarks"].take(FATIGUE_LANDMARKS))
+            except (AttributeError, KeyError, IndexError):
+                continue
+            measured.append(obs)
+        if not measured:
+            return
+        ears, mars = aspect_ratios(np.stack(points))
+        for obs, ear, mar in zip(measured, ears.tolist(), mars.tolist()):
+            state = self.step(obs["student_id"], ear, mar, now)
+            obs["yawning_count"] = state.yawning_count
+            obs["eye_closure_sec"] = round(state.closure_total(now), 2)
+
+    def stats(self):
+        return {
+            "faces_measured": self.faces_measured,
+            "yawns": sum(s.yawning_count for s in self.students.values()),
+            "eye_closure_sec": round(sum(s.closure_sec for s in self.students.values()), 1),
+        }
@@ -1,28 +1,33 @@
 # frame_processor.py
 import time
-import json
 import os
+from functools import partial
 import cv2
 import pandas as pd
 
-from face_utils import create_face_mesh, landmarks_to_dict, get_gaze_direction, estimate_head_pose, get_attention_label, draw_annotations, LEFT_EYE, LEFT_IRIS
+from face_utils import create_face_mesh, prepare_inference_input, remap_landmarks_from_roi, FaceGeometry, get_gaze_direction, estimate_head_pose, get_attention_label, draw_annotations, LEFT_EYE, LEFT_IRIS
 from id_manager import assign_student_id, student_ids
-from ocr_photo import ensure_photo_dir_exists, handle_new_student
+from ocr_photo import ensure_photo_dir_exists, handle_new_student, crop_face_with_padding, NAME_TAG_PADDING
+from mapping_store import open_mapping_store
+from name_tag_cache import face_position
 from metrics import update_student_metrics, compute_metrics
 from csv_logger import setup_csv_output, append_rows
 
-def initialize_tracking(video_path, output_csv):
+try:
+    from backend.tracing import span
+except ImportError:  # running outside the backend: stage timing disabled
+    from contextlib import nullcontext as span
+
+def initialize_tracking(video_path, output_csv, job_id=None):
     """
-    Prepare capture, mapping JSON, CSV and MediaPipe face mesh.
+    Prepare capture, mapping store, CSV and MediaPipe face mesh.
+    With a job_id, photos and the mapping live in photo_id/<job_id>, so concurrent jobs stay apart.
+    id_name_mapping is a MappingStore; close it with mapping_store.close_mapping_store.
     Returns: cap, face_mesh, mapping_json_path, id_name_mapping, csv_file_path, frame_idx, photo_dir
     """
-    photo_dir = ensure_photo_dir_exists()
-    mapping_json_path = os.path.join("photo_id", "id_name_mapping.json")
-    if os.path.exists(mapping_json_path):
-        with open(mapping_json_path, 'r') as f:
-            id_name_mapping = json.load(f)
-    else:
-        id_name_mapping = {}
+    photo_dir = ensure_photo_dir_exists(os.path.join("photo_id", job_id) if job_id else "photo_id")
+    mapping_json_path = os.path.join(photo_dir, "id_name_mapping.json")
+    id_name_mapping = open_mapping_store(mapping_json_path)
 
     csv_file_path, fieldnames, frame_idx = setup_csv_output(output_csv)
 
@@ -34,71 +39,258 @@ def initialize_tracking(video_path, output_csv):
     face_mesh = create_face_mesh()
     return cap, face_mesh, mapping_json_path, id_name_mapping, csv_file_path, frame_idx, photo_dir
 
-def process_frame(frame, face_mesh, mapping_json_path, id_name_mapping, csv_file_path, frame_idx):
+def _run_face_mesh(frame, face_mesh, now, frame_idx, recorder=None, inference_width=None, roi=None):
+    """Face mesh on the (downscaled / cropped) frame; landmarks come back in full-frame coordinates"""
+    h, w, _ = frame.shape
+    with span("face_mesh"):
+        rgb = prepare_inference_input(frame, inference_width, roi)
+        results = face_mesh.process(rgb)
+        remap_landmarks_from_roi(results.multi_face_landmarks, roi, w, h)
+
+    if recorder is not None:
+        recorder.append(frame_idx, now, results.multi_face_landmarks)
+    return results.multi_face_landmarks or []
+
+def _register_new_student(frame, geometry, s_id, photo_dir, id_name_mapping, name_cache=None):
+    """
+    OCR the name tag of a new student into the in-memory mapping (persisted by the store).
+    With a NameTagCache, a tag that looks like an already read one, of a student last seen
+    nearby, merges the student instead.
+    """
+    with span("ocr"):
+        if name_cache is not None:
+            tag_img = crop_face_with_padding(frame, geometry, **NAME_TAG_PADDING)
+            if name_cache.resolve(tag_img, s_id, id_name_mapping, face_position(geometry)):
+                return
+        name, confidence = handle_new_student(frame, geometry, s_id, photo_dir=photo_dir)
+        if name_cache is not None:
+            name_cache.add(tag_img, name, s_id, confidence)
+    if name is not None:
+        id_name_mapping[s_id] = name
+
+def _reidentify(s_id, observation, reid):
+    """Let the FaceDescriptorBank merge a new student into one seen earlier (recorded in reid.aliases)"""
+    if reid is not None and observation is not None:
+        with span("reid"):
+            reid.resolve(s_id, observation["landmarks"], observation["yaw_angle"])
+
+def _see(student_ids, name_cache, reid):
+    """Tell the merge stages which students are in this frame (they are never merged together)"""
+    for stage in (name_cache, reid):
+        if stage is not None:
+            stage.see(student_ids)
+
+def _observe(s_id, landmarks, frame_w, frame_h):
+    """
+    Gaze, head pose and attention for one face (landmarks: FaceGeometry or landmark dict);
+    None if head pose cannot be estimated
+    """
+    # gaze using left eye (same as original)
+    if all(i in landmarks for i in LEFT_IRIS + LEFT_EYE):
+        left_iris = [landmarks[i] for i in LEFT_IRIS]
+        left_eye = [landmarks[i] for i in LEFT_EYE]
+        gaze = get_gaze_direction(left_iris, left_eye)
+    else:
+        gaze = "unknown"
+
+    try:
+        with span("head_pose"):
+            rot_vec = estimate_head_pose(landmarks, frame_w, frame_h)
+    except Exception:
+        return None
+
+    attention, yaw_angle = get_attention_label(gaze, rot_vec)
+    return {
+        "student_id": s_id, "landmarks": landmarks, "gaze": gaze,
+        "attention": attention, "yaw_angle": yaw_angle,
+    }
+
+def detect_faces(frame, face_mesh, photo_dir, id_name_mapping, now, frame_idx, recorder=None,
+                 inference_width=None, roi=None, name_capture=None, name_cache=None, reid=None):
+    """
+    Runs face mesh and turns every face into an observation: student ID, pixel landmarks,
+    gaze, attention and yaw. New students go through OCR right away, or, with a NameCapture,
+    every sighting is offered to it and OCR runs later on the best ones. New students that a
+    FaceDescriptorBank merges into an earlier student skip OCR altogether.
+    Returns: observations and id_name_mapping
+    """
+    h, w, _ = frame.shape
+    faces = _run_face_mesh(frame, face_mesh, now, frame_idx, recorder, inference_width, roi)
+
+    with span("reid"):
+        assigned = [assign_student_id(face_landmarks, student_ids, w, h) for face_landmarks in faces]
+    _see([s_id for s_id, _ in assigned], name_cache, reid)
+
+    observations = []
+    for face_landmarks, (s_id, is_new) in zip(faces, assigned):
+        geometry = FaceGeometry.from_landmarks(face_landmarks, w, h)
+        observation = _observe(s_id, geometry, w, h)
+        if is_new:
+            _reidentify(s_id, observation, reid)
+        merged = reid is not None and s_id in reid.aliases
+        if is_new and not merged and name_capture is None:
+            _register_new_student(frame, geometry, s_id, photo_dir, id_name_mapping, name_cache)
+
+        if observation is not None:
+            observations.append(observation)
+            if name_capture is not None and not merged:
+                name_capture.offer(frame, geometry, s_id, observation["yaw_angle"], now, id_name_mapping)
+    return observations, id_name_mapping
+
+def track_faces(frame, face_mesh, tracker, photo_dir, id_name_mapping, now, frame_idx, recorder=None,
+                inference_width=None, roi=None, name_capture=None, name_cache=None, reid=None):
+    """
+    detect_faces for detect-then-track mode: face mesh only runs when the FaceTracker asks for a
+    detection, and student IDs come from track continuity. Tracked frames are not recorded, and
+    only detection frames (full mesh) are offered to the NameCapture.
+    """
+    h, w, _ = frame.shape
+    with span("reid"):
+        tracked = tracker.update(
+            frame, lambda: _run_face_mesh(frame, face_mesh, now, frame_idx, recorder, inference_width, roi)
+        )
+    _see([s_id for s_id, _, _, _ in tracked], name_cache, reid)
+
+    observations = []
+    for s_id, landmarks, face, is_new in tracked:
+        geometry = FaceGeometry.from_landmarks(face, w, h) if face is not None else None
+        observation = _observe(s_id, landmarks, w, h)
+        if is_new:
+            _reidentify(s_id, observation, reid)
+        merged = reid is not None and s_id in reid.aliases
+        if is_new and not merged and name_capture is None:
+            _register_new_student(frame, geometry, s_id, photo_dir, id_name_mapping, name_cache)
+        if observation is not None:
+            observations.append(observation)
+            if name_capture is not None and geometry is not None and not merged:
+                name_capture.offer(frame, geometry, s_id, observation["yaw_angle"], now, id_name_mapping)
+    return observations, id_name_mapping
+
+def _file_size(path):
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+def _canonical_id(student_id, *stages):
+    """Apply every stage's merges until none of them maps the ID any further"""
+    seen = set()
+    while student_id not in seen:
+        seen.add(student_id)
+        for stage in stages:
+            if stage is not None:
+                student_id = stage.canonical(student_id)
+    return student_id
+
+
+def process_frame(frame, face_mesh, photo_dir, id_name_mapping, csv_file_path, frame_idx, recorder=None,
+                  inference_width=None, roi=None, motion_gate=None, tracker=None, annotate=False, preview=None,
+                  name_capture=None, name_cache=None, reid=None, metrics_engine=None, fatigue=None,
+                  attention_log=None, log_index=None):
     """
     Processes one frame: detects faces, assigns IDs, runs OCR on new faces, computes metrics,
-    writes CSV rows, and draws annotations on the frame.
+    and writes CSV rows. Overlays are only drawn onto the frame with annotate=True (e.g. for a
+    live window); a PreviewWriter renders them into a preview video in the background instead.
+    If a LandmarkRecorder is given, the detected landmarks are also recorded for offline replay.
+    Face mesh runs on a copy downscaled to inference_width (and cropped to roi, x/y/w/h in pixels);
+    landmarks are mapped back to the full frame, so head pose, crops and OCR use full resolution.
+    If a MotionGate is given and the frame is static, face mesh is skipped and the previous
+    observations are carried forward; metrics and CSV rows still use this frame's time.
+    If a FaceTracker is given, face mesh only runs every few frames and faces are tracked in between.
+    If a NameCapture is given, names and photos come from each student's best frames instead of the first.
+    If a NameTagCache is given, a new student whose name tag matches an already read one is merged
+    into that student: no OCR, and their rows and metrics continue under the earlier ID.
+    If a FaceDescriptorBank is given, new students are first matched against earlier ones by face
+    geometry the same way, and every detected face updates its student's summary.
+    If a MetricsEngine is given, it keeps the per-student metrics and also writes attention events
+    and interval rollups.
+    If a FatigueDetector is given, yawning_count and eye_closure_duration_sec are measured from
+    the eyelid and lip landmarks of all faces in the frame.
+    If an AttentionLogWriter is given, the rows are also appended to the binary log; with
+    csv_file_path=None they are only written there.
+    If a LogIndexWriter is given, each frame's row and byte offsets in the log it indexes (the
+    binary log when one is written, else the CSV) are added to it.
     Returns: updated frame_idx and id_name_mapping
     """
-    h, w, _ = frame.shape
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    results = face_mesh.process(rgb)
     now = time.time()
     timestamp = pd.Timestamp.now().isoformat()
     row_data = []
 
-    if results.multi_face_landmarks:
-        for face_landmarks in results.multi_face_landmarks:
-            s_id, is_new = assign_student_id(face_landmarks, student_ids, w, h)
-            if is_new:
-                handle_new_student(frame, face_landmarks, w, h, s_id, mapping_json_path=mapping_json_path, photo_dir="photo_id")
-                # refresh mapping
-                if os.path.exists(mapping_json_path):
-                    with open(mapping_json_path, 'r') as f:
-                        id_name_mapping = json.load(f)
-
-            landmarks = landmarks_to_dict(face_landmarks, w, h)
-
-            # gaze using left eye (same as original)
-            if all(i in landmarks for i in LEFT_IRIS + LEFT_EYE):
-                left_iris = [landmarks[i] for i in LEFT_IRIS]
-                left_eye = [landmarks[i] for i in LEFT_EYE]
-                gaze = get_gaze_direction(left_iris, left_eye)
-            else:
-                gaze = "unknown"
-
-            try:
-                rot_vec = estimate_head_pose(landmarks, w, h)
-            except Exception:
-                continue
-
-            attention, yaw_angle = get_attention_label(gaze, rot_vec)
-            metrics = update_student_metrics(s_id, attention, now)
+    if motion_gate is not None and motion_gate.should_skip(frame):
+        observations = motion_gate.carried
+    else:
+        detect = detect_faces if tracker is None else partial(track_faces, tracker=tracker)
+        observations, id_name_mapping = detect(
+            frame, face_mesh, photo_dir=photo_dir, id_name_mapping=id_name_mapping, now=now,
+            frame_idx=frame_idx, recorder=recorder, inference_width=inference_width, roi=roi,
+            name_capture=name_capture, name_cache=name_cache, reid=reid
+        )
+        if reid is not None or name_cache is not None:
+            for obs in observations:
+                obs["student_id"] = _canonical_id(obs["student_id"], reid, name_cache)
+        if reid is not None:
+            for obs in observations:
+                reid.observe(obs["student_id"], obs["landmarks"], obs["yaw_angle"], now)
+        if name_cache is not None:
+            for obs in observations:
+                name_cache.observe(obs["student_id"], obs["landmarks"])
+        if motion_gate is not None:
+            motion_gate.update(frame, observations)
+
+    if fatigue is not None:
+        with span("fatigue"):
+            fatigue.update(observations, now)
+
+    frame_h, frame_w = frame.shape[:2]
+    for obs in observations:
+        s_id, attention, gaze = obs["student_id"], obs["attention"], obs["gaze"]
+        nose_x, nose_y = obs["landmarks"][1]
+        yawns, closure = obs.get("yawning_count"), obs.get("eye_closure_sec")
+        if metrics_engine is not None:
+            metrics = metrics_engine.update(s_id, attention, now, yawns, closure)
+            a_score, distraction_events, yawning_count, closure_dur, session_duration, distraction_rate = metrics.summary()
+        else:
+            metrics = update_student_metrics(s_id, attention, now, yawns, closure)
             a_score, distraction_events, yawning_count, closure_dur, session_duration, distraction_rate = compute_metrics(metrics)
 
-            student_name = id_name_mapping.get(s_id, "Unknown")
-
-            row_data.append({
-                "name": student_name,
-                "student_id": s_id,
-                "timestamp": timestamp,
-                "frame_idx": frame_idx,
-                "attention_status": attention,
-                "gaze": gaze,
-                "yaw_angle_deg": yaw_angle,
-                "attention_score": round(a_score,1),
-                "distraction_events": distraction_events,
-                "yawning_count": yawning_count,
-                "eye_closure_duration_sec": closure_dur,
-                "focus_quality": "",
-                "session_duration_minutes": round(session_duration,2)
-            })
-
-            draw_annotations(frame, landmarks, s_id, gaze, attention)
+        student_name = id_name_mapping.get(s_id, "Unknown")
+
+        row_data.append({
+            "name": student_name,
+            "student_id": s_id,
+            "timestamp": timestamp,
+            "frame_idx": frame_idx,
+            "attention_status": attention,
+            "gaze": gaze,
+            "yaw_angle_deg": obs["yaw_angle"],
+            "attention_score": round(a_score,1),
+            "distraction_events": distraction_events,
+            "yawning_count": yawning_count,
+            "eye_closure_duration_sec": closure_dur,
+            "focus_quality": "",
+            "session_duration_minutes": round(session_duration,2),
+            # Where the face is (fraction of the frame), for joining split tracks after the session
+            "nose_x": round(nose_x / frame_w, 4),
+            "nose_y": round(nose_y / frame_h, 4)
+        })
+
+        if annotate:
+            draw_annotations(frame, obs["landmarks"], s_id, gaze, attention)
+
+    if preview is not None:
+        preview.submit(frame, observations)
 
     if row_data:
-        new_df = pd.DataFrame(row_data)
-        append_rows(csv_file_path, new_df, frame_idx)
-        frame_idx += 1
+        if log_index is not None:
+            byte_start = attention_log.tell() if attention_log is not None else _file_size(csv_file_path)
+        if csv_file_path is not None:
+            with span("csv_write"):
+                new_df = pd.DataFrame(row_data)
+                append_rows(csv_file_path, new_df)
+        if attention_log is not None:
+            with span("log_write"):
+                attention_log.append(row_data, now)
+        if log_index is not None:
+            byte_end = attention_log.tell() if attention_log is not None else _file_size(csv_file_path)
+            log_index.add_frame(now, [row["student_id"] for row in row_data], byte_start, byte_end)
+    # Every processed frame, with or without faces: rows and landmark recordings keep the video's frame numbers
+    frame_idx += 1
 
     return frame, frame_idx, id_name_mapping
@@ -4,7 +4,13 @@ import numpy as np
 
 student_ids = {}
 
-def assign_student_id(face_landmarks, student_ids_dict, frame_w, frame_h, distance_threshold=50):
+# Max nose-tip movement (pixels) between frames to keep the same ID (tunable, see sweep.py)
+DISTANCE_THRESHOLD_PX = 50
+
+def new_student_id():
+    return str(uuid.uuid4())[:8]
+
+def assign_student_id(face_landmarks, student_ids_dict, frame_w, frame_h, distance_threshold=DISTANCE_THRESHOLD_PX):
     """
     Same logic as original assign_student_id: uses nose tip + eyes to re-id by distance.
     Returns (student_id, is_new)
@@ -22,6 +28,6 @@ def assign_student_id(face_landmarks, student_ids_dict, frame_w, frame_h, distan
     if min_id is not None:
         student_ids_dict[min_id] = nose_tip
         return min_id, False
-    new_id = str(uuid.uuid4())[:8]
+    new_id = new_student_id()
     student_ids_dict[new_id] = nose_tip
     return new_id, True
@@ -0,0 +1,111 @@
+# landmark_log.py
+"""
+Compact per-frame landmark recordings for offline replay.
+
+Only the landmark indices the tracker actually reads are stored, as fixed-width
+records appended to a binary file, plus a small JSON sidecar. Recordings are read
+back with np.memmap, so replaying long sessions does not load them into memory.
+"""
+import json
+import os
+from types import SimpleNamespace
+
+import numpy as np
+
+from face_utils import LEFT_EYE, RIGHT_EYE, LEFT_IRIS, RIGHT_IRIS
+from fatigue import FATIGUE_LANDMARKS
+
+# Nose tip, chin, mouth corners (head pose and re-id), eye corners and irises (gaze),
+# eyelids and inner lips (yawning / eye closure)
+HEAD_POSE_LANDMARKS = [1, 152, 263, 33, 287, 57]
+USED_LANDMARKS = sorted(set(HEAD_POSE_LANDMARKS + LEFT_EYE + RIGHT_EYE + LEFT_IRIS + RIGHT_IRIS + FATIGUE_LANDMARKS))
+
+FORMAT_VERSION = 1
+
+
+def record_dtype(num_landmarks):
+    """One record per detected face: normalized (x, y) of the used landmarks plus the full-mesh bbox"""
+    return np.dtype([
+        ("frame_idx", "<i4"),
+        ("timestamp", "<f8"),
+        ("landmarks", "<f4", (num_landmarks, 2)),
+        ("bbox", "<f4", (4,)),  # min_x, min_y, max_x, max_y over all mesh points (normalized)
+    ])
+
+
+class LandmarkRecorder:
+    """Appends the faces of each processed frame to <path> (binary) and <path>.json (metadata)"""
+
+    def __init__(self, path, frame_w, frame_h, indices=USED_LANDMARKS):
+        self.path = path
+        self.indices = list(indices)
+        self.frame_w = frame_w
+        self.frame_h = frame_h
+        self.dtype = record_dtype(len(self.indices))
+        self.records_written = 0
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "wb")
+
+    def append(self, frame_idx, timestamp, multi_face_landmarks):
+        """Record every face of one frame (no-op for frames without faces)"""
+        if not multi_face_landmarks:
+            return
+        records = np.zeros(len(multi_face_landmarks), dtype=self.dtype)
+        records["frame_idx"] = frame_idx
+        records["timestamp"] = timestamp
+        for k, face in enumerate(multi_face_landmarks):
+            points = face.landmark
+            coords = np.array([(lm.x, lm.y) for lm in points], dtype=np.float32)
+            subset = np.full((len(self.indices), 2), np.nan, dtype=np.float32)
+            available = [j for j, i in enumerate(self.indices) if i < len(points)]
+            subset[available] = coords[[self.indices[j] for j in available]]
+            records["landmarks"][k] = subset
+            records["bbox"][k] = (*coords.min(axis=0), *coords.max(axis=0))
+        self._file.write(records.tobytes())
+        self.records_written += len(records)
+
+    def close(self):
+        if self._file.closed:
+            return
+        self._file.close()
+        with open(f"{self.path}.json", "w") as f:
+            json.dump({
+                "version": FORMAT_VERSION,
+                "indices": self.indices,
+                "frame_width": self.frame_w,
+                "frame_height": self.frame_h,
+                "records": self.records_written,
+            }, f)
+
+
+def load_landmarks(path):
+    """
+    Memory-map a recording.
+    Returns (records, meta): a structured array with frame_idx/timestamp/landmarks/bbox fields, and the sidecar dict.
+    """
+    with open(f"{path}.json", "r") as f:
+        meta = json.load(f)
+    if meta.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported landmark recording version: {meta.get('version')}")
+    dtype = record_dtype(len(meta["indices"]))
+    if os.path.getsize(path) == 0:
+        return np.zeros(0, dtype=dtype), meta
+    return np.memmap(path, dtype=dtype, mode="r"), meta
+
+
+class SparseFaceLandmarks:
+    """
+    Exposes recorded landmarks through MediaPipe's face_landmarks.landmark[i].x/.y interface,
+    so tracker functions such as assign_student_id can run unchanged.
+    """
+
+    def __init__(self, coords, indices):
+        self.landmark = {i: SimpleNamespace(x=float(x), y=float(y), z=0.0) for i, (x, y) in zip(indices, coords)}
+
+
+def to_pixel_dict(coords, indices, frame_w, frame_h):
+    """Same shape as landmarks_to_dict, restricted to the recorded indices (missing ones are left out)"""
+    return {
+        i: (int(x * frame_w), int(y * frame_h))
+        for i, (x, y) in zip(indices, coords) if not (np.isnan(x) or np.isnan(y))
+    }
@@ -0,0 +1,143 @@
+# log_index.py
+"""
+Sidecar index for the per-frame attention log, so a drill-down view can read one student's
+timeline or one time window without scanning the whole log.
+
+The tracker appends whole frames, so the log is in time order and every frame is a
+contiguous block of rows / bytes. <log>.idx.json records:
+  - buckets: for every BUCKET_SECONDS of session time, the time, row and byte offset of its
+    first frame
+  - students: per student, when they were first seen and the row / byte ranges
+    ([row_start, row_end, byte_start, byte_end], end exclusive) they appear in; a new range
+    starts when a student was out of view for longer than a bucket
+Byte offsets are file offsets, so they work for the CSV and the binary log (attention_log.py)
+alike; a range starting at byte 0 includes the CSV header line.
+
+    python log_index.py --csv student_attention_log.csv    # index an existing CSV log
+"""
+import argparse
+import datetime
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+FORMAT_VERSION = 1
+BUCKET_SECONDS = 10
+INDEX_SUFFIX = ".idx.json"
+
+
+def log_index_path(log_path):
+    return f"{log_path}{INDEX_SUFFIX}"
+
+
+def local_utc_offset():
+    return datetime.datetime.now().astimezone().utcoffset().total_seconds()
+
+
+class LogIndexWriter:
+    """Builds the index of one log frame by frame; written to <log_path>.idx.json on close"""
+
+    def __init__(self, log_path, bucket_seconds=BUCKET_SECONDS, utc_offset_seconds=None):
+        self.path = log_index_path(log_path)
+        self.log_path = log_path
+        self.bucket_seconds = bucket_seconds
+        # Local time offset when the session started, to compare windows with the CSV's local ISO timestamps
+        if utc_offset_seconds is None:
+            utc_offset_seconds = local_utc_offset()
+        self.utc_offset_seconds = utc_offset_seconds
+        self.buckets = []   # [time, row, byte]
+        self.students = {}  # student_id -> {"first_seen", "last_seen", "ranges"}
+        self.rows = 0
+        self.bytes = 0
+        self._bucket = None
+
+    def add_frame(self, now, student_ids, byte_start, byte_end):
+        """One frame's rows (one student ID per row) were written to [byte_start, byte_end) of the log"""
+        row_start, row_end = self.rows, self.rows + len(student_ids)
+        bucket = int(now // self.bucket_seconds)
+        if bucket != self._bucket:
+            self.buckets.append([now, row_start, byte_start])
+            self._bucket = bucket
+        for s_id in set(student_ids):
+            entry = self.students.get(s_id)
+            if entry is None:
+                self.students[s_id] = {"first_seen": now, "last_seen": now,
+                                       "ranges": [[row_start, row_end, byte_start, byte_end]]}
+                continue
+            if now - entry["last_seen"] > self.bucket_seconds:
+                entry["ranges"].append([row_start, row_end, byte_start, byte_end])
+            else:
+                entry["ranges"][-1][1], entry["ranges"][-1][3] = row_end, byte_end
+            entry["last_seen"] = now
+        self.rows, self.bytes = row_end, byte_end
+
+    def close(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({
+                "version": FORMAT_VERSION,
+                "log": os.path.basename(self.log_path),
+                "bucket_seconds": self.bucket_seconds,
+                "utc_offset_seconds": self.utc_offset_seconds,
+                "rows": self.rows,
+                "bytes": self.bytes,
+                "buckets": self.buckets,
+                "students": {
+                    s_id: {"first_seen": entry["first_seen"], "ranges": entry["ranges"]}
+                    for s_id, entry in self.students.items()
+                },
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def stats(self):
+        return {"buckets": len(self.buckets), "students": len(self.students),
+                "ranges": sum(len(entry["ranges"]) for entry in self.students.values())}
+
+
+def index_csv(csv_path, bucket_seconds=BUCKET_SECONDS, utc_offset_seconds=None):
+    """
+    Build (or rebuild) the index of an existing CSV log, e.g. one recorded without an index or
+    rewritten by reid.py. Rows with the same timestamp are one frame. The CSV's timestamps are
+    local time: they are converted with utc_offset_seconds, else the offset stored in the
+    log's current index (the one the session was recorded with), else today's.
+    """
+    if utc_offset_seconds is None and os.path.exists(log_index_path(csv_path)):
+        with open(log_index_path(csv_path)) as f:
+            utc_offset_seconds = json.load(f).get("utc_offset_seconds")
+    if utc_offset_seconds is None:
+        utc_offset_seconds = local_utc_offset()
+
+    with open(csv_path, "rb") as f:
+        data = np.frombuffer(f.read(), dtype=np.uint8)
+    line_ends = np.flatnonzero(data == ord("\n")) + 1
+    df = pd.read_csv(csv_path, usecols=["student_id", "timestamp"], dtype={"student_id": str})
+    # Line 0 is the header; data row i spans [line_ends[i], line_ends[i + 1])
+    row_bytes = np.append(line_ends[:len(df) + 1], len(data))[:len(df) + 1]
+
+    epoch = (pd.to_datetime(df["timestamp"]) - pd.Timestamp(0)).dt.total_seconds().to_numpy() - utc_offset_seconds
+    timestamps = df["timestamp"].to_numpy()
+    frame_starts = np.flatnonzero(np.r_[True, timestamps[1:] != timestamps[:-1]])
+    frame_stops = np.append(frame_starts[1:], len(df))
+
+    index = LogIndexWriter(csv_path, bucket_seconds, utc_offset_seconds)
+    ids = df["student_id"].tolist()
+    for start, stop in zip(frame_starts.tolist(), frame_stops.tolist()):
+        index.add_frame(float(epoch[start]), ids[start:stop],
+                        0 if start == 0 else int(row_bytes[start]), int(row_bytes[stop]))
+    index.close()
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the sidecar index of an attention log")
+    parser.add_argument("--csv", required=True, help="Attention log written by main.py")
+    parser.add_argument("--bucket_seconds", type=float, default=BUCKET_SECONDS)
+    args = parser.parse_args()
+    index = index_csv(args.csv, args.bucket_seconds)
+    print(f"Indexed {index.rows} rows: {index.stats()} -> {index.path}")
+
+
+if __name__ == "__main__":
+    main()
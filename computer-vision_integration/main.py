@@ -1,37 +1,166 @@
 # main.py
 import argparse
+import os
 import sys
+import time
 import traceback
 import cv2
-from frame_processor import initialize_tracking, process_frame
+from frame_processor import initialize_tracking, process_frame, span
+from landmark_log import LandmarkRecorder
+from face_utils import parse_roi, prepare_inference_input
+from tiling import create_tiled_face_mesh
+from motion_gate import MotionGate
+from face_tracker import FaceTracker
+from preview import PreviewWriter
+from mapping_store import close_mapping_store
+from ocr_photo import photo_writer
+from csv_logger import fill_names
+from name_capture import NameCapture
+from name_tag_cache import NameTagCache
+from reid import FaceDescriptorBank, MATCH_THRESHOLD, student_summaries_path
+from metrics import MetricsEngine
+from fatigue import FatigueDetector
+from attention_log import AttentionLogWriter, binary_log_path
+from log_index import LogIndexWriter, index_csv
 
-def main():
+# How often (in frames) progress_callback is invoked
+PROGRESS_EVERY_N_FRAMES = 30
+
+# Face mesh input width; wider (1080p/4K) frames are downscaled before inference
+DEFAULT_INFERENCE_WIDTH = 1280
+
+def main(progress_callback=None):
+    """
+    Run the tracker over a video. If progress_callback is given it is called as
+    progress_callback(frames_processed, total_frames, fps) every PROGRESS_EVERY_N_FRAMES frames.
+    """
     parser = argparse.ArgumentParser(description='Attention Tracker (short main)')
     parser.add_argument('--video_path', type=str, default='test-data/test_video.mp4')
     parser.add_argument('--output_csv', type=str, default='student_attention_log.csv')
+    parser.add_argument('--job_id', type=str, default=None,
+                        help='Keep photos and the ID-name mapping in photo_id/<job_id> (one per concurrent job)')
+    parser.add_argument('--dump_landmarks', type=str, default=None,
+                        help='Also record per-frame landmarks to this file for offline replay (see replay.py)')
+    parser.add_argument('--inference_width', type=int, default=DEFAULT_INFERENCE_WIDTH,
+                        help='Downscale frames to this width for face mesh (0 = full resolution)')
+    parser.add_argument('--roi', type=str, default=None,
+                        help='Only run face mesh inside x,y,w,h (pixels), e.g. the seating area')
+    parser.add_argument('--tiles', type=str, default=None,
+                        help='Tiled face mesh for large halls: CxR (e.g. 3x2) or "auto" to pick a layout on the first frame')
+    parser.add_argument('--faces_per_tile', type=int, default=15, help='max_num_faces of each tile\'s face mesh')
+    parser.add_argument('--tile_workers', type=int, default=1, help='Threads running tiles in parallel')
+    parser.add_argument('--motion_threshold', type=float, default=0.0,
+                        help='Skip face mesh on frames whose mean grayscale change is below this (0 = off, e.g. 2.0)')
+    parser.add_argument('--motion_regions', action='store_true',
+                        help='Only measure motion around tracked faces')
+    parser.add_argument('--motion_max_skip', type=int, default=15, help='Run face mesh at least every N frames')
+    parser.add_argument('--detect_every', type=int, default=0,
+                        help='Detect-then-track: run face mesh every N frames (or on track loss) and follow faces '
+                             'with optical flow in between (0 = face mesh on every frame)')
+    parser.add_argument('--preview_video', type=str, default=None,
+                        help='Write an annotated preview video here (rendered in a background thread)')
+    parser.add_argument('--preview_fps', type=float, default=5.0)
+    parser.add_argument('--preview_width', type=int, default=640)
+    parser.add_argument('--ocr_window', type=float, default=3.0,
+                        help='Seconds of each new student\'s frames to pick the best name-tag crops from (0 = first frame)')
+    parser.add_argument('--ocr_top_k', type=int, default=3, help='Best crops to try OCR on, best first')
+    parser.add_argument('--tag_match_bits', type=int, default=-1,
+                        help='Reuse the name of an already (confidently) read name tag whose 64-bit hash differs in '
+                             'at most this many bits and whose student was last seen nearby, and merge the new ID '
+                             'into that student (-1 = off, e.g. 6)')
+    parser.add_argument('--reid', action='store_true',
+                        help='Merge new IDs into out-of-view students with the same face geometry, and write '
+                             'per-student summaries to <output_csv>_students.json for reid.py\'s offline merge')
+    parser.add_argument('--reid_threshold', type=float, default=MATCH_THRESHOLD,
+                        help='Max mean relative descriptor difference for a re-id match')
+    parser.add_argument('--events', action='store_true',
+                        help='Also write attention events and 3-minute per-student rollups to '
+                             '<output_csv>_events.csv / <output_csv>_intervals.csv')
+    parser.add_argument('--no_fatigue', action='store_true',
+                        help='Do not measure yawning / eye closure (yawning_count and eye_closure_duration_sec stay 0)')
+    parser.add_argument('--log_format', choices=['csv', 'binary', 'both'], default='csv',
+                        help='binary: write the per-frame log as fixed-width records to <output_csv>.alog '
+                             '(+ .alog.json) instead of CSV; both: write both')
+    parser.add_argument('--no_index', action='store_true',
+                        help='Do not write the <log>.idx.json sidecar index (per-student row ranges and time buckets)')
     args = parser.parse_args()
 
     cap, face_mesh, mapping_json_path, id_name_mapping, csv_file_path, frame_idx, photo_dir = initialize_tracking(
-        args.video_path, args.output_csv
+        args.video_path, args.output_csv, job_id=args.job_id
     )
 
     if not cap.isOpened():
         sys.exit("Error: Could not open video source")
 
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT) or 0)
+    frame_w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    frame_h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    roi = parse_roi(args.roi, frame_w, frame_h)
+    recorder = None
+    if args.dump_landmarks:
+        recorder = LandmarkRecorder(args.dump_landmarks, frame_w, frame_h)
+    # With tiles, every tile is downscaled on its own, so the frame itself stays full resolution
+    inference_width = 0 if args.tiles else args.inference_width
+    tiled_mesh = None
+    motion_gate = None
+    if args.motion_threshold > 0:
+        motion_gate = MotionGate(args.motion_threshold, args.motion_max_skip, per_region=args.motion_regions)
+    tracker = FaceTracker(detect_every=args.detect_every) if args.detect_every > 0 else None
+    name_cache = NameTagCache(args.tag_match_bits) if args.tag_match_bits >= 0 else None
+    reid = FaceDescriptorBank(args.reid_threshold) if args.reid else None
+    metrics_engine = MetricsEngine(args.output_csv, names=id_name_mapping) if args.events else None
+    fatigue = None if args.no_fatigue else FatigueDetector()
+    attention_log = None
+    if args.log_format != 'csv':
+        attention_log = AttentionLogWriter(binary_log_path(csv_file_path))
+    # The per-frame log readers use: the binary log when one is written, else the CSV
+    log_path = attention_log.path if attention_log is not None else csv_file_path
+    # CSV rows are only skipped when the binary log replaces them
+    row_csv_path = None if log_path != csv_file_path and args.log_format == 'binary' else csv_file_path
+    log_index = None
+    if not args.no_index:
+        log_index = LogIndexWriter(log_path)
+    name_capture = None
+    if args.ocr_window > 0:
+        name_capture = NameCapture(args.ocr_window, args.ocr_top_k, photo_dir=photo_dir, name_cache=name_cache)
+    preview = None
+    if args.preview_video:
+        preview = PreviewWriter(args.preview_video, cap.get(cv2.CAP_PROP_FPS), args.preview_fps, args.preview_width)
+    frames_processed = 0
+    start_time = time.time()
+
     try:
         while cap.isOpened():
-            success, frame = cap.read()
+            with span("decode"):
+                success, frame = cap.read()
             if not success:
                 break
 
             if not args.video_path:  # webcam flip
                 frame = cv2.flip(frame, 1)
 
+            if args.tiles and tiled_mesh is None:
+                tiled_mesh = create_tiled_face_mesh(
+                    args.tiles, prepare_inference_input(frame, roi=roi), faces_per_tile=args.faces_per_tile,
+                    workers=args.tile_workers, tile_width=args.inference_width
+                )
+                face_mesh.close()
+                face_mesh = tiled_mesh
+
             frame, frame_idx, id_name_mapping = process_frame(
-                frame, face_mesh, mapping_json_path, id_name_mapping, csv_file_path, frame_idx
+                frame, face_mesh, photo_dir, id_name_mapping, row_csv_path, frame_idx, recorder=recorder,
+                inference_width=inference_width, roi=roi, motion_gate=motion_gate, tracker=tracker,
+                preview=preview, name_capture=name_capture, name_cache=name_cache, reid=reid,
+                metrics_engine=metrics_engine, fatigue=fatigue, attention_log=attention_log,
+                log_index=log_index
             )
+            frames_processed += 1
+
+            if progress_callback and frames_processed % PROGRESS_EVERY_N_FRAMES == 0:
+                elapsed = time.time() - start_time
+                progress_callback(frames_processed, total_frames, frames_processed / elapsed if elapsed > 0 else 0.0)
 
-            # Commented out for headless environment
+            # Commented out for headless environment (pass annotate=True to process_frame to draw overlays)
             # if not args.video_path:
             #     cv2.imshow('Multi-Person Attention Tracker', frame)
             #     if cv2.waitKey(1) & 0xFF == ord('q'):
@@ -43,8 +172,53 @@ def main():
         traceback.print_exc()
     finally:
         cap.release()
+        late_names = {}
+        if name_capture is not None:
+            late_names = name_capture.finish(id_name_mapping)
+            print(f"Name capture: {name_capture.stats()}")
+        if name_cache is not None:
+            print(f"Name tag cache: {name_cache.stats()}")
+        if reid is not None:
+            reid.save(student_summaries_path(args.output_csv))
+            print(f"Re-id: {reid.stats()}")
+        if metrics_engine is not None:
+            metrics_engine.close()
+            print(f"Events: {metrics_engine.stats()}")
+        if fatigue is not None:
+            print(f"Fatigue: {fatigue.stats()}")
+        if attention_log is not None:
+            # After name capture, so the final names go into the sidecar
+            attention_log.close(id_name_mapping)
+            print(f"Binary log: {attention_log.records_written} records")
+        if log_index is not None:
+            log_index.close()
+            print(f"Log index: {log_index.stats()}")
+        if late_names and row_csv_path is not None and os.path.exists(row_csv_path):
+            # Students seen for less than the OCR window were logged before their name was read
+            filled = fill_names(row_csv_path, late_names)
+            if filled and log_index is not None and log_path == row_csv_path:
+                index_csv(row_csv_path)
+            print(f"Filled in late names on {filled} CSV rows")
+        close_mapping_store(id_name_mapping)
+        photo_writer.flush()
+        if motion_gate is not None:
+            print(f"Motion gate: {motion_gate.stats()}")
+        if tracker is not None:
+            print(f"Tracker: {tracker.stats()}")
+        if preview is not None:
+            preview.close()
+            print(f"Preview saved to: {args.preview_video} {preview.stats()}")
+        if tiled_mesh is not None:
+            print(f"Tiles: {tiled_mesh.stats()}")
+            tiled_mesh.close()
+        if recorder is not None:
+            recorder.close()
+            print(f"Landmarks recorded to: {args.dump_landmarks}")
+        if progress_callback:
+            elapsed = time.time() - start_time
+            progress_callback(frames_processed, max(total_frames, frames_processed), frames_processed / elapsed if elapsed > 0 else 0.0)
         #cv2.destroyAllWindows()
-        print(f"Done. Results saved to: {csv_file_path}")
+        print(f"Done. Results saved to: {log_path}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
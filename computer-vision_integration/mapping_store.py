@@ -0,0 +1,96 @@
+# mapping_store.py
+"""
+In-memory student ID -> name mapping with write-behind persistence.
+
+The mapping lives in memory for the whole session; changes are written to its JSON file
+at most once per debounce interval (and on close), always via a temp file + os.replace so
+readers never see a half-written file. Stores are shared per file path, so jobs that point
+at the same file use one store, while jobs with their own photo directory stay separate.
+"""
+import json
+import os
+import threading
+
+# Seconds to wait after a change before writing, so a burst of new students is one write
+WRITE_DELAY = 2.0
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+class MappingStore:
+    def __init__(self, path, write_delay=WRITE_DELAY):
+        self.path = path
+        self.write_delay = write_delay
+        self._lock = threading.Lock()
+        self._timer = None
+        self._dirty = False
+        self._users = 0
+        self.writes = 0
+        self._mapping = {}
+        if os.path.exists(path):
+            with open(path, 'r') as f:
+                self._mapping = json.load(f)
+
+    def get(self, student_id, default=None):
+        return self._mapping.get(student_id, default)
+
+    def __getitem__(self, student_id):
+        return self._mapping[student_id]
+
+    def __contains__(self, student_id):
+        return student_id in self._mapping
+
+    def __len__(self):
+        return len(self._mapping)
+
+    def __setitem__(self, student_id, name):
+        with self._lock:
+            self._mapping[student_id] = name
+            self._dirty = True
+            if self._timer is None:
+                self._timer = threading.Timer(self.write_delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def to_dict(self):
+        with self._lock:
+            return dict(self._mapping)
+
+    def flush(self):
+        """Write pending changes now (atomic replace)"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._dirty:
+                return
+            snapshot = dict(self._mapping)
+            self._dirty = False
+            # Written under the lock so two flushes never race on the same file
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            tmp_path = f"{self.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(snapshot, f, indent=2)
+            os.replace(tmp_path, self.path)
+            self.writes += 1
+
+
+def open_mapping_store(path, write_delay=WRITE_DELAY):
+    """Shared store for path; pair every call with close_mapping_store"""
+    key = os.path.abspath(path)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = MappingStore(path, write_delay)
+        store._users += 1
+        return store
+
+
+def close_mapping_store(store):
+    """Flush the store; it is dropped once its last user closes it"""
+    store.flush()
+    with _stores_lock:
+        store._users -= 1
+        if store._users <= 0:
+            _stores.pop(os.path.abspath(store.path), None)
@@ -1,9 +1,12 @@
 # metrics.py
+import csv
+import datetime
+import os
 import time
 
 student_data = {}
 
-def update_student_metrics(student_id, attention, timestamp):
+def update_student_metrics(student_id, attention, timestamp, yawning_count=None, eye_closure_sec=None):
     if student_id not in student_data:
         student_data[student_id] = {
             "total_frames": 0, "attentive_frames": 0, "not_attentive_frames": 0,
@@ -22,6 +25,11 @@ def update_student_metrics(student_id, attention, timestamp):
             data["distraction_events"] += 1
         data["was_attentive"] = False
     data["last_frame_time"] = timestamp
+    # Running totals from a FatigueDetector, when one is used
+    if yawning_count is not None:
+        data["yawning_count"] = yawning_count
+    if eye_closure_sec is not None:
+        data["eye_closure_duration_sec"] = eye_closure_sec
     return data
 
 def compute_metrics(data):
@@ -29,3 +37,158 @@ def compute_metrics(data):
     session_duration = (data["last_frame_time"] - data["first_frame_time"])/60
     distraction_rate = data["distraction_events"] / session_duration if session_duration > 0 else 0
     return attention_score, data["distraction_events"], data["yawning_count"], data["eye_closure_duration_sec"], session_duration, distraction_rate
+
+
+# Length of the rollup intervals; matches the NLP side's 3-minute aggregation windows
+INTERVAL_SECONDS = 180
+
+EVENT_FIELDS = ["timestamp", "student_id", "event", "value"]
+INTERVAL_FIELDS = [
+    "student_id", "name", "interval_start", "interval_duration_minutes", "frames_analyzed",
+    "attentive_frames", "attention_rate", "avg_attention_score", "total_distractions",
+    "yawning_count", "avg_eye_closure", "session_duration_minutes",
+]
+
+
+def event_log_paths(csv_path):
+    """Event and interval rollup files written next to an attention log"""
+    base = os.path.splitext(csv_path)[0]
+    return f"{base}_events.csv", f"{base}_intervals.csv"
+
+
+class StudentState:
+    """Fixed-size running state of one student (no per-frame history)"""
+    __slots__ = (
+        "total_frames", "attentive_frames", "distraction_events", "was_attentive",
+        "first_frame_time", "last_frame_time", "state_since", "yawning_count", "eye_closure_duration_sec",
+        "interval_index", "interval_frames", "interval_attentive", "interval_distractions",
+        "interval_score_sum", "interval_closure_sum",
+    )
+
+    def __init__(self, timestamp):
+        self.total_frames = self.attentive_frames = self.distraction_events = 0
+        self.was_attentive = True
+        self.first_frame_time = self.last_frame_time = self.state_since = timestamp
+        self.yawning_count = 0
+        self.eye_closure_duration_sec = 0
+        self.interval_index = 0
+        self.interval_frames = self.interval_attentive = self.interval_distractions = 0
+        self.interval_score_sum = self.interval_closure_sum = 0.0
+
+    @property
+    def attention_score(self):
+        return self.attentive_frames / self.total_frames * 100 if self.total_frames else 0
+
+    def summary(self):
+        """Same tuple as compute_metrics"""
+        session_duration = (self.last_frame_time - self.first_frame_time) / 60
+        distraction_rate = self.distraction_events / session_duration if session_duration > 0 else 0
+        return (self.attention_score, self.distraction_events, self.yawning_count,
+                self.eye_closure_duration_sec, session_duration, distraction_rate)
+
+
+class MetricsEngine:
+    """
+    Per-student metrics as discrete events and interval rollups.
+
+    Instead of leaving the NLP side to recover per-interval numbers from cumulative snapshot
+    rows (max - min over millions of rows), the engine writes:
+      - <log>_events.csv: first_seen, distraction_start, distraction_end (value: seconds
+        distracted), yawn (value: yawns so far) and last_seen (value: frames seen) per student
+      - <log>_intervals.csv: one row per student per INTERVAL_SECONDS window, aligned to the
+        student's first frame like CSVLoader's intervals
+    State per student is a fixed-size StudentState. Closed intervals are kept until close(),
+    which writes them with the names known by then (name tags are often read after a
+    student's first interval).
+    """
+
+    def __init__(self, csv_path, interval_seconds=INTERVAL_SECONDS, names=None):
+        self.interval_seconds = interval_seconds
+        self.names = names if names is not None else {}
+        self.students = {}
+        events_path, intervals_path = event_log_paths(csv_path)
+        self._events_file = open(events_path, "w", newline="")
+        self._intervals_file = open(intervals_path, "w", newline="")
+        self._events = csv.writer(self._events_file)
+        self._intervals = csv.writer(self._intervals_file)
+        self._events.writerow(EVENT_FIELDS)
+        self._intervals.writerow(INTERVAL_FIELDS)
+        self.events_written = 0
+        self.intervals_written = 0
+        self._closed_intervals = []  # (student_id, row without the name)
+
+    def _event(self, timestamp, student_id, event, value=""):
+        self._events.writerow((round(timestamp, 3), student_id, event, value))
+        self.events_written += 1
+
+    def update(self, student_id, attention, timestamp, yawning_count=None, eye_closure_sec=None):
+        """Count one frame of a student (plus FatigueDetector totals, if given); returns their StudentState"""
+        state = self.students.get(student_id)
+        if state is None:
+            state = self.students[student_id] = StudentState(timestamp)
+            self._event(timestamp, student_id, "first_seen")
+
+        index = int((timestamp - state.first_frame_time) // self.interval_seconds)
+        if index != state.interval_index:
+            self._close_interval(student_id, state)
+            state.interval_index = index
+
+        attentive = attention == "Attentive"
+        if attentive != state.was_attentive:
+            if attentive:
+                self._event(timestamp, student_id, "distraction_end", round(timestamp - state.state_since, 3))
+            else:
+                self._event(timestamp, student_id, "distraction_start")
+                state.distraction_events += 1
+                state.interval_distractions += 1
+            state.state_since = timestamp
+            state.was_attentive = attentive
+
+        if yawning_count is not None and yawning_count > state.yawning_count:
+            state.yawning_count = yawning_count
+            self._event(timestamp, student_id, "yawn", yawning_count)
+        if eye_closure_sec is not None:
+            state.eye_closure_duration_sec = eye_closure_sec
+
+        state.total_frames += 1
+        state.interval_frames += 1
+        if attentive:
+            state.attentive_frames += 1
+            state.interval_attentive += 1
+        state.last_frame_time = timestamp
+        state.interval_score_sum += state.attention_score
+        state.interval_closure_sum += state.eye_closure_duration_sec
+        return state
+
+    def _close_interval(self, student_id, state):
+        if not state.interval_frames:
+            return
+        start = state.first_frame_time + state.interval_index * self.interval_seconds
+        frames = state.interval_frames
+        self._closed_intervals.append((student_id, (
+            datetime.datetime.fromtimestamp(start).isoformat(), self.interval_seconds / 60, frames,
+            state.interval_attentive, round(state.interval_attentive / frames * 100, 2),
+            round(state.interval_score_sum / frames, 2), state.interval_distractions,
+            state.yawning_count, round(state.interval_closure_sum / frames, 3),
+            round((state.last_frame_time - state.first_frame_time) / 60, 2),
+        )))
+        self.intervals_written += 1
+        state.interval_frames = state.interval_attentive = state.interval_distractions = 0
+        state.interval_score_sum = state.interval_closure_sum = 0.0
+
+    def close(self):
+        """Close every student's open interval and distraction, then the files"""
+        for student_id, state in self.students.items():
+            self._close_interval(student_id, state)
+            if not state.was_attentive:
+                self._event(state.last_frame_time, student_id, "distraction_end",
+                            round(state.last_frame_time - state.state_since, 3))
+            self._event(state.last_frame_time, student_id, "last_seen", state.total_frames)
+        for student_id, row in self._closed_intervals:
+            self._intervals.writerow((student_id, self.names.get(student_id, "Unknown"), *row))
+        self._closed_intervals = []
+        self._events_file.close()
+        self._intervals_file.close()
+
+    def stats(self):
+        return {"students": len(self.students), "events": self.events_written, "intervals": self.intervals_written}
@@ -0,0 +1,90 @@
+# motion_gate.py
+"""
+Cheap frame-difference gate in front of face mesh.
+
+Consecutive lecture frames barely change, so each frame is shrunk to a small grayscale
+image and compared with the last frame face mesh actually ran on. While the difference
+stays below the threshold, process_frame skips inference and carries the previous
+observations (student, landmarks, gaze, attention) forward.
+
+In region mode only the area around each tracked face is compared, so motion elsewhere
+(the lecturer, the projector) does not force inference. Inference is forced at least
+every max_skip frames, so new students are still picked up.
+"""
+import cv2
+import numpy as np
+
+# Width of the grayscale image the diff runs on
+GATE_WIDTH = 160
+
+
+class MotionGate:
+    def __init__(self, threshold=2.0, max_skip=15, per_region=False, region_padding=0.25, width=GATE_WIDTH):
+        self.threshold = threshold
+        self.max_skip = max_skip
+        self.per_region = per_region
+        self.region_padding = region_padding
+        self.width = width
+        self.reference = None
+        self._pending = None
+        self.regions = []
+        self.skipped_in_a_row = 0
+        self.carried = []
+        self.frames = 0
+        self.skipped = 0
+
+    def _small_gray(self, frame):
+        h, w = frame.shape[:2]
+        size = (self.width, max(1, round(h * self.width / w)))
+        small = cv2.resize(frame, size, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY).astype(np.int16)
+
+    def _changed(self, gray):
+        diff = np.abs(gray - self.reference)
+        if not self.per_region or not self.regions:
+            return diff.mean() > self.threshold
+        return any(diff[y0:y1, x0:x1].mean() > self.threshold for x0, y0, x1, y1 in self.regions)
+
+    def should_skip(self, frame):
+        """True if frame is static enough to reuse the last observations instead of running face mesh"""
+        self.frames += 1
+        gray = self._small_gray(frame)
+        skip = (
+            self.reference is not None
+            and self.skipped_in_a_row < self.max_skip
+            and not self._changed(gray)
+        )
+        if skip:
+            self.skipped += 1
+            self.skipped_in_a_row += 1
+        else:
+            self._pending = gray
+        return skip
+
+    def update(self, frame, observations):
+        """Store the frame face mesh just ran on, and what was observed on it"""
+        self.reference = self._pending if self._pending is not None else self._small_gray(frame)
+        self._pending = None
+        self.skipped_in_a_row = 0
+        self.carried = observations
+        if self.per_region:
+            self.regions = [self._region(obs["landmarks"], frame.shape) for obs in observations]
+
+    def _region(self, geometry, shape):
+        """Padded face box in gate-image coordinates"""
+        scale = self.width / shape[1]
+        x0, y0, x1, y1 = geometry.box
+        pad_x, pad_y = (x1 - x0) * self.region_padding, (y1 - y0) * self.region_padding
+        gate_h = round(shape[0] * scale)
+        return (
+            max(0, int((x0 - pad_x) * scale)), max(0, int((y0 - pad_y) * scale)),
+            min(self.width, int((x1 + pad_x) * scale) + 1), min(gate_h, int((y1 + pad_y) * scale) + 1),
+        )
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "inferred": self.frames - self.skipped,
+            "skipped": self.skipped,
+            "skipped_ratio": round(self.skipped / self.frames, 3) if self.frames else 0.0,
+        }
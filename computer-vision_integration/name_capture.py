@@ -0,0 +1,121 @@
+# name_capture.py
+"""
+Best-frame selection for name-tag OCR and student photos.
+
+Instead of reading the name tag on the first frame a student appears (often blurred or
+turned away), every sighting during the first window_seconds is scored by sharpness,
+face size and how frontal the head is. The best top_k crops are kept; when the window
+closes, OCR runs on them best-first and stops at the first confident read. The photo is
+taken from the best-scoring crop.
+With a NameTagCache, a student whose name tag looks like an already read one is merged
+into that student without OCR, checked on the first sighting and again on the best crops.
+"""
+import heapq
+import itertools
+import math
+
+import cv2
+
+from name_tag_cache import face_position
+from ocr_photo import crop_face_with_padding, read_name_tag, store_photo, NAME_NOT_FOUND, NAME_TAG_PADDING
+
+
+def score_candidate(face_img, face_width, yaw_deg):
+    """Higher is better: sharp (variance of Laplacian), large and frontal faces"""
+    if face_img.size == 0:
+        return 0.0
+    gray = cv2.cvtColor(face_img, cv2.COLOR_BGR2GRAY)
+    sharpness = cv2.Laplacian(gray, cv2.CV_64F).var()
+    frontal = max(0.0, math.cos(math.radians(yaw_deg)))
+    return frontal * math.sqrt(max(face_width, 1)) * math.log1p(sharpness)
+
+
+class NameCapture:
+    def __init__(self, window_seconds=3.0, top_k=3, min_confidence=0.6, photo_dir="photo_id", name_cache=None):
+        self.window_seconds = window_seconds
+        self.top_k = top_k
+        self.min_confidence = min_confidence
+        self.photo_dir = photo_dir
+        self.name_cache = name_cache
+        self.pending = {}   # student_id -> {"first_seen", "heap", "position"}
+        self.resolved = set()
+        self._order = itertools.count()  # heap tie-breaker
+        self.ocr_calls = 0
+        self.candidates_seen = 0
+
+    def offer(self, frame, geometry, student_id, yaw_deg, now, id_name_mapping):
+        """
+        Consider this sighting as a candidate. Once the student's window has passed, their
+        name is read from the best candidates and stored in id_name_mapping.
+        """
+        if student_id in self.resolved:
+            return
+        entry = self.pending.get(student_id)
+        if entry is None:
+            if self.name_cache is not None and self.name_cache.resolve(
+                    crop_face_with_padding(frame, geometry, **NAME_TAG_PADDING), student_id, id_name_mapping,
+                    face_position(geometry)):
+                self.resolved.add(student_id)
+                return
+            entry = self.pending[student_id] = {"first_seen": now, "heap": [], "position": None}
+        entry["position"] = face_position(geometry)
+
+        face_img = crop_face_with_padding(frame, geometry, 0.30, 0.30, 0.50, 0.50)
+        min_x, _, max_x, _ = geometry.box
+        score = score_candidate(face_img, max_x - min_x, yaw_deg)
+        self.candidates_seen += 1
+        heap = entry["heap"]
+        if len(heap) < self.top_k or score > heap[0][0]:
+            # Only the two crops are kept, copied since the frame is reused
+            tag_img = crop_face_with_padding(frame, geometry, **NAME_TAG_PADDING)
+            candidate = (score, next(self._order), tag_img.copy(), face_img.copy())
+            if len(heap) < self.top_k:
+                heapq.heappush(heap, candidate)
+            else:
+                heapq.heapreplace(heap, candidate)
+
+        if now - entry["first_seen"] >= self.window_seconds:
+            self._resolve(student_id, id_name_mapping)
+
+    def _resolve(self, student_id, id_name_mapping):
+        entry = self.pending.pop(student_id)
+        self.resolved.add(student_id)
+        best = sorted(entry["heap"], reverse=True)
+        if self.name_cache is not None and any(
+                self.name_cache.resolve(tag_img, student_id, id_name_mapping, entry["position"])
+                for _, _, tag_img, _ in best):
+            return
+
+        name, confidence = NAME_NOT_FOUND, 0.0
+        for _, _, tag_img, _ in best:
+            self.ocr_calls += 1
+            candidate_name, candidate_confidence = read_name_tag(tag_img)
+            if candidate_name != NAME_NOT_FOUND and candidate_confidence > confidence:
+                name, confidence = candidate_name, candidate_confidence
+            if confidence >= self.min_confidence:
+                break
+        print(f"OCR got name: {name} ({confidence:.2f}, {len(best)} candidates)")
+        id_name_mapping[student_id] = name
+
+        if best:
+            if self.name_cache is not None:
+                self.name_cache.add(best[0][2], name, student_id, confidence)
+            store_photo(best[0][3], student_id, self.photo_dir)
+
+    def finish(self, id_name_mapping):
+        """
+        Resolve everyone whose window had not closed yet (end of video). Their rows were logged
+        without a name; returns student_id -> name for the ones read now, to fill them in.
+        """
+        late = list(self.pending)
+        for student_id in late:
+            self._resolve(student_id, id_name_mapping)
+        return {s_id: id_name_mapping[s_id] for s_id in late
+                if id_name_mapping.get(s_id, NAME_NOT_FOUND) != NAME_NOT_FOUND}
+
+    def stats(self):
+        return {
+            "students": len(self.resolved) + len(self.pending),
+            "candidates_seen": self.candidates_seen,
+            "ocr_calls": self.ocr_calls,
+        }
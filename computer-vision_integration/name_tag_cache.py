@@ -0,0 +1,143 @@
+# name_tag_cache.py
+"""
+Name recognition cache keyed on the look of the desk name tag.
+
+When a student's track is lost and re-acquired they get a new ID, and their name tag
+would be read again from an almost identical crop. Every OCR'd tag is stored under a
+64-bit difference hash (dHash) of the tag area; a new student whose tag hashes within
+max_distance bits of a cached one reuses that name without OCR and is merged into the
+earlier student through an alias, so the report shows one student instead of two.
+Only confident reads of textured tags are cached (blank crops all hash alike), and a match
+must be near where the cached student was last seen, like FaceDescriptorBank.match.
+"""
+import cv2
+import numpy as np
+
+from ocr_photo import NAME_NOT_FOUND
+from reid import MAX_SHIFT, SCALE_PAIR
+
+# Part of the wide face crop that holds the name tag (the area read_name_tag OCRs)
+TAG_TOP = 0.60
+TAG_RIGHT = 0.80
+# Tag regions with a lower grayscale standard deviation are blank or out of focus
+MIN_TAG_STDDEV = 12.0
+# OCR reads below this confidence are not cached
+MIN_CONFIDENCE = 0.6
+
+
+def name_tag_region(wide_img):
+    h, w = wide_img.shape[:2]
+    return wide_img[int(h * TAG_TOP):h, 0:int(w * TAG_RIGHT)]
+
+
+def _gray(img):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+
+def has_texture(img, min_stddev=MIN_TAG_STDDEV):
+    """False for empty or near-uniform crops, whose hashes say nothing about the tag"""
+    return img.size > 0 and float(_gray(img).std()) >= min_stddev
+
+
+def dhash(img):
+    """64-bit difference hash: sign of horizontal gradients on a 9x8 grayscale thumbnail"""
+    gray = _gray(img)
+    small = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+
+def face_position(landmarks):
+    """(nose tip, outer eye-corner distance) of a face (FaceGeometry or landmark dict), None without them"""
+    if not all(i in landmarks for i in (1, *SCALE_PAIR)):
+        return None
+    scale = float(np.linalg.norm(np.subtract(landmarks[SCALE_PAIR[0]], landmarks[SCALE_PAIR[1]])))
+    return (np.array(landmarks[1], dtype=np.float32), scale) if scale >= 1 else None
+
+
+class NameTagCache:
+    def __init__(self, max_distance=6, min_confidence=MIN_CONFIDENCE, max_shift=MAX_SHIFT):
+        self.max_distance = max_distance
+        self.min_confidence = min_confidence
+        self.max_shift = max_shift
+        self.entries = []   # (hash, name, confidence, student_id)
+        self.aliases = {}   # merged student_id -> student_id it was merged into
+        self.visible = set()  # students in the current frame, never merge targets
+        self.positions = {}  # student_id -> (nose, scale) where they were last seen
+        self.hits = 0
+        self.misses = 0
+        self.rejected = 0
+
+    def canonical(self, student_id):
+        """ID the student ends up under, following merges of merged students"""
+        while student_id in self.aliases:
+            student_id = self.aliases[student_id]
+        return student_id
+
+    def see(self, student_ids):
+        """Students visible in this frame: two faces seen together are never the same student"""
+        self.visible = {self.canonical(s_id) for s_id in student_ids}
+
+    def observe(self, student_id, landmarks):
+        """Remember where a student (canonical ID) was seen, so only faces near it can match their tag"""
+        position = face_position(landmarks)
+        if position is not None:
+            self.positions[student_id] = position
+
+    def _near(self, student_id, position):
+        last = self.positions.get(student_id)
+        if last is None:
+            return False
+        return np.linalg.norm(position[0] - last[0]) <= self.max_shift * last[1]
+
+    def lookup(self, wide_img, position):
+        """
+        Closest cached tag within max_distance whose student was last seen near position
+        (see face_position), as (name, confidence, student_id), or None
+        """
+        region = name_tag_region(wide_img)
+        if position is None or not self.entries or not has_texture(region):
+            return None
+        h = dhash(region)
+        best = None
+        for entry_hash, name, confidence, student_id in self.entries:
+            if student_id in self.visible or not self._near(student_id, position):
+                continue
+            distance = hamming(h, entry_hash)
+            if distance <= self.max_distance and (best is None or distance < best[0]):
+                best = (distance, name, confidence, student_id)
+        return best[1:] if best else None
+
+    def add(self, wide_img, name, student_id, confidence):
+        """Cache a read; failed, unconfident and blank-tag reads are rejected"""
+        region = name_tag_region(wide_img)
+        if name in (None, NAME_NOT_FOUND) or confidence < self.min_confidence or not has_texture(region):
+            self.rejected += 1
+            return
+        self.entries.append((dhash(region), name, confidence, self.canonical(student_id)))
+
+    def resolve(self, wide_img, student_id, id_name_mapping, position):
+        """
+        If the tag matches a cached one of a student last seen near position, merge student_id
+        into that student and return True; the caller then skips OCR. Misses return False.
+        """
+        hit = self.lookup(wide_img, position)
+        if hit is None:
+            self.misses += 1
+            return False
+        name, _, existing_id = hit
+        self.hits += 1
+        if existing_id != student_id:
+            self.aliases[student_id] = existing_id
+            print(f"Name tag matches {existing_id} ({name}); merging {student_id} into it")
+        if existing_id not in id_name_mapping:
+            id_name_mapping[existing_id] = name
+        return True
+
+    def stats(self):
+        return {"entries": len(self.entries), "rejected": self.rejected, "hits": self.hits, "misses": self.misses,
+                "merged_ids": len(self.aliases)}
@@ -0,0 +1,14 @@
+# nlp_rules.py
+"""
+Log-merging rules shared with EduVision_NLP (utils/track_consolidation.py), so the tracker's
+offline merges (reid.py) and the binary log's sidecar follow the same rules as the report.
+"""
+import os
+import sys
+
+NLP_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "EduVision_NLP")
+# Appended, not inserted: both packages have a main.py and a benchmark.py, and here the tracker's win
+if NLP_DIR not in sys.path:
+    sys.path.append(NLP_DIR)
+
+from utils.track_consolidation import UNRESOLVED_NAMES, consolidate_rollups, recompute_merged, resolve_names  # noqa: E402
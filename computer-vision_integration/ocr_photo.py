@@ -1,6 +1,7 @@
 # ocr_photo.py
 import os
-import json
+import queue
+import threading
 import cv2
 import easyocr
 
@@ -9,28 +10,35 @@ def ensure_photo_dir_exists(photo_dir="photo_id"):
         os.makedirs(photo_dir)
     return photo_dir
 
-def crop_face_with_padding(frame, face_landmarks, frame_w, frame_h, 
+def crop_face_with_padding(frame, geometry,
                           pad_left_ratio=0.2, pad_right_ratio=0.2,
                           pad_top_ratio=0.3, pad_bottom_ratio=0.4):
-    points = [(int(lm.x * frame_w), int(lm.y * frame_h)) for lm in face_landmarks.landmark]
-    x_vals, y_vals = zip(*points)
-    min_x, max_x = min(x_vals), max(x_vals)
-    min_y, max_y = min(y_vals), max(y_vals)
-    box_w = max_x - min_x
-    box_h = max_y - min_y
-    pad_left = int(box_w * pad_left_ratio)
-    pad_right = int(box_w * pad_right_ratio)
-    pad_top = int(box_h * pad_top_ratio)
-    pad_bottom = int(box_h * pad_bottom_ratio)
-    x1 = max(min_x - pad_left, 0)
-    y1 = max(min_y - pad_top, 0)
-    x2 = min(max_x + pad_right, frame_w-1)
-    y2 = min(max_y + pad_bottom, frame_h-1)
+    frame_h, frame_w = frame.shape[:2]
+    x1, y1, x2, y2 = geometry.padded_box(frame_w, frame_h, pad_left_ratio, pad_right_ratio,
+                                         pad_top_ratio, pad_bottom_ratio)
     return frame[y1:y2, x1:x2]
 
-def extract_name_easyocr_from_array(img_array, show_debug=False):
-    reader = easyocr.Reader(['en'], gpu=False)
+# Crop around the face that contains the desk name tag (to the left of and below the face)
+NAME_TAG_PADDING = dict(pad_left_ratio=1.3, pad_right_ratio=0.2, pad_top_ratio=0.3, pad_bottom_ratio=0.4)
+
+NAME_NOT_FOUND = "Name not found"
+
+_reader = None
+_reader_lock = threading.Lock()
+
+def _get_reader():
+    """EasyOCR loads its models on construction, so one reader is shared by all calls"""
+    global _reader
+    with _reader_lock:
+        if _reader is None:
+            _reader = easyocr.Reader(['en'], gpu=False)
+        return _reader
+
+def read_name_tag(img_array, show_debug=False):
+    """OCR the name tag area of a wide face crop. Returns (name, mean confidence)."""
     h, w = img_array.shape[:2]
+    if h == 0 or w == 0:
+        return NAME_NOT_FOUND, 0.0
     scale = 4
     image_up = cv2.resize(img_array, (w * scale, h * scale), interpolation=cv2.INTER_CUBIC)
     h_up, w_up = image_up.shape[:2]
@@ -39,7 +47,7 @@ def extract_name_easyocr_from_array(img_array, show_debug=False):
     crop_bottom = h_up
     crop_right = int(w_up * 0.80)
     cropped = image_up[crop_top:crop_bottom, crop_left:crop_right]
-    results = reader.readtext(cropped)
+    results = _get_reader().readtext(cropped)
     if show_debug:
         for (bbox, text, confidence) in results:
             print(f"[{confidence:.2f}] {text}")
@@ -47,57 +55,69 @@ def extract_name_easyocr_from_array(img_array, show_debug=False):
         print("Saved debug image as debug_output.jpg")
     if results:
         results.sort(key=lambda r: r[0][0][0])
-        return " ".join([r[1] for r in results])
+        return " ".join([r[1] for r in results]), sum(r[2] for r in results) / len(results)
     else:
-        return "Name not found"
-
-def save_face_photo(frame, face_landmarks, frame_w, frame_h, student_id, photo_dir="photo_id"):
-    points = [(int(lm.x * frame_w), int(lm.y * frame_h)) for lm in face_landmarks.landmark]
-    x_vals, y_vals = zip(*points)
-    min_x, max_x = min(x_vals), max(x_vals)
-    min_y, max_y = min(y_vals), max(y_vals)
-    box_w = max_x - min_x
-    box_h = max_y - min_y
-    pad_left_ratio = 1.3
-    pad_right_ratio = 0.2
-    pad_top_ratio = 0.3
-    pad_bottom_ratio = 0.4
-    pad_left = int(box_w * pad_left_ratio)
-    pad_right = int(box_w * pad_right_ratio)
-    pad_top = int(box_h * pad_top_ratio)
-    pad_bottom = int(box_h * pad_bottom_ratio)
-    x1 = max(min_x - pad_left, 0)
-    y1 = max(min_y - pad_top, 0)
-    x2 = min(max_x + pad_right, frame_w-1)
-    y2 = min(max_y + pad_bottom, frame_h-1)
-    face_img = frame[y1:y2, x1:x2]
-    out_path = os.path.join(photo_dir, f"{student_id}.jpg")
-    cv2.imwrite(out_path, face_img)
-
-def handle_new_student(frame, face_landmarks, frame_w, frame_h, student_id, mapping_json_path, photo_dir="photo_id"):
-    wide_img = crop_face_with_padding(
-        frame, face_landmarks, frame_w, frame_h,
-        pad_left_ratio=1.3, pad_right_ratio=0.2,
-        pad_top_ratio=0.3, pad_bottom_ratio=0.4
-    )
-    name = extract_name_easyocr_from_array(wide_img, show_debug=False)
-    print(f"OCR got name: {name}")
+        return NAME_NOT_FOUND, 0.0
 
-    if os.path.exists(mapping_json_path):
-        with open(mapping_json_path, 'r') as f:
-            mapping = json.load(f)
-    else:
-        mapping = {}
-    mapping[student_id] = name
-    os.makedirs(os.path.dirname(mapping_json_path), exist_ok=True)
-    with open(mapping_json_path, 'w') as f:
-        json.dump(mapping, f, indent=2)
-
-    normal_img = crop_face_with_padding(
-        frame, face_landmarks, frame_w, frame_h,
+def extract_name_easyocr_from_array(img_array, show_debug=False):
+    return read_name_tag(img_array, show_debug)[0]
+
+class PhotoWriter:
+    """Encodes and writes student photos on a background thread so tracking does not wait on JPEG encoding"""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.thread = None
+        self.lock = threading.Lock()
+
+    def write(self, path, image):
+        if image is None or image.size == 0:
+            print(f"Skipping empty photo: {path}")
+            return
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="photo-writer", daemon=True)
+                self.thread.start()
+        # Crops are views into the frame, which the caller may draw on
+        self.queue.put((path, image.copy()))
+
+    def _run(self):
+        while True:
+            path, image = self.queue.get()
+            try:
+                cv2.imwrite(path, image)
+            except Exception as e:
+                # Keep the thread alive: flush() waits for every queued photo
+                print(f"Could not write photo {path}: {e}")
+            finally:
+                self.queue.task_done()
+
+    def flush(self):
+        """Wait until every queued photo is on disk"""
+        self.queue.join()
+
+photo_writer = PhotoWriter()
+
+def store_photo(face_img, student_id, photo_dir="photo_id"):
+    os.makedirs(photo_dir, exist_ok=True)
+    photo_writer.write(os.path.join(photo_dir, f"{student_id}.jpg"), face_img)
+
+def save_face_photo(frame, geometry, student_id, photo_dir="photo_id"):
+    face_img = crop_face_with_padding(
+        frame, geometry,
         pad_left_ratio=0.30, pad_right_ratio=0.30,
         pad_top_ratio=0.50, pad_bottom_ratio=0.50
     )
-    os.makedirs(photo_dir, exist_ok=True)
-    normal_img_path = os.path.join(photo_dir, f"{student_id}.jpg")
-    cv2.imwrite(normal_img_path, normal_img)
+    store_photo(face_img, student_id, photo_dir)
+
+def handle_new_student(frame, geometry, student_id, photo_dir="photo_id"):
+    """
+    OCR the name tag next to a new student's face (a FaceGeometry) and save their photo.
+    Returns (name, mean confidence).
+    """
+    wide_img = crop_face_with_padding(frame, geometry, **NAME_TAG_PADDING)
+    name, confidence = read_name_tag(wide_img)
+    print(f"OCR got name: {name}")
+
+    save_face_photo(frame, geometry, student_id, photo_dir)
+    return name, confidence
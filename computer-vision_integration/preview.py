@@ -0,0 +1,70 @@
+# preview.py
+"""
+Optional annotated preview video.
+
+Drawing overlays is not needed for the attention log, so process_frame only hands the
+observations of every Nth frame to a PreviewWriter; a background thread downscales,
+draws and encodes them. When the queue is full (encoding slower than tracking), preview
+frames are dropped instead of slowing the tracker down.
+"""
+import queue
+import threading
+
+import cv2
+
+from face_utils import downscale_to_width, draw_annotations
+
+
+class PreviewWriter:
+    def __init__(self, path, source_fps, fps=5.0, width=640, queue_size=32):
+        self.path = path
+        self.fps = fps
+        self.width = width
+        self.every = max(1, round((source_fps or fps) / fps))
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.writer = None
+        self.frames_seen = 0
+        self.frames_written = 0
+        self.dropped = 0
+        self.thread = threading.Thread(target=self._run, name="preview-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, frame, observations):
+        """Queue a frame for the preview if it is due; never blocks"""
+        self.frames_seen += 1
+        if (self.frames_seen - 1) % self.every:
+            return
+        small = downscale_to_width(frame, self.width)
+        if small is frame:
+            small = frame.copy()  # the caller keeps using its frame
+        scale = small.shape[1] / frame.shape[1]
+        faces = [(obs["landmarks"][1], obs["student_id"], obs["gaze"], obs["attention"]) for obs in observations]
+        try:
+            self.queue.put_nowait((small, scale, faces))
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            frame, scale, faces = item
+            for (x, y), s_id, gaze, attention in faces:
+                # draw_annotations only reads the nose tip
+                draw_annotations(frame, {1: (int(x * scale), int(y * scale))}, s_id, gaze, attention)
+            if self.writer is None:
+                h, w = frame.shape[:2]
+                self.writer = cv2.VideoWriter(self.path, cv2.VideoWriter_fourcc(*"mp4v"), self.fps, (w, h))
+            self.writer.write(frame)
+            self.frames_written += 1
+
+    def close(self):
+        """Flush queued frames and finish the video"""
+        self.queue.put(None)
+        self.thread.join()
+        if self.writer is not None:
+            self.writer.release()
+
+    def stats(self):
+        return {"frames_written": self.frames_written, "dropped": self.dropped}
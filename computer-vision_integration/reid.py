@@ -0,0 +1,259 @@
+# reid.py
+"""
+Re-identification from face geometry.
+
+assign_student_id only knows where a nose tip was in the previous frame, so a student who
+leans, leaves the frame or is occluded comes back under a new ID. A FaceDescriptorBank keeps,
+per student, the mean of a small scale-free descriptor (distances between face landmarks
+divided by the outer eye-corner distance) over near-frontal sightings, plus where the face
+was last seen. A new ID whose descriptor matches a student who is out of view and was last
+seen nearby is merged into that student online.
+
+The per-student summaries are written next to the attention log; merge_fragments joins the
+fragments that are left (non-overlapping time spans, matching descriptors) in the CSV before
+the NLP stage, so each student is reported once.
+
+    python reid.py --csv student_attention_log.csv
+"""
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from attention_log import binary_log_path, relabel_students
+from log_index import index_csv, log_index_path
+from metrics import event_log_paths
+from nlp_rules import consolidate_rollups, recompute_merged, resolve_names
+
+# Landmark pairs whose lengths, relative to the outer eye corners (33-263), describe a face:
+# eye widths, inner eye gap, nose-chin, mouth width and nose/chin to eyes and mouth
+SCALE_PAIR = (33, 263)
+DESCRIPTOR_PAIRS = [
+    (33, 133), (362, 263), (133, 362), (1, 152), (57, 287),
+    (1, 33), (1, 263), (1, 57), (1, 287), (152, 57), (152, 287),
+]
+DESCRIPTOR_LANDMARKS = sorted({i for pair in DESCRIPTOR_PAIRS + [SCALE_PAIR] for i in pair})
+_ROW = {i: row for row, i in enumerate(DESCRIPTOR_LANDMARKS)}
+_PAIR_A = np.array([_ROW[a] for a, _ in DESCRIPTOR_PAIRS])
+_PAIR_B = np.array([_ROW[b] for _, b in DESCRIPTOR_PAIRS])
+
+# Mean relative difference between two descriptors below which they are the same face
+MATCH_THRESHOLD = 0.06
+# Only near-frontal sightings are used: yaw distorts the projected distances
+MAX_YAW_DEG = 15.0
+# Descriptors averaged before a student can be matched against
+MIN_SAMPLES = 10
+# Online merges only look this far (in eye-corner distances) from where the student was last seen
+MAX_SHIFT = 6.0
+
+
+def face_descriptor(landmarks):
+    """Descriptor of one face (FaceGeometry or landmark dict in pixels), None without the needed landmarks"""
+    if not all(i in landmarks for i in DESCRIPTOR_LANDMARKS):
+        return None
+    points = np.array([landmarks[i] for i in DESCRIPTOR_LANDMARKS], dtype=np.float32)
+    scale = np.linalg.norm(points[_ROW[SCALE_PAIR[0]]] - points[_ROW[SCALE_PAIR[1]]])
+    if scale < 1:
+        return None
+    return np.linalg.norm(points[_PAIR_A] - points[_PAIR_B], axis=1) / scale
+
+
+def descriptor_distance(a, b):
+    """Mean relative difference; also works row-wise for a (n, d) array against one descriptor"""
+    a, b = np.asarray(a), np.asarray(b)
+    return np.mean(np.abs(a - b) / np.maximum(np.abs(b), 1e-6), axis=-1)
+
+
+def student_summaries_path(csv_path):
+    return f"{os.path.splitext(csv_path)[0]}_students.json"
+
+
+class FaceDescriptorBank:
+    def __init__(self, match_threshold=MATCH_THRESHOLD, min_samples=MIN_SAMPLES, max_yaw=MAX_YAW_DEG,
+                 max_shift=MAX_SHIFT):
+        self.match_threshold = match_threshold
+        self.min_samples = min_samples
+        self.max_yaw = max_yaw
+        self.max_shift = max_shift
+        self.students = {}  # student_id -> {"sum", "count", "first_seen", "last_seen", "position", "scale", "sightings"}
+        self.aliases = {}   # merged student_id -> student_id it was merged into
+        self.visible = set()
+        self.lookups = 0
+
+    def canonical(self, student_id):
+        """ID the student ends up under, following merges of merged students"""
+        while student_id in self.aliases:
+            student_id = self.aliases[student_id]
+        return student_id
+
+    def see(self, student_ids):
+        """Students visible in this frame: two faces seen together are never the same student"""
+        self.visible = {self.canonical(s_id) for s_id in student_ids}
+
+    def observe(self, student_id, landmarks, yaw_deg, now):
+        """Add one sighting (canonical ID) to the student's summary"""
+        entry = self.students.get(student_id)
+        if entry is None:
+            entry = self.students[student_id] = {
+                "sum": None, "count": 0, "first_seen": now, "last_seen": now,
+                "position": None, "scale": None, "sightings": 0,
+            }
+        entry["last_seen"] = now
+        entry["sightings"] += 1
+        if 1 in landmarks:
+            entry["position"] = landmarks[1]
+        if abs(yaw_deg) > self.max_yaw:
+            return
+        descriptor = face_descriptor(landmarks)
+        if descriptor is None:
+            return
+        entry["sum"] = descriptor if entry["sum"] is None else entry["sum"] + descriptor
+        entry["count"] += 1
+        entry["scale"] = float(np.linalg.norm(np.subtract(landmarks[SCALE_PAIR[0]], landmarks[SCALE_PAIR[1]])))
+
+    def match(self, student_id, landmarks, yaw_deg):
+        """Out-of-view student this new face most likely is, or None"""
+        if abs(yaw_deg) > self.max_yaw or 1 not in landmarks:
+            return None
+        descriptor = face_descriptor(landmarks)
+        if descriptor is None:
+            return None
+        self.lookups += 1
+        nose = np.array(landmarks[1])
+        best, best_distance = None, self.match_threshold
+        for s_id, entry in self.students.items():
+            if s_id == student_id or s_id in self.visible or entry["count"] < self.min_samples:
+                continue
+            if np.linalg.norm(nose - entry["position"]) > self.max_shift * entry["scale"]:
+                continue
+            distance = descriptor_distance(descriptor, entry["sum"] / entry["count"])
+            if distance < best_distance:
+                best, best_distance = s_id, distance
+        return best
+
+    def resolve(self, student_id, landmarks, yaw_deg):
+        """Merge a new student into a matching earlier one; True if merged"""
+        existing_id = self.match(student_id, landmarks, yaw_deg)
+        if existing_id is None:
+            return False
+        self.aliases[student_id] = existing_id
+        print(f"Face geometry matches {existing_id}; merging {student_id} into it")
+        return True
+
+    def summaries(self):
+        return {
+            s_id: {
+                "descriptor": (entry["sum"] / entry["count"]).round(4).tolist() if entry["count"] else None,
+                "samples": entry["count"],
+                "sightings": entry["sightings"],
+                "first_seen": entry["first_seen"],
+                "last_seen": entry["last_seen"],
+                "position": list(entry["position"]) if entry["position"] is not None else None,
+            }
+            for s_id, entry in self.students.items()
+        }
+
+    def save(self, path):
+        """Write the per-student summaries (read by merge_fragments)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.summaries(), f)
+        os.replace(tmp_path, path)
+
+    def stats(self):
+        return {"students": len(self.students), "lookups": self.lookups, "merged_ids": len(self.aliases)}
+
+
+def plan_merges(summaries, match_threshold=MATCH_THRESHOLD, min_samples=MIN_SAMPLES):
+    """
+    Group fragments that never overlap in time and whose descriptors match.
+    Fragments are taken in order of appearance; each joins the closest group that ended
+    before it started. Returns {student_id: id of its group's first fragment}.
+    """
+    groups = []  # [root_id, descriptor sum, samples, last_seen]
+    merged = {}
+    for s_id, summary in sorted(summaries.items(), key=lambda item: item[1]["first_seen"]):
+        descriptor = summary["descriptor"]
+        best = None
+        if descriptor is not None and summary["samples"] >= min_samples:
+            best_distance = match_threshold
+            for group in groups:
+                if group[3] >= summary["first_seen"] or group[2] < min_samples:
+                    continue
+                distance = descriptor_distance(descriptor, group[1] / group[2])
+                if distance < best_distance:
+                    best, best_distance = group, distance
+        if best is None:
+            weighted = np.array(descriptor) * summary["samples"] if descriptor is not None else np.zeros(len(DESCRIPTOR_PAIRS))
+            groups.append([s_id, weighted, summary["samples"], summary["last_seen"]])
+            merged[s_id] = s_id
+        else:
+            best[1] = best[1] + np.array(descriptor) * summary["samples"]
+            best[2] += summary["samples"]
+            best[3] = max(best[3], summary["last_seen"])
+            merged[s_id] = best[0]
+    return merged
+
+
+def _rewrite_csv(df, path):
+    tmp_path = f"{path}.tmp"
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+
+
+def merge_fragments(csv_path, summaries_path=None, match_threshold=MATCH_THRESHOLD, min_samples=MIN_SAMPLES):
+    """
+    Rewrite student_id (and name) in the attention log so every merged group of fragments uses
+    its first fragment's ID and the first resolved name, and recompute the merged students'
+    running metrics (attention_score, distraction_events, counters) over their whole span.
+    A binary log next to csv_path (main.py --log_format binary|both) is relabelled through its
+    student dictionary (its readers recompute the metrics); a CSV log index is rebuilt, since
+    the rewritten rows move. The events and interval rollups of main.py --events are relabelled too.
+    Returns the number of IDs merged away.
+    """
+    summaries_path = summaries_path or student_summaries_path(csv_path)
+    with open(summaries_path) as f:
+        summaries = json.load(f)
+    merged = {s_id: root for s_id, root in plan_merges(summaries, match_threshold, min_samples).items() if s_id != root}
+    if not merged:
+        return 0
+
+    log_path = binary_log_path(csv_path)
+    if os.path.exists(f"{log_path}.json"):
+        relabel_students(log_path, merged)
+    if os.path.exists(csv_path):
+        df = pd.read_csv(csv_path, dtype={"student_id": str})
+        fragments = df["student_id"].to_numpy()
+        df["student_id"] = df["student_id"].replace(merged)
+        recompute_merged(df, fragments)
+        df["name"] = resolve_names(df)
+        _rewrite_csv(df, csv_path)
+        if os.path.exists(log_index_path(csv_path)):
+            index_csv(csv_path)
+
+    events_path, intervals_path = event_log_paths(csv_path)
+    if os.path.exists(events_path):
+        events = pd.read_csv(events_path, dtype=str, keep_default_na=False)
+        events["student_id"] = events["student_id"].replace(merged)
+        _rewrite_csv(events, events_path)
+    if os.path.exists(intervals_path):
+        rollups = pd.read_csv(intervals_path, dtype={"student_id": str})
+        _rewrite_csv(consolidate_rollups(rollups, merged), intervals_path)
+    print(f"Merged {len(merged)} fragment IDs into earlier students")
+    return len(merged)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge fragmented student IDs in an attention log")
+    parser.add_argument("--csv", required=True, help="Attention log written by main.py --reid")
+    parser.add_argument("--summaries", default=None, help="Per-student summaries (default: <csv>_students.json)")
+    parser.add_argument("--threshold", type=float, default=MATCH_THRESHOLD)
+    parser.add_argument("--min_samples", type=int, default=MIN_SAMPLES)
+    args = parser.parse_args()
+    merge_fragments(args.csv, args.summaries, args.threshold, args.min_samples)
+
+
+if __name__ == "__main__":
+    main()
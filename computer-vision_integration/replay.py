@@ -0,0 +1,166 @@
+# replay.py
+"""
+Offline replay: run the tracker's decision logic from recorded landmarks instead of video.
+
+Record once with:   python main.py --video_path lesson.mp4 --dump_landmarks lesson.lm
+Replay with:        python replay.py --landmarks lesson.lm --output_csv replayed.csv
+
+Gaze, head pose, re-identification, yawning / eye closure and metrics run exactly as in process_frame, but
+without decoding video or running MediaPipe, so threshold experiments take seconds.
+"""
+import argparse
+import datetime
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import metrics
+from csv_logger import FIELDNAMES
+from fatigue import FatigueDetector, FATIGUE_LANDMARKS, aspect_ratios
+from face_utils import (
+    get_gaze_direction, estimate_head_pose, get_attention_label, LEFT_EYE, LEFT_IRIS,
+    GAZE_RIGHT_RATIO, GAZE_LEFT_RATIO, YAW_THRESHOLD_DEG
+)
+from id_manager import assign_student_id, DISTANCE_THRESHOLD_PX
+from landmark_log import load_landmarks, SparseFaceLandmarks, to_pixel_dict
+from metrics import update_student_metrics, compute_metrics
+
+# Tunable decision thresholds, defaults as used live
+DEFAULT_PARAMS = {
+    "gaze_right_ratio": GAZE_RIGHT_RATIO,
+    "gaze_left_ratio": GAZE_LEFT_RATIO,
+    "yaw_threshold": YAW_THRESHOLD_DEG,
+    "distance_threshold": DISTANCE_THRESHOLD_PX,
+}
+
+
+def frame_slices(records):
+    """Yield (start, stop) row ranges, one per recorded frame"""
+    if len(records) == 0:
+        return
+    # frame_idx, not the timestamp: two frames can share a wall-clock timestamp
+    frame_idx = np.asarray(records["frame_idx"])
+    boundaries = np.flatnonzero(np.diff(frame_idx) != 0) + 1
+    starts = np.concatenate([[0], boundaries])
+    stops = np.concatenate([boundaries, [len(records)]])
+    yield from zip(starts.tolist(), stops.tolist())
+
+
+def replay_landmarks(records, meta, id_name_mapping=None, collect_rows=True, params=None, predictions=None):
+    """
+    Drive gaze, head pose, re-id and metrics from recorded landmarks.
+    Returns (rows, stats); rows use the tracker's CSV columns.
+
+    params overrides DEFAULT_PARAMS. If predictions is a list, (record_index, student_id, attention)
+    is appended for every face that got an attention label.
+    """
+    params = {**DEFAULT_PARAMS, **(params or {})}
+    indices = meta["indices"]
+    w, h = meta["frame_width"], meta["frame_height"]
+    id_name_mapping = id_name_mapping or {}
+
+    # Fresh tracker state for every replay
+    student_ids = {}
+    metrics.student_data.clear()
+    # Recordings made before the eyelid / lip landmarks were stored replay without fatigue metrics
+    fatigue, fatigue_cols = None, None
+    if all(i in indices for i in FATIGUE_LANDMARKS):
+        fatigue = FatigueDetector()
+        fatigue_cols = [indices.index(i) for i in FATIGUE_LANDMARKS]
+
+    rows = []
+    faces_seen = frames = 0
+    start = time.perf_counter()
+    for frame_start, frame_stop in frame_slices(records):
+        frames += 1
+        frame = records[frame_start:frame_stop]
+        now = float(frame["timestamp"][0])
+        frame_idx = int(frame["frame_idx"][0])
+        timestamp = datetime.datetime.fromtimestamp(now).isoformat() if collect_rows else None
+        coords_all = np.asarray(frame["landmarks"])
+        if fatigue is not None:
+            ears, mars = aspect_ratios(coords_all[:, fatigue_cols] * (w, h))
+
+        for offset, coords in enumerate(coords_all):
+            faces_seen += 1
+            s_id, _ = assign_student_id(SparseFaceLandmarks(coords, indices), student_ids, w, h,
+                                        distance_threshold=params["distance_threshold"])
+            landmarks = to_pixel_dict(coords, indices, w, h)
+
+            if all(i in landmarks for i in LEFT_IRIS + LEFT_EYE):
+                gaze = get_gaze_direction([landmarks[i] for i in LEFT_IRIS], [landmarks[i] for i in LEFT_EYE],
+                                          params["gaze_right_ratio"], params["gaze_left_ratio"])
+            else:
+                gaze = "unknown"
+
+            try:
+                rot_vec = estimate_head_pose(landmarks, w, h)
+            except Exception:
+                continue
+
+            attention, yaw_angle = get_attention_label(gaze, rot_vec, params["yaw_threshold"])
+            yawns = closure = None
+            if fatigue is not None:
+                state = fatigue.step(s_id, ears[offset], mars[offset], now)
+                yawns, closure = state.yawning_count, round(state.closure_total(now), 2)
+            data = update_student_metrics(s_id, attention, now, yawns, closure)
+            if predictions is not None:
+                predictions.append((frame_start + offset, s_id, attention))
+            if not collect_rows:
+                continue
+            a_score, distraction_events, yawning_count, closure_dur, session_duration, _ = compute_metrics(data)
+            rows.append({
+                "name": id_name_mapping.get(s_id, "Unknown"),
+                "student_id": s_id,
+                "timestamp": timestamp,
+                "frame_idx": frame_idx,
+                "attention_status": attention,
+                "gaze": gaze,
+                "yaw_angle_deg": yaw_angle,
+                "attention_score": round(a_score, 1),
+                "distraction_events": distraction_events,
+                "yawning_count": yawning_count,
+                "eye_closure_duration_sec": closure_dur,
+                "focus_quality": "",
+                "session_duration_minutes": round(session_duration, 2),
+                "nose_x": round(landmarks[1][0] / w, 4),
+                "nose_y": round(landmarks[1][1] / h, 4)
+            })
+
+    elapsed = time.perf_counter() - start
+    stats = {
+        "frames": frames,
+        "faces": faces_seen,
+        "students": len(student_ids),
+        "seconds": round(elapsed, 3),
+        "fps": round(frames / elapsed, 1) if elapsed > 0 else None,
+    }
+    return rows, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded landmarks through the attention tracker')
+    parser.add_argument('--landmarks', type=str, required=True, help='Recording made with main.py --dump_landmarks')
+    parser.add_argument('--output_csv', type=str, default=None, help='Write the replayed attention log here')
+    parser.add_argument('--mapping', type=str, default=None, help='Optional id_name_mapping.json for student names')
+    args = parser.parse_args()
+
+    records, meta = load_landmarks(args.landmarks)
+    id_name_mapping = {}
+    if args.mapping and os.path.exists(args.mapping):
+        with open(args.mapping, 'r') as f:
+            id_name_mapping = json.load(f)
+
+    rows, stats = replay_landmarks(records, meta, id_name_mapping, collect_rows=bool(args.output_csv))
+    print(f"Replayed {stats['frames']} frames / {stats['faces']} faces in {stats['seconds']}s "
+          f"({stats['fps']} fps), {stats['students']} student IDs")
+
+    if args.output_csv:
+        pd.DataFrame(rows, columns=FIELDNAMES).to_csv(args.output_csv, index=False)
+        print(f"Results saved to: {args.output_csv}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# sweep.py
+"""
+Parameter sweep over a landmark recording, to tune the tracker's thresholds per camera.
+
+Every combination of gaze ratios, yaw threshold and re-id distance is replayed from the
+same memory-mapped recording (see replay.py) in a process pool, scored against hand
+labels and ranked by accuracy, then by processing cost.
+
+Labels are a CSV with one row per recorded face:
+    record            row index in the recording (see --label_template)
+    attention_status  Attentive / Not attentive (blank = not labelled)
+    person            optional true identity, used to score re-identification
+
+Usage:
+    python sweep.py --landmarks lesson.lm --label_template labels.csv
+    python sweep.py --landmarks lesson.lm --labels labels.csv --yaw 20 25 30 --distance 30 50 80
+"""
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from landmark_log import load_landmarks
+from replay import replay_landmarks, DEFAULT_PARAMS
+
+# Set once per worker process by _init_worker, so each task only ships its params
+_records = None
+_meta = None
+_labels = None
+
+
+def load_labels(path):
+    """Labels CSV -> DataFrame indexed by record, with attention_status and person columns"""
+    labels = pd.read_csv(path, dtype={"person": str})
+    if "record" not in labels.columns or "attention_status" not in labels.columns:
+        raise ValueError("Labels need 'record' and 'attention_status' columns")
+    if "person" not in labels.columns:
+        labels["person"] = np.nan
+    labels["attention_status"] = labels["attention_status"].replace("", np.nan)
+    return labels.set_index("record")[["attention_status", "person"]]
+
+
+def write_label_template(records, path):
+    """One row per recorded face, with the face position so annotators can find it in the video"""
+    bbox = np.asarray(records["bbox"])
+    pd.DataFrame({
+        "record": np.arange(len(records)),
+        "frame_idx": np.asarray(records["frame_idx"]),
+        "center_x": np.round((bbox[:, 0] + bbox[:, 2]) / 2, 3),
+        "center_y": np.round((bbox[:, 1] + bbox[:, 3]) / 2, 3),
+        "attention_status": "",
+        "person": "",
+    }).to_csv(path, index=False)
+
+
+def build_grid(gaze_right, gaze_left, yaw, distance):
+    """Cartesian product of the given values, dropping gaze ratios that overlap"""
+    return [
+        {"gaze_right_ratio": r, "gaze_left_ratio": l, "yaw_threshold": y, "distance_threshold": d}
+        for r, l, y, d in itertools.product(gaze_right, gaze_left, yaw, distance)
+        if r < l
+    ]
+
+
+def score_predictions(predictions, labels):
+    """
+    Compare replayed predictions with the labels.
+    attention_accuracy counts labelled faces without a prediction as wrong; id_purity is the
+    share of faces whose student ID's majority person matches theirs, and fragmentation the
+    mean number of student IDs per true person (1.0 = no ID switches).
+    """
+    pred = pd.DataFrame(predictions, columns=["record", "student_id", "predicted"]).set_index("record")
+    joined = labels.join(pred, how="left")
+
+    attention = joined.dropna(subset=["attention_status"])
+    correct = (attention["attention_status"] == attention["predicted"]).sum()
+    scores = {
+        "labelled_faces": int(len(attention)),
+        "attention_accuracy": round(correct / len(attention), 4) if len(attention) else None,
+        "coverage": round(attention["predicted"].notna().mean(), 4) if len(attention) else None,
+    }
+
+    people = joined.dropna(subset=["person", "student_id"])
+    if len(people):
+        majority = people.groupby("student_id")["person"].agg(lambda p: p.value_counts().idxmax())
+        scores["id_purity"] = round((people["person"] == people["student_id"].map(majority)).mean(), 4)
+        scores["fragmentation"] = round(people.groupby("person")["student_id"].nunique().mean(), 3)
+    else:
+        scores["id_purity"] = None
+        scores["fragmentation"] = None
+    return scores
+
+
+def _init_worker(landmarks_path, labels_path):
+    global _records, _meta, _labels
+    # memmap: workers share the recording through the page cache instead of copying it
+    _records, _meta = load_landmarks(landmarks_path)
+    _labels = load_labels(labels_path)
+
+
+def evaluate(params):
+    """Replay the worker's recording with one parameter set and score it"""
+    predictions = []
+    start = time.process_time()
+    _, stats = replay_landmarks(_records, _meta, collect_rows=False, params=params, predictions=predictions)
+    cpu_seconds = time.process_time() - start
+    return {
+        "params": params,
+        **score_predictions(predictions, _labels),
+        "students": stats["students"],
+        "cpu_seconds": round(cpu_seconds, 3),
+        "fps": stats["fps"],
+    }
+
+
+def rank(results):
+    """Best accuracy first; ties broken by re-id quality, then by processing cost"""
+    def key(r):
+        accuracy = r["attention_accuracy"] if r["attention_accuracy"] is not None else -1
+        purity = r["id_purity"] if r["id_purity"] is not None else -1
+        fragmentation = r["fragmentation"] if r["fragmentation"] is not None else float("inf")
+        return (-accuracy, -purity, fragmentation, r["cpu_seconds"])
+    return sorted(results, key=key)
+
+
+def run_sweep(landmarks_path, labels_path, grid, workers=None):
+    workers = workers or os.cpu_count() or 1
+    chunksize = max(1, len(grid) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(landmarks_path, labels_path)) as pool:
+        return rank(list(pool.map(evaluate, grid, chunksize=chunksize)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Sweep tracker thresholds over a landmark recording')
+    parser.add_argument('--landmarks', type=str, required=True, help='Recording made with main.py --dump_landmarks')
+    parser.add_argument('--labels', type=str, default=None, help='Ground-truth labels CSV')
+    parser.add_argument('--label_template', type=str, default=None, help='Write an empty labels CSV for the recording and exit')
+    parser.add_argument('--gaze_right', type=float, nargs='+', default=[0.3, DEFAULT_PARAMS["gaze_right_ratio"], 0.4])
+    parser.add_argument('--gaze_left', type=float, nargs='+', default=[0.6, DEFAULT_PARAMS["gaze_left_ratio"], 0.7])
+    parser.add_argument('--yaw', type=float, nargs='+', default=[20, DEFAULT_PARAMS["yaw_threshold"], 30, 35])
+    parser.add_argument('--distance', type=float, nargs='+', default=[30, DEFAULT_PARAMS["distance_threshold"], 80])
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: CPU count)')
+    parser.add_argument('--top', type=int, default=10, help='Rows to print')
+    parser.add_argument('--output', type=str, default='sweep_results.json')
+    args = parser.parse_args()
+
+    if args.label_template:
+        records, _ = load_landmarks(args.landmarks)
+        write_label_template(records, args.label_template)
+        print(f"Label template with {len(records)} faces saved to: {args.label_template}")
+        return
+    if not args.labels:
+        parser.error("--labels is required (create one with --label_template)")
+
+    grid = build_grid(args.gaze_right, args.gaze_left, args.yaw, args.distance)
+    start = time.perf_counter()
+    results = run_sweep(os.path.abspath(args.landmarks), os.path.abspath(args.labels), grid, args.workers)
+    elapsed = time.perf_counter() - start
+
+    default = next((r for r in results if r["params"] == DEFAULT_PARAMS), None)
+    print(f"Evaluated {len(grid)} parameter sets in {elapsed:.1f}s")
+    print(f"{'gaze R':>7} {'gaze L':>7} {'yaw':>5} {'dist':>5} | {'accuracy':>8} {'purity':>7} {'frag':>5} {'IDs':>4} {'cpu s':>6}")
+    for r in results[:args.top]:
+        p = r["params"]
+        print(f"{p['gaze_right_ratio']:>7} {p['gaze_left_ratio']:>7} {p['yaw_threshold']:>5} {p['distance_threshold']:>5} | "
+              f"{r['attention_accuracy']!s:>8} {r['id_purity']!s:>7} {r['fragmentation']!s:>5} {r['students']:>4} {r['cpu_seconds']:>6}")
+    if default:
+        print(f"Current defaults: accuracy {default['attention_accuracy']}, purity {default['id_purity']}, "
+              f"rank {results.index(default) + 1}/{len(results)}")
+
+    with open(args.output, 'w') as f:
+        json.dump({"landmarks": args.landmarks, "labels": args.labels, "seconds": round(elapsed, 2),
+                   "best": results[0]["params"] if results else None, "results": results}, f, indent=2)
+    print(f"Results saved to: {args.output}")
+
+if __name__ == "__main__":
+    main()
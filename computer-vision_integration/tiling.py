@@ -0,0 +1,199 @@
+# tiling.py
+"""
+Tiled face mesh for large, dense lecture halls.
+
+A single FaceMesh sees at most max_num_faces faces and distant students are only a few
+pixels wide at full-frame scale. TiledFaceMesh splits the image into overlapping tiles,
+runs one FaceMesh per tile (optionally on a thread pool), maps the landmarks back to the
+whole image and drops duplicates found in two overlapping tiles. Tiles that found nobody
+are only re-scanned every few frames. Each tile is cut from the full-resolution image and
+downscaled to tile_width on its own, so distant faces keep their pixels.
+
+It exposes the same process(rgb) interface as FaceMesh, so process_frame is unchanged.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+import numpy as np
+
+from face_utils import create_face_mesh, downscale_to_width, remap_landmarks_from_roi
+
+# Layouts tried by choose_layout, cheapest first (columns, rows)
+CANDIDATE_LAYOUTS = [(1, 1), (2, 1), (2, 2), (3, 2), (3, 3), (4, 3)]
+
+
+def make_tiles(image_w, image_h, cols, rows, overlap=0.15):
+    """Split the image into cols x rows tiles (x, y, w, h) that overlap by the given fraction"""
+    tile_w = image_w / (cols - (cols - 1) * overlap) if cols > 1 else image_w
+    tile_h = image_h / (rows - (rows - 1) * overlap) if rows > 1 else image_h
+    step_x, step_y = tile_w * (1 - overlap), tile_h * (1 - overlap)
+    tiles = []
+    for r in range(rows):
+        for c in range(cols):
+            x, y = int(round(c * step_x)), int(round(r * step_y))
+            tiles.append((x, y, min(int(round(tile_w)), image_w - x), min(int(round(tile_h)), image_h - y)))
+    return tiles
+
+
+def _face_boxes(faces):
+    """(n, 4) array of normalized min_x, min_y, max_x, max_y per face"""
+    boxes = np.empty((len(faces), 4))
+    for k, face in enumerate(faces):
+        coords = np.array([(lm.x, lm.y) for lm in face.landmark])
+        boxes[k] = (*coords.min(axis=0), *coords.max(axis=0))
+    return boxes
+
+
+def dedupe_faces(faces, scores, overlap_threshold=0.5):
+    """
+    Keep the best-scoring face of every group of overlapping boxes. Overlap is measured against
+    the smaller box, since a face cut by a tile edge is a small box inside the whole one.
+    """
+    if len(faces) < 2:
+        return faces
+    boxes = _face_boxes(faces)
+    areas = (boxes[:, 2] - boxes[:, 0]) * (boxes[:, 3] - boxes[:, 1])
+    keep = []
+    for k in np.argsort(scores)[::-1]:
+        if keep:
+            kept = boxes[keep]
+            iw = np.clip(np.minimum(kept[:, 2], boxes[k, 2]) - np.maximum(kept[:, 0], boxes[k, 0]), 0, None)
+            ih = np.clip(np.minimum(kept[:, 3], boxes[k, 3]) - np.maximum(kept[:, 1], boxes[k, 1]), 0, None)
+            inter = iw * ih
+            overlap = inter / (np.minimum(areas[keep], areas[k]) + 1e-12)
+            if (overlap > overlap_threshold).any():
+                continue
+        keep.append(k)
+    return [faces[k] for k in sorted(keep)]
+
+
+def _edge_margin(faces, tile, image_w, image_h):
+    """Distance (pixels) from each face box to the nearest tile edge; faces cut by an edge score lowest"""
+    if not faces:
+        return np.zeros(0)
+    x, y, w, h = tile
+    boxes = _face_boxes(faces) * [image_w, image_h, image_w, image_h]
+    return np.min([boxes[:, 0] - x, boxes[:, 1] - y, x + w - boxes[:, 2], y + h - boxes[:, 3]], axis=0)
+
+
+class TiledFaceMesh:
+    """
+    Drop-in replacement for FaceMesh that runs one mesh per overlapping tile.
+    Empty tiles are skipped except every rescan_every frames.
+    """
+
+    def __init__(self, layout, overlap=0.15, faces_per_tile=15, workers=1, rescan_every=15, tile_width=None,
+                 mesh_factory=None):
+        self.cols, self.rows = layout
+        self.overlap = overlap
+        self.tile_width = tile_width
+        self.faces_per_tile = faces_per_tile
+        self.rescan_every = rescan_every
+        mesh_factory = mesh_factory or (lambda: create_face_mesh(max_num_faces=faces_per_tile))
+        self.meshes = [mesh_factory() for _ in range(self.cols * self.rows)]
+        self.pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        self.tiles = None
+        self.image_size = None
+        self.active = [True] * len(self.meshes)
+        self.frame_count = 0
+        self.tile_runs = 0
+        self.tile_skips = 0
+        self.last_tile_counts = [0] * len(self.meshes)
+
+    def _run_tile(self, k, rgb):
+        x, y, w, h = self.tiles[k]
+        tile = downscale_to_width(rgb[y:y + h, x:x + w], self.tile_width)
+        results = self.meshes[k].process(np.ascontiguousarray(tile))
+        faces = list(results.multi_face_landmarks or [])
+        image_h, image_w = rgb.shape[:2]
+        remap_landmarks_from_roi(faces, self.tiles[k], image_w, image_h)
+        return faces
+
+    def process(self, rgb):
+        image_h, image_w = rgb.shape[:2]
+        if self.image_size != (image_w, image_h):
+            self.image_size = (image_w, image_h)
+            self.tiles = make_tiles(image_w, image_h, self.cols, self.rows, self.overlap)
+            self.active = [True] * len(self.tiles)
+
+        rescan = self.frame_count % self.rescan_every == 0
+        self.frame_count += 1
+        to_run = [k for k in range(len(self.tiles)) if self.active[k] or rescan]
+        self.tile_runs += len(to_run)
+        self.tile_skips += len(self.tiles) - len(to_run)
+
+        if self.pool is not None and len(to_run) > 1:
+            tile_faces = list(self.pool.map(lambda k: self._run_tile(k, rgb), to_run))
+        else:
+            tile_faces = [self._run_tile(k, rgb) for k in to_run]
+
+        faces, scores = [], []
+        self.last_tile_counts = [0] * len(self.tiles)
+        for k, found in zip(to_run, tile_faces):
+            self.active[k] = bool(found)
+            self.last_tile_counts[k] = len(found)
+            faces.extend(found)
+            scores.extend(_edge_margin(found, self.tiles[k], image_w, image_h))
+        faces = dedupe_faces(faces, np.array(scores))
+        return SimpleNamespace(multi_face_landmarks=faces or None)
+
+    def stats(self):
+        total = self.tile_runs + self.tile_skips
+        return {
+            "layout": f"{self.cols}x{self.rows}",
+            "tile_runs": self.tile_runs,
+            "tile_skips": self.tile_skips,
+            "skipped_ratio": round(self.tile_skips / total, 3) if total else 0.0,
+        }
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+        for mesh in self.meshes:
+            if hasattr(mesh, "close"):
+                mesh.close()
+
+
+def parse_layout(value):
+    """'3x2' -> (3, 2)"""
+    cols, rows = (int(v) for v in value.lower().split("x"))
+    return cols, rows
+
+
+def choose_layout(rgb_frames, faces_per_tile=15, candidates=CANDIDATE_LAYOUTS, mesh_factory=None, **kwargs):
+    """
+    Pick the cheapest layout that finds (almost) every face while no tile hits its face budget.
+
+    Each candidate runs on the calibration frames; a layout whose busiest tile reaches
+    faces_per_tile may be dropping students, so it only wins if nothing finer does better.
+    Returns (layout, {layout: (faces found, busiest tile)}).
+    """
+    found = {}
+    for layout in candidates:
+        mesh = TiledFaceMesh(layout, faces_per_tile=faces_per_tile, mesh_factory=mesh_factory, rescan_every=1, **kwargs)
+        try:
+            faces, busiest = 0, 0
+            for rgb in rgb_frames:
+                results = mesh.process(rgb)
+                faces = max(faces, len(results.multi_face_landmarks or []))
+                busiest = max(busiest, max(mesh.last_tile_counts))
+        finally:
+            mesh.close()
+        found[layout] = (faces, busiest)
+
+    most = max(faces for faces, _ in found.values())
+    within_budget = [l for l in candidates if found[l][1] < faces_per_tile and found[l][0] >= most - 1]
+    best = within_budget[0] if within_budget else max(candidates, key=lambda l: found[l][0])
+    return best, found
+
+
+def create_tiled_face_mesh(spec, calibration_rgb, **kwargs):
+    """Build a TiledFaceMesh from --tiles: 'CxR' for a fixed layout, or 'auto' to calibrate on one frame"""
+    if spec == "auto":
+        layout, found = choose_layout([calibration_rgb], faces_per_tile=kwargs.get("faces_per_tile", 15),
+                                      tile_width=kwargs.get("tile_width"))
+        print("Tile layouts (faces found, busiest tile): " +
+              ", ".join(f"{c}x{r}: {faces}/{busiest}" for (c, r), (faces, busiest) in found.items()))
+    else:
+        layout = parse_layout(spec)
+    return TiledFaceMesh(layout, **kwargs)
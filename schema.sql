@@ -4,6 +4,7 @@ CREATE TABLE users (
     name VARCHAR(255) NOT NULL,
     email VARCHAR(255) UNIQUE NOT NULL,
     password VARCHAR(255) NOT NULL,
+    auth_token VARCHAR(255)
 );
 
 -- Create REPORTS table
@@ -34,6 +35,7 @@ CREATE TABLE student_profession (
 );
 
 -- Create indexes for better performance
+CREATE UNIQUE INDEX idx_users_auth_token ON users(auth_token);
 CREATE INDEX idx_reports_user_id ON reports(user_id);
 CREATE INDEX idx_reports_status ON reports(status);
 CREATE INDEX idx_reports_date_time ON reports(date_time);
@@ -0,0 +1,245 @@
+import datetime
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+# Tracker modules first: both packages have a main.py / benchmark.py, only the tracker's are unused here
+sys.path.insert(0, os.path.join(ROOT, "EduVision_NLP"))
+sys.path.insert(0, os.path.join(ROOT, "computer-vision_integration"))
+
+from attention_log import AttentionLogWriter, binary_log_path
+from csv_logger import append_rows
+from log_index import LogIndexWriter, index_csv, log_index_path
+from reid import merge_fragments, student_summaries_path
+from utils.csv_loader import CSVLoader
+from utils.log_index import load_log_index
+from utils.track_consolidation import apply_track_merges, link_tracks, load_track_merges, save_track_merges
+
+# Not the machine's offset, so a rebuild that used today's offset instead of the stored one shows up
+UTC_OFFSET = 7200.0
+SESSION_START = 1_700_000_000.0
+FPS = 2
+FRAMES = 150
+
+# "2" and "S1" / "S11" make the raw-byte line filter match rows of other students and columns other than student_id
+STUDENTS = {
+    "S1": {"name": "Ayse", "seen": (0, FRAMES), "nose": (0.2, 0.4)},
+    "S11": {"name": "S1", "seen": (0, FRAMES), "nose": (0.5, 0.4)},
+    "2": {"name": "Unknown", "seen": (10, 70), "nose": (0.8, 0.4)},
+    # Same seat as "2" after it left: merged into "2" by reid.py, or by the report's track consolidation
+    "S4": {"name": "Mehmet", "seen": (90, FRAMES), "nose": (0.8, 0.41)},
+}
+MERGED = {"S4": "2"}
+TIME_WINDOWS = [(None, 12.3), (10, 25), (0, 5), (33.5, 44.5), (40, None), (500, None)]
+
+
+def _rows(frame_idx, now):
+    timestamp = datetime.datetime.fromtimestamp(now + UTC_OFFSET, datetime.timezone.utc).replace(tzinfo=None).isoformat(timespec="microseconds")
+    rows = []
+    for s_id, student in STUDENTS.items():
+        first, last = student["seen"]
+        if not first <= frame_idx < last:
+            continue
+        seen = frame_idx - first
+        attentive = (frame_idx // 7 + len(s_id)) % 3 != 0
+        rows.append({
+            "name": student["name"], "student_id": s_id, "timestamp": timestamp, "frame_idx": frame_idx,
+            "attention_status": "Attentive" if attentive else "Not attentive", "gaze": "Center",
+            "yaw_angle_deg": round(10.0 + frame_idx % 9, 1), "attention_score": round(50 + seen % 50, 1),
+            "distraction_events": seen // 7, "yawning_count": 2, "eye_closure_duration_sec": 0.0,
+            "focus_quality": "", "session_duration_minutes": round(seen / FPS / 60, 2),
+            "nose_x": student["nose"][0], "nose_y": student["nose"][1],
+        })
+    return rows
+
+
+def write_session(directory):
+    """A CSV and a binary log of the same session, indexed frame by frame as process_frame does"""
+    csv_path = os.path.join(directory, "log.csv")
+    attention_log = AttentionLogWriter(binary_log_path(csv_path), utc_offset_seconds=UTC_OFFSET)
+    csv_index = LogIndexWriter(csv_path, utc_offset_seconds=UTC_OFFSET)
+    binary_index = LogIndexWriter(attention_log.path, utc_offset_seconds=UTC_OFFSET)
+    for frame_idx in range(FRAMES):
+        now = SESSION_START + frame_idx / FPS
+        rows = _rows(frame_idx, now)
+        student_ids = [row["student_id"] for row in rows]
+        start = os.path.getsize(csv_path) if os.path.exists(csv_path) else 0
+        append_rows(csv_path, pd.DataFrame(rows))
+        csv_index.add_frame(now, student_ids, start, os.path.getsize(csv_path))
+        start = attention_log.tell()
+        attention_log.append(rows, now)
+        binary_index.add_frame(now, student_ids, start, attention_log.tell())
+    attention_log.close({s_id: student["name"] for s_id, student in STUDENTS.items()})
+    csv_index.close()
+    binary_index.close()
+
+    descriptor = [0.5] * 11
+    summaries = {
+        s_id: {
+            "descriptor": descriptor if s_id in ("2", "S4") else [0.2 + k / 10] * 11,
+            "samples": 20, "sightings": 20,
+            "first_seen": SESSION_START + student["seen"][0] / FPS,
+            "last_seen": SESSION_START + (student["seen"][1] - 1) / FPS,
+            "position": list(student["nose"]),
+        }
+        for k, (s_id, student) in enumerate(STUDENTS.items())
+    }
+    with open(student_summaries_path(csv_path), "w") as f:
+        json.dump(summaries, f)
+    return csv_path, attention_log.path
+
+
+def consolidate(csv_path):
+    """Join split tracks as EduVision_NLP's process_csv_file does, without reid.py"""
+    joined = link_tracks(CSVLoader().load_csv(csv_path))
+    save_track_merges(csv_path, joined)
+    return len(joined)
+
+
+def full_read(loader, log_path, student_id=None, start=None, end=None):
+    """What load_timeline returns without an index: the whole log, filtered"""
+    df = apply_track_merges(loader.load_csv(log_path), load_track_merges(log_path))
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    df["student_id"] = df["student_id"].astype(str)
+    if student_id is not None:
+        df = df[df["student_id"] == student_id]
+    elapsed = (df["timestamp"] - pd.Timestamp(SESSION_START + UTC_OFFSET, unit="s")).dt.total_seconds()
+    keep = pd.Series(True, index=df.index)
+    if start is not None:
+        keep &= elapsed >= start
+    if end is not None:
+        keep &= elapsed < end
+    return df[keep].reset_index(drop=True)
+
+
+def assert_same_rows(indexed, full, query):
+    columns = ["student_id", "name", "timestamp", "frame_idx", "attention_status", "attention_score",
+               "distraction_events", "session_duration_minutes"]
+    assert len(indexed) == len(full), f"{query}: {len(indexed)} indexed rows, {len(full)} in the full read"
+    pd.testing.assert_frame_equal(indexed[columns].astype({"student_id": str}), full[columns], check_dtype=False,
+                                  obj=str(query))
+
+
+def check_indexed_reads(log_path):
+    loader = CSVLoader()
+    index = load_log_index(log_path)
+    assert index is not None, f"no index for {log_path}"
+    student_ids = sorted(set(full_read(loader, log_path)["student_id"]))
+    queries = [(s_id, None, None) for s_id in student_ids]
+    queries += [(None, start, end) for start, end in TIME_WINDOWS]
+    queries += [(s_id, start, end) for s_id in student_ids for start, end in TIME_WINDOWS[1:4]]
+    for query in queries:
+        assert_same_rows(loader.load_timeline(log_path, *query), full_read(loader, log_path, *query), query)
+    return student_ids
+
+
+def test_unfinished_binary_log_is_readable():
+    with tempfile.TemporaryDirectory() as directory:
+        attention_log = AttentionLogWriter(os.path.join(directory, "log.alog"), utc_offset_seconds=UTC_OFFSET)
+        expected = []
+        for i in range(FRAMES // 2):
+            rows = _rows(i, SESSION_START + i / FPS)
+            if i == 40:
+                rows[0]["gaze"] = "Down"
+            attention_log.append(rows, SESSION_START + i / FPS)
+            expected += rows
+        attention_log._file.flush()
+        # A record cut off half way, as when the tracker is killed mid-write
+        with open(attention_log.path, "ab") as f:
+            f.write(b"\0" * 7)
+
+        df = CSVLoader().load_csv(attention_log.path)
+        assert df["student_id"].tolist() == [row["student_id"] for row in expected]
+        assert df["gaze"].tolist() == [row["gaze"] for row in expected]
+        attention_log.close()
+
+
+def test_index_rebuild_keeps_session_offset():
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path, _ = write_session(directory)
+        with open(log_index_path(csv_path)) as f:
+            written = json.load(f)
+        index_csv(csv_path)
+        with open(log_index_path(csv_path)) as f:
+            rebuilt = json.load(f)
+        assert rebuilt["utc_offset_seconds"] == UTC_OFFSET
+        assert rebuilt["buckets"] == written["buckets"]
+        assert rebuilt["students"] == written["students"]
+
+
+def test_indexed_reads_match_full_reads():
+    with tempfile.TemporaryDirectory() as directory:
+        for log_path in write_session(directory):
+            assert check_indexed_reads(log_path) == sorted(STUDENTS)
+
+
+def test_indexed_reads_after_merge():
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path, binary_path = write_session(directory)
+        assert merge_fragments(csv_path) == len(MERGED)
+        expected = sorted(set(STUDENTS) - set(MERGED))
+        for log_path in (csv_path, binary_path):
+            assert check_indexed_reads(log_path) == expected
+            merged = CSVLoader().load_timeline(log_path, student_id="2")
+            assert merged["frame_idx"].tolist() == list(range(10, 70)) + list(range(90, FRAMES))
+            assert set(merged["name"]) == {"Mehmet"}
+            assert CSVLoader().load_timeline(log_path, student_id="S4").empty
+
+        # Both formats give the same merged timeline
+        csv_rows, binary_rows = (CSVLoader().load_timeline(path, student_id="2", start=20, end=60)
+                                 for path in (csv_path, binary_path))
+        assert csv_rows["frame_idx"].tolist() == binary_rows["frame_idx"].tolist()
+        assert np.allclose(csv_rows["attention_score"], binary_rows["attention_score"])
+
+
+def test_indexed_reads_after_consolidation():
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path, binary_path = write_session(directory)
+        assert consolidate(csv_path) == len(MERGED)
+        expected = sorted(set(STUDENTS) - set(MERGED))
+        for log_path in (csv_path, binary_path):
+            assert check_indexed_reads(log_path) == expected
+            merged = CSVLoader().load_timeline(log_path, student_id="2")
+            assert merged["frame_idx"].tolist() == list(range(10, 70)) + list(range(90, FRAMES))
+            assert CSVLoader().load_timeline(log_path, student_id="S4").empty
+
+
+def check_merged_counters(csv_path, binary_path):
+    for log_path in (csv_path, binary_path):
+        loader = CSVLoader()
+        merged = loader.load_timeline(log_path, student_id="2")
+        for col in ("distraction_events", "yawning_count", "session_duration_minutes"):
+            assert merged[col].is_monotonic_increasing, f"{log_path}: {col} restarts at the merge"
+        # Two yawns in each fragment
+        assert merged["yawning_count"].iloc[-1] == 4
+
+        attentive = merged["attention_status"].eq("Attentive")
+        distractions = int((attentive.shift(fill_value=True) & ~attentive).sum())
+        assert merged["distraction_events"].iloc[-1] == distractions
+        student = next(s for s in loader.get_student_data(full_read(loader, log_path)) if s["student_id"] == "2")
+        assert student["total_distractions"] == distractions
+
+        # A window that starts after the merge keeps counting from the earlier fragment
+        late = loader.load_timeline(log_path, student_id="2", start=50)
+        assert late["distraction_events"].tolist() == merged["distraction_events"].iloc[-len(late):].tolist()
+
+
+def test_counters_carry_on_after_merge():
+    for merge in (merge_fragments, consolidate):
+        with tempfile.TemporaryDirectory() as directory:
+            csv_path, binary_path = write_session(directory)
+            merge(csv_path)
+            check_merged_counters(csv_path, binary_path)
+
+
+if __name__ == "__main__":
+    for test in (test_unfinished_binary_log_is_readable, test_index_rebuild_keeps_session_offset, test_indexed_reads_match_full_reads,
+                 test_indexed_reads_after_merge, test_indexed_reads_after_consolidation,
+                 test_counters_carry_on_after_merge):
+        test()
+        print(f"{test.__name__}: ok")
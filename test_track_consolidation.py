@@ -0,0 +1,104 @@
+import datetime
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(ROOT, "EduVision_NLP"))
+
+from utils.track_consolidation import MAX_GAP_SECONDS, apply_track_merges, consolidate_tracks, link_tracks
+
+SESSION_START = datetime.datetime(2025, 1, 1, 9, 0, 0)
+FPS = 1
+
+
+def fragment(s_id, first, last, nose=(0.5, 0.5), name="Unknown", yawns=0):
+    """Rows of one tracker ID seen from frame first to frame last - 1, as the tracker logs them"""
+    rows = []
+    for seen, frame_idx in enumerate(range(first, last)):
+        attentive = (frame_idx // 4) % 2 == 0
+        rows.append({
+            "name": name, "student_id": s_id, "frame_idx": frame_idx,
+            "timestamp": (SESSION_START + datetime.timedelta(seconds=frame_idx / FPS)).isoformat(),
+            "attention_status": "Attentive" if attentive else "Not attentive",
+            "attention_score": 100.0, "distraction_events": seen // 8, "yawning_count": yawns,
+            "eye_closure_duration_sec": 0.5 * seen, "session_duration_minutes": round(seen / FPS / 60, 2),
+            "nose_x": nose[0], "nose_y": nose[1],
+        })
+    return rows
+
+
+def session(*fragments):
+    return pd.DataFrame([row for rows in fragments for row in rows])
+
+
+def test_joins_fragment_in_same_seat():
+    df = session(fragment("1", 0, 20), fragment("2", 30, 50, nose=(0.51, 0.5)))
+    assert link_tracks(df) == {"2": "1"}
+
+
+def test_keeps_fragments_apart():
+    cases = {
+        "different seat": session(fragment("1", 0, 20), fragment("2", 30, 50, nose=(0.7, 0.5))),
+        "overlapping in time": session(fragment("1", 0, 40), fragment("2", 30, 50)),
+        "gap too long": session(fragment("1", 0, 20), fragment("2", 21 + MAX_GAP_SECONDS * FPS, 350 * FPS)),
+        "different names": session(fragment("1", 0, 20, name="Ayse"), fragment("2", 30, 50, name="Mehmet")),
+    }
+    for case, df in cases.items():
+        assert link_tracks(df) == {}, case
+
+
+def test_same_name_joins_across_seats():
+    df = session(fragment("1", 0, 20, name="Ayse"), fragment("2", 30, 50, nose=(0.9, 0.1), name="Ayse"))
+    assert link_tracks(df) == {"2": "1"}
+
+
+def test_cheapest_hand_over_wins():
+    # "3" starts where both "1" and "2" ended; "1" ended closer to it, so "2" stays on its own
+    df = session(fragment("1", 0, 20, nose=(0.5, 0.5)), fragment("2", 0, 20, nose=(0.53, 0.5)),
+                 fragment("3", 25, 50, nose=(0.51, 0.5)))
+    assert link_tracks(df) == {"3": "1"}
+
+
+def test_chains_several_fragments():
+    df = session(fragment("1", 0, 20), fragment("2", 30, 50), fragment("3", 60, 80), fragment("4", 0, 80, nose=(0.1, 0.1)))
+    assert link_tracks(df) == {"2": "1", "3": "1"}
+
+
+def test_recompute_carries_counters_on():
+    df = session(fragment("1", 0, 20, yawns=2), fragment("2", 30, 50, yawns=1), fragment("9", 0, 50, nose=(0.1, 0.1)))
+    merged = consolidate_tracks(df)
+    student = merged[merged["student_id"] == "1"].sort_values("frame_idx")
+    assert set(merged["student_id"]) == {"1", "9"}
+    assert len(student) == 40
+
+    attentive = student["attention_status"].eq("Attentive").to_numpy()
+    frames_seen = np.arange(1, len(student) + 1)
+    assert np.allclose(student["attention_score"], (np.cumsum(attentive) / frames_seen * 100).round(1))
+    distractions = np.cumsum(np.r_[False, attentive[:-1] & ~attentive[1:]])
+    assert student["distraction_events"].tolist() == distractions.tolist()
+    # Counters of the second fragment start from where the first one stopped
+    assert student["yawning_count"].tolist() == [2] * 20 + [3] * 20
+    assert student["eye_closure_duration_sec"].iloc[20] == 0.5 * 19
+    assert student["session_duration_minutes"].is_monotonic_increasing
+    assert student["session_duration_minutes"].iloc[-1] == round(49 / FPS / 60, 2)
+
+    # Students that were not merged keep the values the tracker wrote
+    untouched = df[df["student_id"] == "9"].reset_index(drop=True)
+    kept = merged[merged["student_id"] == "9"].reset_index(drop=True)
+    pd.testing.assert_frame_equal(kept, untouched, check_dtype=False)
+
+
+def test_apply_saved_merges_matches_consolidation():
+    df = session(fragment("1", 0, 20), fragment("2", 30, 50), fragment("9", 0, 50, nose=(0.1, 0.1)))
+    pd.testing.assert_frame_equal(apply_track_merges(df, link_tracks(df)), consolidate_tracks(df))
+
+
+if __name__ == "__main__":
+    for test in (test_joins_fragment_in_same_seat, test_keeps_fragments_apart, test_same_name_joins_across_seats,
+                 test_cheapest_hand_over_wins, test_chains_several_fragments, test_recompute_carries_counters_on,
+                 test_apply_saved_merges_matches_consolidation):
+        test()
+        print(f"{test.__name__}: ok")